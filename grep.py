@@ -1,7 +1,18 @@
 import argparse
+import codecs
+import mmap
+import os
 import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+from typing import Callable, Iterator, NamedTuple, TypeVar
 from pathlib import Path
+from queue import Queue
+from textwrap import wrap
+from threading import Thread
 import regex
+from ignore import FILE_TYPES, IgnoreRules, NameFilter, global_ignore_file
 
 BOLD_RED = "\x1b[1;31m"
 GREEN = "\x1b[32m"
@@ -12,110 +23,751 @@ ALWAYS = "always"
 NEVER = "never"
 AUTO = "auto"
 
+SORT_PATH = "path"
+SORT_NONE = "none"
 
-def print_matches(
-    matches: list[regex.Match],
-    file: Path | None,
-    line: str,
-    line_num: int,
-    args: argparse.Namespace,
-):
+BINARY = "binary"
+TEXT = "text"
+WITHOUT_MATCH = "without-match"
 
-    def fmt(value, color):
-        color_output = args.color == ALWAYS or (
-            sys.stdout.isatty() and args.color != NEVER
-        )
-        return f"{color}{value}{RESET}" if color_output else str(value)
+# What search_data found data to be: all text, or binary from some line on,
+# without or with a match in the binary part
+TEXT_DATA = 0
+BINARY_DATA = 1
+BINARY_MATCH = 2
+
+STDIN_NAME = "(standard input)"
+
+# Written between groups of context lines that aren't next to each other
+GROUP_SEPARATOR = "--"
+
+T = TypeVar("T")
+
+
+class Formatter:
+    """
+    Formats output lines. Whether to color output is decided once, and the
+    file name part of the prefix is formatted once per file by file_prefix.
+    """
+
+    def __init__(self, args: argparse.Namespace):
+        # --color=auto is resolved in main before any Formatter is made
+        self._color = args.color == ALWAYS
+        self._show_file = len(args.FILE) > 1 or args.recursive
+        self._line_number = args.line_number
+        self._only_matching = args.only_matching
+
+        # Text written before and after the file name, line number and matches
+        if self._color:
+            self._file = (MAGENTA, RESET)
+            self._num = (GREEN, RESET)
+            self._match = (BOLD_RED, RESET)
+        else:
+            self._file = self._num = self._match = ("", "")
+
+    def file_name(self, file: str) -> str:
+        start, end = self._file
+        return f"{start}{file}{end}"
+
+    # The file name and line number are followed by ':' on lines with a match
+    # and by '-' on context lines
+    def file_prefix(self, file: str | None, sep: str = ":") -> str:
+        if not self._show_file:
+            return ""
+        return f"{self.file_name(file)}{sep}"
 
-    prefix = ""
+    def line_prefix(self, file_prefix: str, line_num: int, sep: str = ":") -> str:
+        if not self._line_number:
+            return file_prefix
+        start, end = self._num
+        return f"{file_prefix}{start}{line_num}{end}{sep}"
 
-    if len(args.FILE) > 1 or args.recursive:
-        prefix += f"{fmt(file, MAGENTA)}:"
-    if args.line_number:
-        prefix += f"{fmt(line_num, GREEN)}:"
+    def format_line(self, matches: list[regex.Match], line: str) -> list[str]:
+        """
+        Return the output for a line with matches, one string per output line,
+        without the prefix.
+        """
+        start, end = self._match
+
+        if self._only_matching:
+            return [f"{start}{m.match}{end}" for m in matches]
+        if not self._color:
+            return [line]
+
+        parts = []
+        prevEnd = 0
 
-    if args.only_matching:
         for m in matches:
-            print(f"{prefix}{fmt(m.match, BOLD_RED)}")
-        return
+            parts += (line[prevEnd : m.start()], start, m.match, end)
+            prevEnd = m.end()
+
+        parts.append(line[prevEnd:])
+
+        return ["".join(parts)]
+
+    def format_context(self, line: str) -> list[str]:
+        """
+        Return the output for a context line, none with -o, where context
+        lines only decide which groups of lines are separated.
+        """
+        return [] if self._only_matching else [line]
+
+
+class Output:
+    """
+    Collects output and writes it to stdout in blocks of about BUFFER_SIZE
+    characters, encoded as UTF-8 straight to the binary buffer under
+    sys.stdout when there is one. When stdout is a TTY every write is flushed
+    right away instead, so matches show up as they are found.
+    """
+
+    BUFFER_SIZE = 1 << 16
+
+    def __init__(self, formatter: Formatter):
+        self.formatter = formatter
+        self._stream = sys.stdout
+        self._binary = getattr(self._stream, "buffer", None)
+        self._line_buffered = self._stream.isatty()
+        self._pending = []
+        self._size = 0
+
+        # The file and number of the last line written by separate
+        self._last_line = None
 
-    s = prefix
-    prevEnd = 0
+    def write(self, text: str):
+        self._pending.append(text)
+        self._size += len(text)
 
-    for m in matches:
-        s += f"{line[prevEnd : m.start()]}{fmt(m.match, BOLD_RED)}"
-        prevEnd = m.end()
+        if self._line_buffered or self._size >= Output.BUFFER_SIZE:
+            self.flush()
 
-    s += line[prevEnd:]
+    def write_matches(
+        self, file_prefix: str, line_num: int, matches: list[regex.Match], line: str
+    ):
+        prefix = self.formatter.line_prefix(file_prefix, line_num)
+        self.write_lines(prefix, self.formatter.format_line(matches, line))
 
-    print(s)
+    def write_context(self, context_prefix: str, line_num: int, line: str):
+        prefix = self.formatter.line_prefix(context_prefix, line_num, "-")
+        self.write_lines(prefix, self.formatter.format_context(line))
 
+    def write_lines(self, prefix: str, strings: list[str]):
+        for s in strings:
+            self.write(f"{prefix}{s}\n")
 
-def search_stdin(pattern: regex.Pattern, args: argparse.Namespace) -> int:
+    def separate(self, file: object, line_num: int):
+        """
+        Called before writing line line_num of file with context lines, writes
+        GROUP_SEPARATOR unless it follows the last line written. file is
+        anything that tells files apart.
+        """
+        if self._last_line is not None and self._last_line != (file, line_num - 1):
+            self.write(f"{GROUP_SEPARATOR}\n")
+        self._last_line = (file, line_num)
+
+    def flush(self):
+        text = "".join(self._pending)
+        self._pending.clear()
+        self._size = 0
+
+        if self._binary is None:
+            self._stream.write(text)
+            self._stream.flush()
+            return
+
+        # Anything already written through the text layer goes first
+        self._stream.flush()
+        # Bytes of lines that aren't valid UTF-8, searched with
+        # --binary-files=text, are written back out unchanged
+        self._binary.write(text.encode(errors="surrogateescape"))
+        self._binary.flush()
+
+
+# Searched data is either bytes or a file mapped into memory
+Data = bytes | mmap.mmap
+
+# Most bytes of a mapped file copied at once to count its newlines
+COUNT_BLOCK_SIZE = 1 << 20
+
+
+def count_newlines(data: Data, start: int, end: int) -> int:
+    if isinstance(data, bytes):
+        return data.count(b"\n", start, end)
+
+    # mmap has no count, so the mapping is counted one block at a time
     n = 0
+    for i in range(start, end, COUNT_BLOCK_SIZE):
+        n += data[i : min(i + COUNT_BLOCK_SIZE, end)].count(b"\n")
+    return n
+
+
+class BinaryData(Exception):
+    """
+    Raised by matching_lines at the first candidate line that isn't valid
+    UTF-8, with the offset where the line starts.
+    """
+
+    def __init__(self, pos: int):
+        super().__init__(pos)
+        self.pos = pos
+
+
+def matching_lines(
+    data: Data, pattern: regex.Pattern, pos: int = 0, errors: str = "strict"
+) -> Iterator[tuple[int, int, str, list[regex.Match]]]:
+    """
+    Yield the line number, counted from 1 at pos, the offset where it starts,
+    the text and the matches of every line of UTF-8 encoded data from pos
+    with a match. Only lines that can contain a match are copied out of data
+    and decoded, with the given errors handler. Raises BinaryData at a line
+    that can't be decoded.
+    """
     line_num = 1
+    counted = pos
 
-    while True:
+    for start, end in pattern.candidate_lines(data, pos):
         try:
-            line = input()
-        except EOFError:
-            return n
+            line = data[start:end].decode(errors=errors).removesuffix("\r")
+        except UnicodeDecodeError:
+            raise BinaryData(start) from None
+
+        line_num += count_newlines(data, counted, start)
+        counted = start
 
         matches = pattern.findall(line)
 
-        if len(matches) == 0:
-            continue
+        if len(matches) != 0:
+            yield line_num, start, line, matches
+
+
+# Bytes at the start of a file checked by looks_binary
+SNIFF_SIZE = 1 << 15
+
 
-        print_matches(
-            matches,
-            None,
-            line,
-            line_num,
-            args,
+def looks_binary(data: Data) -> bool:
+    """
+    Return whether the start of data holds a NUL byte or isn't valid UTF-8, as
+    GNU grep decides a file is binary.
+    """
+    head = data[:SNIFF_SIZE]
+    if b"\0" in head:
+        return True
+
+    # A character cut off at the end of head isn't an error
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(head)
+    except UnicodeDecodeError:
+        return True
+
+    return False
+
+
+def search_binary(
+    data: Data, pattern: regex.Pattern, pos: int, binary_files: str
+) -> int:
+    """
+    Return BINARY_MATCH if binary files are reported and data has a match from
+    pos, BINARY_DATA otherwise. Stops at the first match.
+    """
+    if binary_files == BINARY:
+        for _ in matching_lines(data, pattern, pos, errors="surrogateescape"):
+            return BINARY_MATCH
+
+    return BINARY_DATA
+
+
+class Context:
+    """
+    Works out the context lines written around matching lines for -A, -B and
+    -C. Lines before a match are found by scanning data backwards for
+    newlines from the start of its line, lines after it by scanning forwards
+    from the end of the last line written, so only lines that are written are
+    ever decoded. Line numbers are counted from 1 at the start of data.
+
+    For data that comes in blocks, as stdin does, next_block keeps the last
+    lines of a block in a ring buffer of -B lines, for the matches at the
+    start of the next block.
+    """
+
+    def __init__(self, before: int, after: int):
+        self._before = before
+        self._after = after
+
+        # The number of the last line written, 0 if none, the offset of the
+        # line after it and how many lines after it are still due with -A
+        self._last = 0
+        self._next = 0
+        self._after_left = 0
+
+        # The numbers and text of the last lines before data
+        self._kept: deque[tuple[int, str]] = deque(maxlen=before)
+
+    def before(self, data: Data, start: int, line_num: int) -> list[tuple[int, str]]:
+        """
+        Return the number and text of the context lines to write before the
+        line of data at start, numbered line_num, and take that line as
+        written.
+        """
+        lines = self._lines_after(data, line_num)
+        first = max(line_num - self._before, self._last + 1)
+        lines.extend(line for line in self._kept if line[0] >= first)
+
+        found = []
+        pos = start
+        for num in range(line_num - 1, max(first, 1) - 1, -1):
+            end = pos - 1
+            pos = data.rfind(b"\n", 0, end) + 1
+            found.append((num, _decode_line(data[pos:end])))
+        lines.extend(reversed(found))
+
+        end = data.find(b"\n", start)
+        self._last = line_num
+        self._next = len(data) if end == -1 else end + 1
+        self._after_left = self._after
+
+        return lines
+
+    def pending(self) -> bool:
+        """Return whether context lines after the last line written are due."""
+        return self._after_left > 0
+
+    def after(self, data: Data) -> list[tuple[int, str]]:
+        """
+        Return the number and text of the context lines still due after the
+        last line written, up to the end of data.
+        """
+        return self._lines_after(data, -1)
+
+    def next_block(self, data: bytes, newlines: int):
+        """
+        Move on to the block of data after data, which holds newlines lines.
+        Lines of data that weren't written are kept for the next block, and
+        line numbers are counted from its start from then on.
+        """
+        first = max(newlines - self._before + 1, self._last + 1, 1)
+        end = data.rfind(b"\n")
+
+        kept = []
+        for num in range(newlines, first - 1, -1):
+            start = data.rfind(b"\n", 0, end) + 1
+            kept.append((num, _decode_line(data[start:end])))
+            end = start - 1
+
+        self._kept.extend(reversed(kept))
+        self._kept = deque(
+            ((num - newlines, line) for num, line in self._kept), maxlen=self._before
         )
+        self._last -= newlines
+        self._next = 0
+
+    def _lines_after(self, data: Data, until: int) -> list[tuple[int, str]]:
+        # Lines after the last one written, up to line until unless it's -1
+        lines = []
+        pos = self._next
 
-        n += len(matches)
-        line_num += 1
+        while self._after_left > 0 and self._last + 1 != until and pos < len(data):
+            end = data.find(b"\n", pos)
+            if end == -1:
+                end = len(data)
 
+            self._last += 1
+            self._after_left -= 1
+            lines.append((self._last, _decode_line(data[pos:end])))
+            pos = end + 1
+
+        self._next = pos
+        return lines
+
+
+def _decode_line(line: bytes) -> str:
+    # Context lines are written back out unchanged even if they aren't UTF-8
+    return line.decode(errors="surrogateescape").removesuffix("\r")
+
+
+def new_context(args: argparse.Namespace) -> Context | None:
+    if not args.context:
+        return None
+    return Context(args.before_context, args.after_context)
+
+
+def search_data(
+    data: Data,
+    pattern: regex.Pattern,
+    binary_files: str,
+    sniff: bool,
+    found: Callable[[int, str, list[regex.Match] | None], None] | None,
+    max_lines: int = -1,
+    context: Context | None = None,
+) -> tuple[int, int]:
+    """
+    Call found with the line number, text and matches of every line of data
+    with a match, up to max_lines of them unless it's -1, and return the
+    number of those lines and whether data was all text, as TEXT_DATA, or
+    turned out to be binary, as BINARY_DATA or BINARY_MATCH. When found is
+    None the lines are only counted, without finding their matches. Given a
+    context, found is also called for the context lines around those lines,
+    with None for matches.
+
+    Unless binary_files is TEXT, lines are only searched as text up to the
+    first line that isn't valid UTF-8, and not at all if sniff is given and
+    data looks binary from the start.
+    """
+    # Once max_lines lines were found only the context lines after the last
+    # one are left to write
+    if max_lines == 0:
+        if context is not None:
+            for num, text in context.after(data):
+                found(num, text, None)
+        return 0, TEXT_DATA
+
+    # Like GNU grep, -c counts the lines of binary files as if they were text
+    if found is None and binary_files != WITHOUT_MATCH:
+        n, _ = pattern.count_lines(data, errors="surrogateescape", limit=max_lines)
+        return n, TEXT_DATA
+
+    if binary_files == TEXT:
+        errors = "surrogateescape"
+    elif sniff and looks_binary(data):
+        return 0, search_binary(data, pattern, 0, binary_files)
+    else:
+        errors = "strict"
+
+    # The lines before the first one that isn't text are counted, as they
+    # would be written
+    if found is None:
+        n, binary_pos = pattern.count_lines(data, errors=errors, limit=max_lines)
+        if binary_pos != -1:
+            return n, search_binary(data, pattern, binary_pos, binary_files)
+        return n, TEXT_DATA
 
-def search_file(file: Path, pattern: regex.Pattern, args: argparse.Namespace) -> int:
     n = 0
+    lines = matching_lines(data, pattern, errors=errors)
 
-    with open(file) as f:
-        try:
-            for line_num, line in enumerate(f, start=1):
-                line = line.rstrip("\n")
-                matches = pattern.findall(line)
-
-                if len(matches) == 0:
-                    continue
-
-                print_matches(
-                    matches,
-                    file,
-                    line,
-                    line_num,
-                    args,
-                )
+    try:
+        for line_num, start, line, matches in lines:
+            if context is not None:
+                for num, text in context.before(data, start, line_num):
+                    found(num, text, None)
 
-                n += len(matches)
-        except UnicodeDecodeError:
-            return 0
+            found(line_num, line, matches)
+            n += 1
+            if n == max_lines:
+                break
+    except BinaryData as e:
+        return n, search_binary(data, pattern, e.pos, binary_files)
+
+    if context is not None:
+        for num, text in context.after(data):
+            found(num, text, None)
+
+    return n, TEXT_DATA
+
+
+def report_binary(file: str | None, output: Output):
+    name = STDIN_NAME if file is None else file
+    output.write(f"Binary file {name} matches\n")
+
+
+def finish_file(
+    file: str | None, n: int, binary: int, args: argparse.Namespace, output: Output
+) -> int:
+    """
+    Write what's left to write for a file once its n matching lines have been
+    searched: its name for -l or -L, its count for -c, or that it's a binary
+    file that matches. Return n, which counts towards the exit status. Like
+    GNU grep since 3.5, that holds for -L too, so it exits with 0 only if
+    some line matched, whether or not a file was listed.
+    """
+    name = STDIN_NAME if file is None else file
+
+    if args.files_without_match:
+        if n == 0 and not args.quiet:
+            output.write(f"{output.formatter.file_name(name)}\n")
+        return n
+
+    if args.count:
+        output.write(f"{output.formatter.file_prefix(file)}{n}\n")
+        return n
+
+    if args.quiet or n == 0:
+        return n
+
+    if args.files_with_matches:
+        output.write(f"{output.formatter.file_name(name)}\n")
+    elif binary == BINARY_MATCH:
+        report_binary(file, output)
 
     return n
 
 
-def search_dir(dir: Path, pattern: regex.Pattern, args: argparse.Namespace) -> int:
+@contextmanager
+def file_data(file: str, mmap_threshold: int) -> Iterator[Data]:
+    """
+    Open file for searching. Files of at least mmap_threshold bytes are mapped
+    into memory and searched in place, smaller ones are read with a single
+    read(), which costs less than setting up a mapping.
+    """
+    with open(file, "rb") as f:
+        # Pipes and other special files have no size and are always read
+        if os.fstat(f.fileno()).st_size < max(mmap_threshold, 1):
+            yield f.read()
+            return
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if hasattr(mmap, "MADV_SEQUENTIAL"):
+                data.madvise(mmap.MADV_SEQUENTIAL)
+            yield data
+
+
+def search_file(
+    file: str, pattern: regex.Pattern, args: argparse.Namespace, output: Output
+) -> int:
+    file_prefix = output.formatter.file_prefix(file)
+    context_prefix = output.formatter.file_prefix(file, "-")
+    context = new_context(args)
+
+    def found(line_num: int, line: str, matches: list[regex.Match] | None):
+        if args.list_files:
+            return
+        if context is not None:
+            output.separate(file, line_num)
+
+        if matches is None:
+            output.write_context(context_prefix, line_num, line)
+        else:
+            output.write_matches(file_prefix, line_num, matches, line)
+
+    with file_data(file, args.mmap_threshold) as data:
+        n, binary = search_data(
+            data,
+            pattern,
+            args.binary_files,
+            True,
+            None if args.count else found,
+            args.max_lines,
+            context,
+        )
+
+    if binary == BINARY_MATCH:
+        n += 1
+
+    return finish_file(file, n, binary, args, output)
+
+
+# Most bytes read from stdin at once when searching with one process
+STDIN_BLOCK_SIZE = 1 << 20
+
+
+def stdin_blocks(size: int, wait: bool) -> Iterator[bytes]:
+    """
+    Yield the bytes read from stdin in blocks of up to size bytes, each
+    completed up to the end of its last line so no line is split. Unless wait
+    is given a block holds what's already available rather than waiting for
+    size bytes, so a slow pipe's lines are searched as they come in.
+
+    When stdin has no binary buffer its text is read and encoded as UTF-8.
+    """
+    stdin = getattr(sys.stdin, "buffer", sys.stdin)
+    read = stdin.read if wait or not hasattr(stdin, "read1") else stdin.read1
+
+    while True:
+        data = read(size)
+        if len(data) == 0:
+            return
+
+        if not data.endswith(b"\n" if isinstance(data, bytes) else "\n"):
+            data += stdin.readline()
+        if isinstance(data, str):
+            data = data.encode()
+
+        yield data
+
+
+def search_stdin(
+    pattern: regex.Pattern, args: argparse.Namespace, output: Output
+) -> int:
+    # Context lines can reach across chunks, so stdin is then searched here
+    if args.jobs > 1 and not args.context:
+        return search_parallel(stdin_batches(args.chunk_size), [None], args, output)
+
     n = 0
-    for dirpath, _, filenames in dir.walk():
-        for filename in filenames:
-            n += search_file(dirpath / filename, pattern, args)
+    line_offset = 0
+    binary = TEXT_DATA
+    context = new_context(args)
 
-    return n
+    def found(line_num: int, line: str, matches: list[regex.Match] | None):
+        if args.list_files:
+            return
+        if context is not None:
+            output.separate(None, line_offset + line_num)
 
+        if matches is None:
+            output.write_context("", line_offset + line_num, line)
+        else:
+            output.write_matches("", line_offset + line_num, matches, line)
+
+    for block, data in enumerate(stdin_blocks(STDIN_BLOCK_SIZE, wait=False)):
+        # Once stdin turns out to be binary it's only searched for a match
+        if binary == BINARY_DATA:
+            binary = search_binary(data, pattern, 0, args.binary_files)
+        else:
+            max_lines = -1 if args.max_lines == -1 else args.max_lines - n
+            block_n, binary = search_data(
+                data,
+                pattern,
+                args.binary_files,
+                block == 0,
+                None if args.count else found,
+                max_lines,
+                context,
+            )
+            n += block_n
+
+            newlines = data.count(b"\n")
+            line_offset += newlines
+            if context is not None:
+                context.next_block(data, newlines)
+
+        if n == args.max_lines and (context is None or not context.pending()):
+            break
+        if binary == BINARY_MATCH or (
+            binary == BINARY_DATA and args.binary_files != BINARY
+        ):
+            break
+
+    if binary == BINARY_MATCH:
+        n += 1
+
+    return finish_file(None, n, binary, args, output)
+
+
+def walk_dir(
+    dir: str,
+    prune_dir: Callable[[os.DirEntry], bool] | None = None,
+    skip_file: Callable[[os.DirEntry], bool] | None = None,
+) -> Iterator[str]:
+    """
+    Yield the path of every file under dir, depth first: the files of a
+    directory in order of name, then the files under each of its
+    subdirectories. Subdirectories for which prune_dir returns True are skipped
+    without being opened, as are files for which skip_file does.
+
+    Entries are read with os.scandir, which mostly knows the type of an entry
+    without a stat call. Symbolic links to directories aren't followed.
+    """
+    stack = [dir]
+
+    while len(stack) != 0:
+        path = stack.pop()
+        # Paths under '.' are written without a leading './'
+        prefix = "" if path == "." else os.path.join(path, "")
+
+        try:
+            with os.scandir(path) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError as e:
+            print(f"{path}: {e.strerror}", file=sys.stderr)
+            continue
+
+        subdirs = []
+
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if prune_dir is None or not prune_dir(entry):
+                        subdirs.append(prefix + entry.name)
+                elif entry.is_file():
+                    if skip_file is None or not skip_file(entry):
+                        yield prefix + entry.name
+            except OSError:
+                continue
+
+        stack.extend(reversed(subdirs))
 
-def search_files(pattern: regex.Pattern, args: argparse.Namespace) -> int:
-    num_matches = 0
+
+# Number of items prefetch hands over at once, so the queue isn't locked for
+# every single file
+PREFETCH_BATCH = 64
+
+
+def prefetch(items: Iterator[T], size: int = 64) -> Iterator[T]:
+    """
+    Yield items as they are produced by a thread that runs up to size batches
+    ahead, so producing them, such as walking a directory, overlaps with the
+    work done on each one.
+    """
+    queue = Queue(size)
+    done = object()
+    errors = []
+
+    def produce():
+        try:
+            batch = []
+            for item in items:
+                batch.append(item)
+                if len(batch) == PREFETCH_BATCH:
+                    queue.put(batch)
+                    batch = []
+            queue.put(batch)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            queue.put(done)
+
+    # A daemon thread, so it doesn't keep the program alive if items are
+    # abandoned before the end
+    Thread(target=produce, daemon=True).start()
+
+    while (batch := queue.get()) is not done:
+        yield from batch
+
+    if len(errors) != 0:
+        raise errors[0]
+
+
+def walk_tree(
+    dir: str, names: NameFilter, args: argparse.Namespace
+) -> Iterator[str]:
+    """
+    Yield every file under dir whose name passes names, and that isn't
+    ignored by the .gitignore and .ignore files in the tree, or the global
+    ignore file, unless --no-ignore is given.
+    """
+    hooks = []
+    if not names.is_empty():
+        hooks.append((names.skips_dir, names.skips_file))
+    if not args.no_ignore:
+        rules = IgnoreRules(dir, global_ignore_file())
+        hooks.append((rules.ignores_dir, rules.ignores_file))
+
+    if len(hooks) == 0:
+        return walk_dir(dir)
+    if len(hooks) == 1:
+        return walk_dir(dir, *hooks[0])
+
+    # Names are checked first, since that doesn't read any ignore files
+    (names_dir, names_file), (rules_dir, rules_file) = hooks
+    return walk_dir(
+        dir,
+        prune_dir=lambda entry: names_dir(entry) or rules_dir(entry),
+        skip_file=lambda entry: names_file(entry) or rules_file(entry),
+    )
+
+
+def find_files(args: argparse.Namespace) -> Iterator[str]:
+    """
+    Yield every file to search in order, reporting FILE arguments that can't be
+    searched on stderr.
+    """
+    names = NameFilter(
+        args.include + [glob for name in args.type for glob in FILE_TYPES[name]],
+        args.exclude,
+        args.exclude_dir,
+    )
+
+    if len(args.FILE) == 0:
+        yield from walk_tree(".", names, args)
+        return
 
     for file in args.FILE:
         path = Path(file)
@@ -125,15 +777,391 @@ def search_files(pattern: regex.Pattern, args: argparse.Namespace) -> int:
             continue
 
         if path.is_file():
-            num_matches += search_file(path, pattern, args)
+            yield str(path)
         elif args.recursive:
-            num_matches += search_dir(path, pattern, args)
+            yield from walk_tree(str(path), names, args)
         else:
             print(f"{path}: Is a directory", file=sys.stderr)
 
+
+def search_files(
+    pattern: regex.Pattern, args: argparse.Namespace, output: Output
+) -> int:
+    if args.jobs > 1:
+        files = list(find_files(args))
+
+        # Context lines can reach across chunks, so files are then searched
+        # whole by one process each
+        chunk_size = sys.maxsize if args.context else args.chunk_size
+        return search_parallel(make_batches(files, chunk_size), files, args, output)
+
+    num_matches = 0
+    for file in prefetch(find_files(args)):
+        num_matches += search_file(file, pattern, args, output)
+
+        # With -q the first match decides the exit status
+        if args.quiet and num_matches != 0:
+            break
+
+    return num_matches
+
+
+# A batch of files sent to a worker holds up to this many bytes or files, so
+# small files don't cost a round trip to the pool each
+BATCH_BYTES = 1 << 20
+BATCH_FILES = 64
+
+# Compiled in each worker process by init_worker
+_worker_pattern = None
+_worker_formatter = None
+_worker_args = None
+
+
+class Part(NamedTuple):
+    """
+    A piece of the input searched by a worker, either a whole file, the bytes
+    start to end of a file that was split into chunks, or data read from
+    stdin. Parts are numbered by seq in the order their output is written,
+    last marks the last part of a file.
+    """
+
+    seq: int
+    file_index: int
+    chunk: int
+    file: str | None
+    last: bool = True
+    start: int = 0
+    end: int = -1
+    data: bytes | None = None
+
+
+# The number of matching lines, the number of newlines, the line number,
+# counted from the start of the part, output and whether it matched of every
+# line with a match or context line, unless only files are listed, and
+# whether the part was all text, as returned by search_data
+PartResult = tuple[int, int, list[tuple[int, list[str], bool]], int]
+
+
+def init_worker(args: argparse.Namespace):
+    global _worker_pattern, _worker_formatter, _worker_args
+    _worker_pattern = compile_pattern(args)
+    _worker_formatter = Formatter(args)
+    _worker_args = args
+
+
+@contextmanager
+def part_data(part: Part) -> Iterator[Data]:
+    if part.data is not None:
+        yield part.data
+        return
+
+    with file_data(part.file, _worker_args.mmap_threshold) as data:
+        yield data if part.end == -1 else data[part.start : part.end]
+
+
+def search_part(part: Part) -> PartResult:
+    args = _worker_args
+    lines = []
+
+    def found(line_num: int, line: str, matches: list[regex.Match] | None):
+        if args.list_files:
+            return
+
+        if matches is None:
+            lines.append((line_num, _worker_formatter.format_context(line), False))
+        else:
+            lines.append((line_num, _worker_formatter.format_line(matches, line), True))
+
+    # Only the start of a file or stdin is sniffed, like in search_file
+    with part_data(part) as data:
+        # Line numbers aren't needed to count lines
+        newlines = 0 if args.count else count_newlines(data, 0, len(data))
+        n, binary = search_data(
+            data,
+            _worker_pattern,
+            args.binary_files,
+            part.chunk == 0,
+            None if args.count else found,
+            args.max_lines,
+            new_context(args),
+        )
+
+    return n, newlines, lines, binary
+
+
+def search_batch(batch: list[Part]) -> list[tuple[Part, PartResult]]:
+    """
+    Search each part of batch in a worker, returning every part, without its
+    data, and its result. With -q the rest of the batch is dropped after the
+    first part with a match.
+    """
+    results = []
+
+    for part in batch:
+        result = search_part(part)
+        results.append((part._replace(data=None), result))
+
+        n, _, _, binary = result
+        if _worker_args.quiet and (n != 0 or binary == BINARY_MATCH):
+            break
+
+    return results
+
+
+def split_file(file: str, chunk_size: int) -> list[tuple[int, int]]:
+    """
+    Return the start and end offsets of chunks of about chunk_size bytes that
+    file is split into. Chunks end after a newline, so no line is split.
+    """
+    ranges = []
+
+    with open(file, "rb") as f, mmap.mmap(
+        f.fileno(), 0, access=mmap.ACCESS_READ
+    ) as data:
+        start = 0
+        while start < len(data):
+            end = data.find(b"\n", start + chunk_size - 1)
+            end = len(data) if end == -1 else end + 1
+            ranges.append((start, end))
+            start = end
+
+    return ranges
+
+
+def make_batches(files: list[str], chunk_size: int) -> Iterator[list[Part]]:
+    """
+    Split files bigger than chunk_size into chunks and group files and chunks
+    into batches, largest first so the pool isn't left waiting on a big file
+    that was started last.
+    """
+    parts, sizes = [], []
+
+    for index, file in enumerate(files):
+        try:
+            size = os.stat(file).st_size
+        except OSError:
+            size = 0
+
+        ranges = [(0, -1)]
+        if size > chunk_size:
+            try:
+                ranges = split_file(file, chunk_size)
+            except OSError:
+                pass
+
+        for chunk, (start, end) in enumerate(ranges):
+            last = chunk == len(ranges) - 1
+            parts.append(Part(len(parts), index, chunk, file, last, start, end))
+            sizes.append(size if end == -1 else end - start)
+
+    batch, batch_bytes = [], 0
+
+    for seq in sorted(range(len(parts)), key=lambda i: sizes[i], reverse=True):
+        batch.append(parts[seq])
+        batch_bytes += sizes[seq]
+
+        if batch_bytes >= BATCH_BYTES or len(batch) >= BATCH_FILES:
+            yield batch
+            batch, batch_bytes = [], 0
+
+    if len(batch) != 0:
+        yield batch
+
+
+def stdin_batches(chunk_size: int) -> Iterator[list[Part]]:
+    """
+    Read stdin in chunks of about chunk_size bytes and yield a batch for every
+    chunk. Each chunk is read before the one before it is yielded, to know
+    which is the last.
+    """
+    blocks = stdin_blocks(chunk_size, wait=True)
+    data = next(blocks, None)
+    chunk = 0
+
+    # Empty stdin is searched as one empty chunk, to be finished like a file
+    if data is None:
+        data = b""
+
+    while data is not None:
+        following = next(blocks, None)
+        yield [Part(chunk, 0, chunk, None, following is None, data=data)]
+        data = following
+        chunk += 1
+
+
+def search_parallel(
+    batches: Iterator[list[Part]],
+    files: list[str | None],
+    args: argparse.Namespace,
+    output: Output,
+) -> int:
+    """
+    Search batches across a pool of args.jobs processes. Output is written in
+    the order of files, unless --sort=none is given, then as soon as it's
+    ready. The chunks of a file are always written in order, since a chunk's
+    line numbers depend on the number of lines in the chunks before it.
+    """
+    num_matches = 0
+    found_match = False
+
+    # Results of parts that finished before one that comes earlier in order,
+    # by seq. The chunks of a file have consecutive seqs
+    finished: dict[int, tuple[Part, PartResult]] = {}
+    next_seq = 0
+    next_chunk = [0] * len(files)
+
+    # Lines before the next chunk of each file, its number of matching lines,
+    # whether it's binary, and whether nothing more is written for it, once
+    # -m NUM lines, or with -l, one, have been written
+    line_offsets = [0] * len(files)
+    file_lines = [0] * len(files)
+    binary_files = [TEXT_DATA] * len(files)
+    done_files = [False] * len(files)
+
+    def write_part(seq: int):
+        nonlocal num_matches, found_match
+        part, result = finished.pop(seq)
+        index = part.file_index
+        next_chunk[index] += 1
+
+        write_result(index, result)
+        found_match = found_match or file_lines[index] != 0
+
+        if part.last:
+            num_matches += finish_file(
+                part.file, file_lines[index], binary_files[index], args, output
+            )
+
+    def write_result(file_index: int, result: PartResult):
+        n, newlines, lines, binary = result
+
+        if done_files[file_index]:
+            return
+
+        # The chunks after the one where a file turned out to be binary are
+        # only looked at for a match to report
+        if binary_files[file_index] != TEXT_DATA:
+            if (
+                binary_files[file_index] == BINARY_DATA
+                and args.binary_files == BINARY
+                and (n > 0 or binary == BINARY_MATCH)
+            ):
+                binary_files[file_index] = BINARY_MATCH
+                file_lines[file_index] += 1
+                done_files[file_index] = True
+            return
+
+        # Each chunk was searched for up to max_lines lines on its own. Files
+        # with context lines aren't split, so they never have lines to cut
+        if args.max_lines != -1:
+            room = args.max_lines - file_lines[file_index]
+            if n > room:
+                lines = lines[:room]
+            if n >= room:
+                n, binary = room, TEXT_DATA
+                done_files[file_index] = True
+
+        file = files[file_index]
+        file_prefix = output.formatter.file_prefix(file)
+        context_prefix = output.formatter.file_prefix(file, "-")
+        offset = line_offsets[file_index]
+
+        for line_num, strings, matched in lines:
+            if args.context:
+                output.separate(file_index, offset + line_num)
+
+            if matched:
+                prefix = output.formatter.line_prefix(file_prefix, offset + line_num)
+            else:
+                prefix = output.formatter.line_prefix(
+                    context_prefix, offset + line_num, "-"
+                )
+            output.write_lines(prefix, strings)
+
+        line_offsets[file_index] += newlines
+        file_lines[file_index] += n
+        binary_files[file_index] = binary
+
+        if binary == BINARY_MATCH:
+            file_lines[file_index] += 1
+            done_files[file_index] = True
+
+    def can_write(seq: int) -> bool:
+        if seq not in finished:
+            return False
+        part, _ = finished[seq]
+        return part.chunk == next_chunk[part.file_index]
+
+    with ProcessPoolExecutor(
+        max_workers=args.jobs, initializer=init_worker, initargs=(args,)
+    ) as pool:
+        pending = set()
+
+        while True:
+            # Only a couple of batches per worker are queued at any time
+            while len(pending) < 2 * args.jobs:
+                batch = next(batches, None)
+                if batch is None:
+                    break
+                pending.add(pool.submit(search_batch, batch))
+
+            if len(pending) == 0:
+                break
+
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                for part, result in future.result():
+                    finished[part.seq] = (part, result)
+
+                    # With -q a match decides the exit status right away, as a
+                    # worker drops the parts of its batch after the first
+                    # match, and parts before it may never come back. Only a
+                    # later chunk of a file that may have turned out binary
+                    # without a match has to wait for the chunks before it
+                    n, _, _, binary = result
+                    if (
+                        args.quiet
+                        and (n != 0 or binary == BINARY_MATCH)
+                        and (part.chunk == 0 or args.binary_files != WITHOUT_MATCH)
+                    ):
+                        found_match = True
+
+                    # Following chunks of the file may be waiting on this one
+                    seq = part.seq
+                    while args.sort == SORT_NONE and can_write(seq):
+                        write_part(seq)
+                        seq += 1
+
+            while can_write(next_seq):
+                write_part(next_seq)
+                next_seq += 1
+
+            # With -q the first match decides the exit status, so queued
+            # batches are cancelled and only the running ones waited for
+            if args.quiet and found_match:
+                pool.shutdown(wait=False, cancel_futures=True)
+                return 1
+
     return num_matches
 
 
+DEFAULT_CHUNK_SIZE = 8 << 20
+DEFAULT_MMAP_THRESHOLD = 1 << 20
+
+SIZE_SUFFIXES = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+
+
+def parse_size(value: str) -> int:
+    scale = SIZE_SUFFIXES.get(value[-1:].upper(), 1)
+    digits = value[:-1] if scale != 1 else value
+
+    if not digits.isdigit() or int(digits) == 0:
+        raise argparse.ArgumentTypeError(f"invalid size: {value!r}")
+
+    return int(digits) * scale
+
+
 def parse_command_line_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(
         description=(
@@ -152,6 +1180,94 @@ def parse_command_line_args() -> argparse.Namespace:
             "file in the directory for PATTERN"
         ),
     )
+    parser.add_argument(
+        "--include",
+        action="append",
+        default=[],
+        metavar="GLOB",
+        help=(
+            "when recursing, only search files whose name matches\n"
+            "GLOB, can be given several times"
+        ),
+    )
+    parser.add_argument(
+        "--exclude",
+        action="append",
+        default=[],
+        metavar="GLOB",
+        help="when recursing, skip files whose name matches GLOB",
+    )
+    parser.add_argument(
+        "--exclude-dir",
+        action="append",
+        default=[],
+        metavar="GLOB",
+        help="when recursing, skip directories whose name matches GLOB",
+    )
+    parser.add_argument(
+        "-t",
+        "--type",
+        action="append",
+        default=[],
+        choices=sorted(FILE_TYPES),
+        metavar="TYPE",
+        help=(
+            "when recursing, only search files of TYPE, one of\n"
+            + "\n".join(wrap(", ".join(sorted(FILE_TYPES)), 54))
+        ),
+    )
+    parser.add_argument(
+        "--no-ignore",
+        action="store_true",
+        help=(
+            "search files ignored by .gitignore and .ignore files and\n"
+            "the global git ignore file, and .git directories"
+        ),
+    )
+    parser.add_argument(
+        "-e",
+        "--regexp",
+        dest="patterns",
+        action="append",
+        metavar="PATTERN",
+        help="use PATTERN for matching, can be given several times",
+    )
+    parser.add_argument(
+        "-f",
+        "--file",
+        dest="patterns",
+        action="append",
+        type=Path,
+        metavar="FILE",
+        help="read patterns from FILE, one per line",
+    )
+    parser.add_argument(
+        "-F",
+        "--fixed-strings",
+        action="store_true",
+        help=(
+            "interpret PATTERN as a list of fixed strings,\n"
+            "separated by newlines, instead of a regular expression"
+        ),
+    )
+    parser.add_argument(
+        "-i",
+        "--ignore-case",
+        action="store_true",
+        help="ignore case distinctions in PATTERN and input data",
+    )
+    parser.add_argument(
+        "-w",
+        "--word-regexp",
+        action="store_true",
+        help="only match PATTERN where it forms whole words",
+    )
+    parser.add_argument(
+        "-x",
+        "--line-regexp",
+        action="store_true",
+        help="only match PATTERN where it forms whole lines",
+    )
     parser.add_argument(
         "-o",
         "--only-matching",
@@ -164,6 +1280,90 @@ def parse_command_line_args() -> argparse.Namespace:
         action="store_true",
         help="print line number with output lines",
     )
+    parser.add_argument(
+        "-A",
+        "--after-context",
+        type=int,
+        metavar="NUM",
+        help="print NUM lines of context after each matching line",
+    )
+    parser.add_argument(
+        "-B",
+        "--before-context",
+        type=int,
+        metavar="NUM",
+        help="print NUM lines of context before each matching line",
+    )
+    parser.add_argument(
+        "-C",
+        "--context",
+        dest="context_lines",
+        type=int,
+        metavar="NUM",
+        help=(
+            "print NUM lines of context before and after each\n"
+            "matching line, groups of lines that aren't next to\n"
+            "each other are separated by '--'"
+        ),
+    )
+    parser.add_argument(
+        "-c",
+        "--count",
+        action="store_true",
+        help=(
+            "print only the number of matching lines of each\n"
+            "file, instead of the lines"
+        ),
+    )
+    parser.add_argument(
+        "-m",
+        "--max-count",
+        type=int,
+        default=-1,
+        metavar="NUM",
+        help="stop searching a file after NUM matching lines",
+    )
+    parser.add_argument(
+        "-l",
+        "--files-with-matches",
+        action="store_true",
+        help=(
+            "print only the name of each file with a match,\n"
+            "searching it no further after its first match"
+        ),
+    )
+    parser.add_argument(
+        "-L",
+        "--files-without-match",
+        action="store_true",
+        help=(
+            "print only the name of each file without a match,\n"
+            "still exiting with 0 only if some line matched"
+        ),
+    )
+    parser.add_argument(
+        "-q",
+        "--quiet",
+        "--silent",
+        action="store_true",
+        help=(
+            "print nothing and exit with status 0 at the first\n"
+            "match found"
+        ),
+    )
+    parser.add_argument(
+        "--binary-files",
+        choices=[BINARY, TEXT, WITHOUT_MATCH],
+        default=BINARY,
+        metavar="TYPE",
+        help=(
+            "how to search files that hold a NUL byte or aren't\n"
+            "valid UTF-8 (default: binary)\n"
+            "binary: Print 'Binary file FILE matches' at the first match\n"
+            "text: Search and print lines as if the file were text\n"
+            "without-match: Skip the file"
+        ),
+    )
     parser.add_argument(
         "--color",
         choices=[ALWAYS, NEVER, AUTO],
@@ -174,28 +1374,173 @@ def parse_command_line_args() -> argparse.Namespace:
             "never: Never highlight matches in output"
         ),
     )
-    parser.add_argument("PATTERN", help="regular expression pattern")
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        metavar="N",
+        help="search files with N processes",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=parse_size,
+        default=DEFAULT_CHUNK_SIZE,
+        metavar="SIZE",
+        help=(
+            "when searching with several processes, split stdin and\n"
+            "files bigger than SIZE bytes into chunks of about SIZE\n"
+            "bytes that are searched in parallel. SIZE may end in\n"
+            "K, M or G (default: 8M)"
+        ),
+    )
+    parser.add_argument(
+        "--mmap-threshold",
+        type=parse_size,
+        default=DEFAULT_MMAP_THRESHOLD,
+        metavar="SIZE",
+        help=(
+            "search files of at least SIZE bytes by mapping them into\n"
+            "memory instead of reading them. SIZE may end in K, M or G\n"
+            "(default: 1M)"
+        ),
+    )
+    parser.add_argument(
+        "--sort",
+        choices=[SORT_PATH, SORT_NONE],
+        default=SORT_PATH,
+        help=(
+            "path: Print the output of files in the order they are found\n"
+            "none: Print the output of each file as soon as it is searched,\n"
+            "      in any order, when searching with several processes"
+        ),
+    )
+    parser.add_argument(
+        "--lint",
+        action="store_true",
+        help=(
+            "warn about constructs in PATTERN that can make\n"
+            "matching take exponential or polynomial time"
+        ),
+    )
+    parser.add_argument(
+        "PATTERN",
+        nargs="?",
+        help="regular expression pattern, omitted when -e or -f is given",
+    )
     parser.add_argument("FILE", nargs="*", help="Search for PATTERN in each FILE")
 
-    return parser.parse_args()
+    args = parser.parse_args()
+
+    if args.jobs < 1:
+        parser.error(f"argument -j/--jobs: invalid number of jobs: {args.jobs}")
+
+    # With -e or -f every positional argument is a FILE
+    if args.patterns is None:
+        if args.PATTERN is None:
+            parser.error("the following arguments are required: PATTERN")
+        args.patterns = [args.PATTERN]
+    elif args.PATTERN is not None:
+        args.FILE.insert(0, args.PATTERN)
+
+    # Whether a file has a match is all that's needed for -l, -L and -q, so
+    # its search stops at the first matching line
+    args.list_files = args.quiet or args.files_with_matches or args.files_without_match
+    args.max_lines = max(args.max_count, -1)
+    if args.list_files:
+        args.max_lines = 1 if args.max_lines == -1 else min(1, args.max_lines)
+
+    # -l, -L and -q take precedence over -c
+    args.count = args.count and not args.list_files
+
+    for option, value in [
+        ("-A/--after-context", args.after_context),
+        ("-B/--before-context", args.before_context),
+        ("-C/--context", args.context_lines),
+    ]:
+        if value is not None and value < 0:
+            parser.error(f"argument {option}: invalid context length: {value}")
+
+    # Like in GNU grep, groups of lines are separated once any of -A, -B and
+    # -C is given, even with 0 lines of context. With -o the context lines
+    # still decide the groups, but aren't written themselves
+    given = [args.after_context, args.before_context, args.context_lines]
+    args.context = any(value is not None for value in given) and not (
+        args.list_files or args.count
+    )
+
+    # -A and -B take precedence over -C
+    if args.after_context is None:
+        args.after_context = args.context_lines or 0
+    if args.before_context is None:
+        args.before_context = args.context_lines or 0
+
+    return args
+
+
+def read_patterns(args: argparse.Namespace) -> Iterator[str]:
+    """
+    Yield every pattern given with -e, or on the command line, and in the files
+    given with -f, in order. Pattern files are read one line at a time.
+    """
+    for source in args.patterns:
+        if isinstance(source, str):
+            yield from source.split("\n")
+            continue
+
+        with open(source) as f:
+            for line in f:
+                yield line.rstrip("\n")
+
+
+def compile_pattern(args: argparse.Namespace) -> regex.Pattern:
+    flags = regex.RegexFlag(0)
+    if args.ignore_case:
+        flags |= regex.IGNORECASE
+    if args.word_regexp:
+        flags |= regex.WHOLE_WORD
+    if args.line_regexp:
+        flags |= regex.WHOLE_LINE
+
+    if args.fixed_strings:
+        return regex.compile_literal(list(read_patterns(args)), flags)
+    return regex.compile_many(read_patterns(args), flags)
 
 
 def main():
     args = parse_command_line_args()
 
+    # Like GNU grep, nothing is searched for -m 0, whatever else is asked
+    if args.max_count == 0:
+        sys.exit(1)
+
     try:
-        pattern = regex.compile(args.PATTERN)
+        pattern = compile_pattern(args)
     except regex.InvalidPattern as e:
         print("Error:", e)
         sys.exit(2)
+    except OSError as e:
+        print(f"{e.filename}: {e.strerror}", file=sys.stderr)
+        sys.exit(2)
+
+    if args.lint:
+        for warning in pattern.complexity.warnings:
+            print("Warning:", warning, file=sys.stderr)
+
+    # Decided here, worker processes don't write to the terminal themselves
+    if args.color == AUTO:
+        args.color = ALWAYS if sys.stdout.isatty() else NEVER
+
+    output = Output(Formatter(args))
 
     num_matches = 0
-    if len(args.FILE) > 0:
-        num_matches = search_files(pattern, args)
-    elif args.recursive:
-        num_matches = search_dir(Path("."), pattern, args)
-    else:
-        num_matches = search_stdin(pattern, args)
+    try:
+        if len(args.FILE) > 0 or args.recursive:
+            num_matches = search_files(pattern, args, output)
+        else:
+            num_matches = search_stdin(pattern, args, output)
+    finally:
+        output.flush()
 
     if num_matches == 0:
         sys.exit(1)
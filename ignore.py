@@ -0,0 +1,312 @@
+import os
+import re
+from typing import Sequence
+
+# Files with ignore rules read in every directory that is walked. Rules in
+# .ignore take precedence over those in .gitignore
+IGNORE_FILES = (".ignore", ".gitignore")
+
+# Globs of the file names of each type selected with grep -t
+FILE_TYPES = {
+    "c": ("*.c", "*.h"),
+    "cpp": ("*.cpp", "*.cc", "*.cxx", "*.hpp", "*.hh", "*.hxx", "*.h"),
+    "css": ("*.css", "*.scss", "*.sass", "*.less"),
+    "csv": ("*.csv", "*.tsv"),
+    "go": ("*.go",),
+    "html": ("*.html", "*.htm"),
+    "java": ("*.java",),
+    "js": ("*.js", "*.mjs", "*.cjs", "*.jsx"),
+    "json": ("*.json", "*.jsonl"),
+    "log": ("*.log", "*.log.[0-9]*"),
+    "md": ("*.md", "*.markdown"),
+    "py": ("*.py", "*.pyi"),
+    "rust": ("*.rs",),
+    "sh": ("*.sh", "*.bash", "*.zsh"),
+    "sql": ("*.sql",),
+    "toml": ("*.toml",),
+    "ts": ("*.ts", "*.tsx", "*.mts", "*.cts"),
+    "txt": ("*.txt",),
+    "xml": ("*.xml",),
+    "yaml": ("*.yaml", "*.yml"),
+}
+
+
+def glob_to_regex(glob: str) -> str:
+    """
+    Translate a gitignore glob into a regular expression for re that matches
+    paths relative to the directory of the ignore file. '*' and '?' don't
+    match '/', '**' matches across directories.
+    """
+    out = []
+    i = 0
+
+    while i < len(glob):
+        c = glob[i]
+
+        if glob.startswith("**/", i) and (i == 0 or glob[i - 1] == "/"):
+            out.append("(?:.*/)?")
+            i += 3
+        elif glob.startswith("/**", i) and i + 3 == len(glob):
+            out.append("/.*")
+            i += 3
+        elif c == "*":
+            out.append("[^/]*")
+            while i < len(glob) and glob[i] == "*":
+                i += 1
+        elif c == "?":
+            out.append("[^/]")
+            i += 1
+        elif c == "[":
+            end = _class_end(glob, i)
+            if end == -1:
+                out.append(re.escape(c))
+                i += 1
+                continue
+
+            body = glob[i + 1 : end]
+            negate = body[:1] in ("!", "^")
+            if negate:
+                body = body[1:]
+
+            body = "".join("\\" + b if b in "\\[]^" else b for b in body)
+            out.append(f"[{'^/' if negate else ''}{body}]")
+            i = end + 1
+        elif c == "\\" and i + 1 < len(glob):
+            out.append(re.escape(glob[i + 1]))
+            i += 2
+        else:
+            out.append(re.escape(c))
+            i += 1
+
+    return "".join(out)
+
+
+def _class_end(glob: str, start: int) -> int:
+    # A ']' right after '[' or '[!' is part of the class
+    i = start + 1
+    if glob[i : i + 1] in ("!", "^"):
+        i += 1
+    if glob[i : i + 1] == "]":
+        i += 1
+    return glob.find("]", i)
+
+
+class IgnoreFile:
+    """
+    The rules of one ignore file, compiled into a single regular expression
+    for directories and another for files, so a path is matched against all
+    of them at once. Rules are joined in reverse, each in a group of its own,
+    so the group that matches is the last rule matching the path, which is
+    the one that decides, as in git.
+    """
+
+    def __init__(self, lines: list[str]):
+        rules, dir_rules = [], []
+        negated, dir_negated = [], []
+
+        for line in lines:
+            rule = _parse_rule(line)
+            if rule is None:
+                continue
+
+            regex, negate, dir_only = rule
+            dir_rules.append(regex)
+            dir_negated.append(negate)
+            if not dir_only:
+                rules.append(regex)
+                negated.append(negate)
+
+        self._files = _compile(rules)
+        self._dirs = _compile(dir_rules)
+        self._negated = negated[::-1]
+        self._dir_negated = dir_negated[::-1]
+
+    @staticmethod
+    def read(path: str) -> "IgnoreFile | None":
+        """
+        Return the rules of the ignore file at path, or None if it can't be
+        read.
+        """
+        try:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                return IgnoreFile(f.read().splitlines())
+        except OSError:
+            return None
+
+    def match(self, path: str, is_dir: bool) -> bool | None:
+        """
+        Return True if path, relative to the directory of the ignore file, is
+        ignored, False if a negated rule includes it again, and None if no
+        rule matches it.
+        """
+        regex = self._dirs if is_dir else self._files
+        if regex is None:
+            return None
+
+        m = regex.fullmatch(path)
+        if m is None:
+            return None
+
+        negated = self._dir_negated if is_dir else self._negated
+        return not negated[m.lastindex - 1]
+
+
+def _parse_rule(line: str) -> tuple[str, bool, bool] | None:
+    """
+    Return the regular expression of a line of an ignore file, whether the
+    rule is negated and whether it only matches directories, or None if the
+    line holds no rule.
+    """
+    if line == "" or line.startswith("#"):
+        return None
+
+    # Trailing spaces are dropped unless escaped with a backslash
+    while line.endswith(" ") and not line.endswith("\\ "):
+        line = line[:-1]
+
+    negate = line.startswith("!")
+    if negate:
+        line = line[1:]
+
+    dir_only = line.endswith("/")
+    if dir_only:
+        line = line[:-1]
+
+    if line == "":
+        return None
+
+    # A glob with a slash before its end is relative to the directory of the
+    # ignore file, one without matches a name at any depth below it
+    anchored = "/" in line
+    regex = glob_to_regex(line.removeprefix("/"))
+    if not anchored:
+        regex = "(?:.*/)?" + regex
+
+    return regex, negate, dir_only
+
+
+def _compile(rules: list[str]) -> re.Pattern | None:
+    if len(rules) == 0:
+        return None
+    return re.compile("|".join(f"({rule})" for rule in reversed(rules)), re.DOTALL)
+
+
+class NameFilter:
+    """
+    Decides from its name alone whether to search a file or enter a
+    directory, given the globs of grep --include, --exclude and --exclude-dir.
+    The globs of each option are compiled into one regular expression, so a
+    name is matched against all of them at once.
+
+    skips_dir and skips_file are meant as the prune_dir and skip_file hooks of
+    grep.walk_dir.
+    """
+
+    def __init__(
+        self,
+        include: Sequence[str] = (),
+        exclude: Sequence[str] = (),
+        exclude_dir: Sequence[str] = (),
+    ):
+        # With no include globs every file that isn't excluded is searched
+        self._include = _compile_globs(include)
+        self._exclude = _compile_globs(exclude)
+        self._exclude_dir = _compile_globs(exclude_dir)
+
+    def is_empty(self) -> bool:
+        return self._include is self._exclude is self._exclude_dir is None
+
+    def skips_dir(self, entry: os.DirEntry) -> bool:
+        return (
+            self._exclude_dir is not None
+            and self._exclude_dir.fullmatch(entry.name) is not None
+        )
+
+    def skips_file(self, entry: os.DirEntry) -> bool:
+        name = entry.name
+        if self._include is not None and self._include.fullmatch(name) is None:
+            return True
+        return self._exclude is not None and self._exclude.fullmatch(name) is not None
+
+
+def _compile_globs(globs: Sequence[str]) -> re.Pattern | None:
+    if len(globs) == 0:
+        return None
+    return re.compile(
+        "|".join(f"(?:{glob_to_regex(glob)})" for glob in globs), re.DOTALL
+    )
+
+
+def global_ignore_file() -> str:
+    """
+    Return the path of git's global ignore file, by default
+    $XDG_CONFIG_HOME/git/ignore.
+    """
+    config = os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config")
+    return os.path.join(config, "git", "ignore")
+
+
+class IgnoreRules:
+    """
+    Decides which entries of a directory tree are ignored, for walking it from
+    root. The ignore files of every directory are read once, when the first
+    of its entries is looked at, and apply to everything below it. Rules of
+    deeper directories take precedence, then those of the global ignore file
+    apply. .git directories are always ignored.
+
+    ignores_dir and ignores_file are meant as the prune_dir and skip_file
+    hooks of grep.walk_dir.
+    """
+
+    def __init__(self, root: str, global_file: str | None = None):
+        self._root = root
+        self._global = []
+        if global_file is not None:
+            rules = IgnoreFile.read(global_file)
+            if rules is not None:
+                self._global = [(rules, root)]
+
+        # The ignore files that apply in each directory seen, deepest first,
+        # with the directory each one is in
+        self._chains: dict[str, list[tuple[IgnoreFile, str]]] = {}
+
+    def ignores_dir(self, entry: os.DirEntry) -> bool:
+        return entry.name == ".git" or self._ignored(entry, True)
+
+    def ignores_file(self, entry: os.DirEntry) -> bool:
+        return self._ignored(entry, False)
+
+    def _ignored(self, entry: os.DirEntry, is_dir: bool) -> bool:
+        dir = os.path.dirname(entry.path)
+        path = entry.name if dir == "." else os.path.join(dir, entry.name)
+
+        for rules, base in self._chain(dir):
+            relative = path if base == "." else path[len(base) + 1 :]
+            if os.sep != "/":
+                relative = relative.replace(os.sep, "/")
+
+            ignored = rules.match(relative, is_dir)
+            if ignored is not None:
+                return ignored
+
+        return False
+
+    def _chain(self, dir: str) -> list[tuple[IgnoreFile, str]]:
+        chain = self._chains.get(dir)
+        if chain is not None:
+            return chain
+
+        if dir == self._root:
+            parent = self._global
+        else:
+            parent = self._chain(os.path.dirname(dir) or ".")
+
+        chain = []
+        for name in IGNORE_FILES:
+            rules = IgnoreFile.read(os.path.join(dir, name))
+            if rules is not None:
+                chain.append((rules, dir))
+
+        chain = chain + parent if len(chain) != 0 else parent
+        self._chains[dir] = chain
+        return chain
@@ -1,4 +1,18 @@
 from .pattern import compile, Pattern, Match
+from .literal import compile_literal
+from .multi import compile_many
 from .parser import InvalidPattern
+from .flags import RegexFlag, IGNORECASE, WHOLE_WORD, WHOLE_LINE
 
-__all__ = ["compile", "Pattern", "Match", "InvalidPattern"]
\ No newline at end of file
+__all__ = [
+    "compile",
+    "compile_literal",
+    "compile_many",
+    "Pattern",
+    "Match",
+    "InvalidPattern",
+    "RegexFlag",
+    "IGNORECASE",
+    "WHOLE_WORD",
+    "WHOLE_LINE",
+]
\ No newline at end of file
@@ -0,0 +1,776 @@
+from dataclasses import dataclass
+from .nodes import (
+    Node,
+    Empty,
+    Literal,
+    Dot,
+    StartAnchor,
+    EndAnchor,
+    NoWordBefore,
+    NoWordAfter,
+    CharacterClass,
+    MetaSequence,
+    Star,
+    Plus,
+    Optional,
+    Range,
+    Alternation,
+    Group,
+    BackReference,
+    Sequence,
+    PositiveLookAhead,
+    NegativeLookAhead,
+    AtomicGroup,
+)
+from .parser import Parser, case_variants
+
+LINEAR = "linear"
+POLYNOMIAL = "polynomial"
+EXPONENTIAL = "exponential"
+
+_LEVELS = [LINEAR, POLYNOMIAL, EXPONENTIAL]
+
+
+@dataclass(frozen=True)
+class Complexity:
+    # One of LINEAR, POLYNOMIAL or EXPONENTIAL
+    level: str
+    # Human readable description of every risky construct that was found
+    warnings: tuple[str, ...]
+
+
+def complexity(ast: Node) -> Complexity:
+    """
+    Statically look for constructs that make a backtracking search blow up:
+    quantified subpatterns that can match the same text in several ways
+    (exponential), and adjacent repetitions or repetitions of a subpattern that
+    compete for the same characters (polynomial). The check is conservative, it
+    may flag patterns that are safe.
+    """
+    findings: list[tuple[str, str]] = []
+    _find_risks(ast, findings)
+
+    level = LINEAR
+    for risk, _ in findings:
+        level = max(level, risk, key=_LEVELS.index)
+
+    return Complexity(level=level, warnings=tuple(msg for _, msg in findings))
+
+
+def _find_risks(node: Node, findings: list[tuple[str, str]]):
+    match node:
+        case Sequence(nodes=children):
+            _find_competing_repetitions(children, findings)
+            for child in children:
+                _find_risks(child, findings)
+
+        case Alternation(options=children):
+            for child in children:
+                _find_risks(child, findings)
+
+        case Star(node=child) | Plus(node=child) | Range(node=child):
+            if _is_repeating(node):
+                if len(_exposed_repetitions(child)) != 0:
+                    findings.append(
+                        (
+                            EXPONENTIAL,
+                            f"'{to_pattern(node)}': Nested quantifier can match the "
+                            "same text in exponentially many ways",
+                        )
+                    )
+                elif _has_overlapping_options(child):
+                    findings.append(
+                        (
+                            EXPONENTIAL,
+                            f"'{to_pattern(node)}': Repeated alternation has branches "
+                            "that can match the same text",
+                        )
+                    )
+                elif (rival := _boundary_rival(child)) is not None:
+                    findings.append(
+                        (
+                            POLYNOMIAL,
+                            f"'{to_pattern(node)}': '{to_pattern(rival)}' competes "
+                            "with the start of the next repetition",
+                        )
+                    )
+            _find_risks(child, findings)
+
+        case (
+            Optional(node=child)
+            | Group(node=child)
+            | AtomicGroup(node=child)
+            | PositiveLookAhead(node=child)
+            | NegativeLookAhead(node=child)
+        ):
+            _find_risks(child, findings)
+
+
+def _find_competing_repetitions(children: list[Node], findings: list[tuple[str, str]]):
+    # Two unbounded repetitions with only optional nodes between them that can
+    # consume the same characters split a run of input in O(n^2) ways
+    for i, left in enumerate(children):
+        if not _is_unbounded(left):
+            continue
+
+        for j in range(i + 1, len(children)):
+            right = children[j]
+
+            if _is_unbounded(right) and _overlaps(
+                first_nodes(left.node), first_nodes(right.node)
+            ):
+                findings.append(
+                    (
+                        POLYNOMIAL,
+                        f"'{to_pattern(left)}' and '{to_pattern(right)}': Adjacent "
+                        "quantifiers compete for the same characters",
+                    )
+                )
+                break
+
+            if not _is_nullable(right):
+                break
+
+
+def _boundary_rival(node: Node) -> Node | None:
+    """
+    Return a quantifier in node that can keep consuming to the end of a match
+    of node and on into the next one, or None. Each repetition of node can then
+    end in many places, as in (.*a){8} or (a?a?)+, splitting a run of input in
+    O(n^k) ways.
+    """
+    node = _ungroup(node)
+    children = node.nodes if isinstance(node, Sequence) else [node]
+    leading = first_nodes(node)
+
+    for i, child in enumerate(children):
+        child = _ungroup(child)
+        if not _is_variable(child):
+            continue
+
+        # Everything after the quantifier must be able to match nothing, or be
+        # a character the quantifier could have consumed instead
+        body = first_nodes(child.node)
+        if not all(
+            _is_nullable(rest) or (rest.is_single_char and _overlaps(body, [rest]))
+            for rest in children[i + 1 :]
+        ):
+            continue
+
+        if _overlaps(body, leading):
+            return child
+
+    return None
+
+
+def _ungroup(node: Node) -> Node:
+    while isinstance(node, Group):
+        node = node.node
+    return node
+
+
+def _is_variable(node: Node) -> bool:
+    # Quantifiers that can match different numbers of repetitions
+    match node:
+        case Star() | Plus() | Optional():
+            return True
+        case Range(min=min, max=max):
+            return max != min
+    return False
+
+
+def _is_repeating(node: Node) -> bool:
+    match node:
+        case Star() | Plus():
+            return True
+        case Range(max=max):
+            return max is None or max > 1
+    return False
+
+
+def _is_unbounded(node: Node) -> bool:
+    match node:
+        case Star() | Plus():
+            return True
+        case Range(max=max):
+            return max is None
+    return False
+
+
+def _is_nullable(node: Node) -> bool:
+    """Return True if node can succeed without consuming any characters."""
+    return length_bounds(node)[0] == 0
+
+
+def length_bounds(node: Node) -> tuple[int, int | None]:
+    """
+    Return the minimum and maximum number of characters a match of node can
+    consume. A maximum of None means the match length is unbounded.
+    """
+    if node.is_single_char:
+        return 1, 1
+
+    match node:
+        case Star(node=child):
+            _, hi = length_bounds(child)
+            return 0, _repeat_max(hi, None)
+        case Plus(node=child):
+            lo, hi = length_bounds(child)
+            return lo, _repeat_max(hi, None)
+        case Optional(node=child):
+            _, hi = length_bounds(child)
+            return 0, hi
+        case Range(node=child, min=min_count, max=max_count):
+            lo, hi = length_bounds(child)
+            return lo * min_count, _repeat_max(hi, max_count)
+        case Sequence(nodes=children):
+            bounds = [length_bounds(child) for child in children]
+            lo = sum(lo for lo, _ in bounds)
+            if any(hi is None for _, hi in bounds):
+                return lo, None
+            return lo, sum(hi for _, hi in bounds)
+        case Alternation(options=children):
+            # Without any options, as for an empty list of patterns, nothing
+            # ever matches, and so nothing is consumed either
+            bounds = [length_bounds(child) for child in children]
+            lo = min((lo for lo, _ in bounds), default=0)
+            if any(hi is None for _, hi in bounds):
+                return lo, None
+            return lo, max((hi for _, hi in bounds), default=0)
+        case Group(node=child) | AtomicGroup(node=child):
+            return length_bounds(child)
+        case BackReference():
+            return 0, None
+
+    # Anchors, word boundaries, lookaheads and Empty never consume anything
+    return 0, 0
+
+
+def _repeat_max(hi: int | None, count: int | None) -> int | None:
+    # Max length of a node with max length hi repeated at most count times
+    if hi == 0 or count == 0:
+        return 0
+    if hi is None or count is None:
+        return None
+    return hi * count
+
+
+def max_reach(node: Node) -> int | None:
+    """
+    Return how many characters past its starting position matching node may
+    look at. Unlike the maximum length this counts characters that lookaheads,
+    word boundaries and '$' inspect without consuming. None means unbounded.
+    """
+    if node.is_single_char:
+        return 1
+
+    match node:
+        case MetaSequence() | EndAnchor() | NoWordAfter():
+            # Needs to know what the next character is, or that there is none
+            return 1
+        case PositiveLookAhead(node=child) | NegativeLookAhead(node=child):
+            return max_reach(child)
+        case Group(node=child) | AtomicGroup(node=child):
+            return max_reach(child)
+        case Alternation(options=children):
+            reaches = [max_reach(child) for child in children]
+            if any(reach is None for reach in reaches):
+                return None
+            return max(reaches, default=0)
+        case Sequence(nodes=children):
+            consumed, furthest = 0, 0
+            for child in children:
+                reach = max_reach(child)
+                _, hi = length_bounds(child)
+                if reach is None or hi is None:
+                    return None
+                furthest = max(furthest, consumed + reach)
+                consumed += hi
+            return furthest
+        case Star(node=child) | Plus(node=child):
+            return _repeat_reach(child, None)
+        case Optional(node=child):
+            return _repeat_reach(child, 1)
+        case Range(node=child, max=max_count):
+            return _repeat_reach(child, max_count)
+        case BackReference():
+            return None
+
+    # '^' and Empty
+    return 0
+
+
+def _repeat_reach(child: Node, count: int | None) -> int | None:
+    # Reach of child repeated at most count times: every repetition but the
+    # last consumes at most hi characters before the last one looks ahead
+    reach = max_reach(child)
+    _, hi = length_bounds(child)
+    if count == 0:
+        return 0
+    if reach is None:
+        return None
+    if hi == 0:
+        return reach
+    if hi is None or count is None:
+        return None
+    return (count - 1) * hi + reach
+
+
+def can_match_newline(node: Node) -> bool:
+    """Return True if node (or a lookahead inside it) can match a newline."""
+    if node.is_single_char:
+        return node.matches_char("\n")
+
+    match node:
+        case Sequence(nodes=children) | Alternation(options=children):
+            return any(can_match_newline(child) for child in children)
+        case (
+            Star(node=child)
+            | Plus(node=child)
+            | Optional(node=child)
+            | Range(node=child)
+            | Group(node=child)
+            | AtomicGroup(node=child)
+            | PositiveLookAhead(node=child)
+            | NegativeLookAhead(node=child)
+        ):
+            return can_match_newline(child)
+
+    # A backreference can only repeat text matched by the rest of the pattern
+    return False
+
+
+def is_start_anchored(node: Node) -> bool:
+    """Return True if every match of node has to start at the '^' anchor."""
+    match node:
+        case StartAnchor():
+            return True
+        case Sequence(nodes=children):
+            return is_start_anchored(children[0])
+        case Alternation(options=children):
+            return all(is_start_anchored(child) for child in children)
+        case Group(node=child) | AtomicGroup(node=child):
+            return is_start_anchored(child)
+    return False
+
+
+def is_end_anchored(node: Node) -> bool:
+    """Return True if every match of node has to end at the '$' anchor."""
+    match node:
+        case EndAnchor():
+            return True
+        case Sequence(nodes=children):
+            return is_end_anchored(children[-1])
+        case Alternation(options=children):
+            return all(is_end_anchored(child) for child in children)
+        case Group(node=child) | AtomicGroup(node=child):
+            return is_end_anchored(child)
+    return False
+
+
+def _exposed_repetitions(node: Node) -> list[Node]:
+    """
+    Return the repeating quantifiers that can match the entire text matched by
+    node while everything around them matches the empty string.
+    """
+    match node:
+        case Star() | Plus() | Range() if _is_repeating(node):
+            return [node]
+        case Optional(node=child) | Group(node=child) | Range(node=child):
+            return _exposed_repetitions(child)
+        case Alternation(options=children):
+            return [rep for child in children for rep in _exposed_repetitions(child)]
+        case Sequence(nodes=children):
+            exposed = []
+            for i, child in enumerate(children):
+                others = children[:i] + children[i + 1 :]
+                if all(_is_nullable(other) for other in others):
+                    exposed.extend(_exposed_repetitions(child))
+            return exposed
+
+    # Atomic groups never give characters back, so they can't be split
+    return []
+
+
+def _has_overlapping_options(node: Node) -> bool:
+    node = _ungroup(node)
+
+    if not isinstance(node, Alternation):
+        return False
+
+    firsts = [first_nodes(option) for option in node.options]
+
+    for i in range(len(firsts)):
+        for j in range(i + 1, len(firsts)):
+            if _overlaps(firsts[i], firsts[j]):
+                return True
+
+    return False
+
+
+def first_nodes(node: Node) -> list[Node] | None:
+    """
+    Return the single character nodes that can match the first character of a
+    non-empty match of node, or None if that can't be determined statically.
+    """
+    if node.is_single_char:
+        return [node]
+
+    match node:
+        case Star(node=child) | Plus(node=child) | Optional(node=child):
+            return first_nodes(child)
+        case Range(node=child) | Group(node=child) | AtomicGroup(node=child):
+            return first_nodes(child)
+        case Alternation(options=children):
+            return _union_first_nodes(children)
+        case Sequence(nodes=children):
+            prefix = []
+            for child in children:
+                prefix.append(child)
+                if not _is_nullable(child):
+                    break
+            return _union_first_nodes(prefix)
+        case BackReference():
+            return None
+
+    # Assertions never consume a character
+    return []
+
+
+class CharSet:
+    """
+    Set of the characters matched by a list of single character nodes.
+    Membership of ASCII characters is precomputed as a bitmap, anything else is
+    checked against the nodes.
+    """
+
+    def __init__(self, nodes: list[Node]):
+        self.nodes = nodes
+        self.bitmap = 0
+
+        for code in range(128):
+            if any(node.matches_char(chr(code)) for node in nodes):
+                self.bitmap |= 1 << code
+
+        # True if no character outside ASCII can be a member
+        self.ascii_only = all(_is_ascii_only(node) for node in nodes)
+
+    def __contains__(self, c: str) -> bool:
+        code = ord(c)
+        if code < 128:
+            return bool(self.bitmap >> code & 1)
+        return any(node.matches_char(c) for node in self.nodes)
+
+    def marks(self) -> "MarkTable":
+        return MarkTable(self)
+
+
+def _is_ascii_only(node: Node) -> bool:
+    match node:
+        case Literal(literal=c):
+            return c.isascii()
+        case CharacterClass(chars=chars, complement=False):
+            return all(c.isascii() for c in chars)
+    return False
+
+
+class MarkTable(dict):
+    """
+    Table for str.translate that maps every member of a CharSet to '1' and
+    everything else to '0', so `s.translate(table).find("1", i)` finds the next
+    member at C speed. Characters outside ASCII are looked up on first use.
+    """
+
+    def __init__(self, charset: CharSet):
+        super().__init__(
+            (code, "1" if charset.bitmap >> code & 1 else "0") for code in range(128)
+        )
+        self.charset = charset
+
+    def __missing__(self, code: int) -> str:
+        mark = "1" if chr(code) in self.charset else "0"
+        self[code] = mark
+        return mark
+
+
+class PrefixCases:
+    """
+    Every way to write the lowercased prefix of a case-insensitive pattern, so
+    that it can be looked for without lowercasing a whole string, including
+    where lowercasing would change offsets. The cases of its first few
+    characters are searched for, and each offset found is checked against the
+    cases of more of them, then the rest of the prefix character by character.
+    """
+
+    # At most this many cases are searched for, and checked at each offset
+    MAX_SEARCHED = 4
+    MAX_CHECKED = 64
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self.searched = _cases(prefix, PrefixCases.MAX_SEARCHED)
+        self.checked = tuple(_cases(prefix, PrefixCases.MAX_CHECKED))
+        self._rest = [case_variants(c) for c in prefix[len(self.checked[0]) :]]
+
+        # True if lowercasing ASCII text turns exactly the cases of the prefix
+        # into it, which isn't so for 'ſ', one of whose cases is 'S'
+        self.ascii_folds = all(
+            variant.lower() == c
+            for c in prefix
+            for variant in case_variants(c)
+            if variant.isascii()
+        )
+
+    def marks(self, s: str) -> "CaseMarks | str":
+        # A string that fits in one block, lowercased as CaseMarks would
+        if len(s) <= CaseMarks.FIRST_BLOCK and self.ascii_folds and s.isascii():
+            return s.lower()
+        return CaseMarks(s, self)
+
+    def starts(self, s: str, i: int) -> bool:
+        """Return whether the prefix starts at offset i of s, in any case."""
+        if not s.startswith(self.checked, i):
+            return False
+
+        i += len(self.checked[0])
+        if i + len(self._rest) > len(s):
+            return False
+        return all(s[i + k] in cases for k, cases in enumerate(self._rest))
+
+
+def _cases(prefix: str, limit: int) -> list[str]:
+    """
+    Return every way to write the start of prefix, using as many of its
+    characters as keep their number at most limit.
+    """
+    cases = [""]
+    for c in prefix:
+        variants = sorted(case_variants(c))
+        if len(cases) * len(variants) > limit:
+            break
+        cases = [case + variant for case in cases for variant in variants]
+    return cases
+
+
+class CaseMarks:
+    """
+    Stands in for a lowercased copy of s when looking for the offsets where a
+    case-insensitive prefix starts, with the same find method. s is searched
+    block by block, in blocks that double in size, so a search that stops at
+    an early match only scans the start of it. An ASCII block is lowercased,
+    which is what's quickest for short strings, others are searched for the
+    cases of the prefix.
+
+    The offsets passed to find must not decrease, as they don't while looking
+    for the next candidate.
+    """
+
+    FIRST_BLOCK = 1 << 10
+
+    def __init__(self, s: str, prefix: PrefixCases):
+        self._s = s
+        self._prefix = prefix
+        # Offsets where the prefix starts in the scanned blocks, in order
+        self._found: list[int] = []
+        self._next = 0
+        # Every offset before this one where the prefix starts was found
+        self._scanned = 0
+        self._block = CaseMarks.FIRST_BLOCK
+
+    def find(self, sub: str, start: int, end: int) -> int:
+        """
+        Return the lowest offset in [start, end) where the whole prefix, sub,
+        starts and ends, or -1.
+        """
+        last = end - len(sub) + 1
+
+        while True:
+            while self._next < len(self._found) and self._found[self._next] < start:
+                self._next += 1
+            if self._next < len(self._found):
+                i = self._found[self._next]
+                return i if i < last else -1
+
+            lo = max(self._scanned, start)
+            if lo >= last:
+                return -1
+
+            hi = min(lo + self._block, last)
+            self._block *= 2
+            self._scan(lo, hi)
+
+    def _scan(self, lo: int, hi: int):
+        # Find the offsets in [lo, hi) where the prefix starts
+        s, prefix = self._s, self._prefix
+        found = []
+
+        block = s[lo : hi + len(prefix.prefix) - 1]
+        if prefix.ascii_folds and block.isascii():
+            block = block.lower()
+            i = block.find(prefix.prefix)
+            while i != -1:
+                found.append(lo + i)
+                i = block.find(prefix.prefix, i + 1)
+        else:
+            end = hi + len(prefix.searched[0]) - 1
+            for case in prefix.searched:
+                i = s.find(case, lo, end)
+                while i != -1:
+                    if prefix.starts(s, i):
+                        found.append(i)
+                    i = s.find(case, i + 1, end)
+            found.sort()
+
+        self._found, self._next = found, 0
+        self._scanned = hi
+
+
+def first_set(node: Node) -> CharSet | None:
+    """
+    Return the set of characters a match of node can start with, or None if
+    every position is a candidate because node can match the empty string.
+    """
+    nodes = first_nodes(node)
+    if nodes is None or _is_nullable(node):
+        return None
+    return CharSet(nodes)
+
+
+def literal_prefix(node: Node, ignore_case: bool = False) -> str:
+    """
+    Return the literal text that every match of node has to start with. With
+    ignore_case, classes of the cases of one letter (as built by the parser
+    with IGNORECASE) also count as literal, as their lowercase letter.
+    """
+    match node:
+        case Literal(literal=c):
+            # With IGNORECASE a literal is a character without other cases
+            return c
+        case CharacterClass(chars=chars, complement=False) if ignore_case:
+            folded = {c.lower() for c in chars}
+            if len(folded) == 1 and case_variants(next(iter(folded))) == chars:
+                return folded.pop()
+        case Group(node=child):
+            return literal_prefix(child, ignore_case)
+        case Sequence(nodes=children):
+            prefix = ""
+            for child in children:
+                child_prefix = literal_prefix(child, ignore_case)
+                prefix += child_prefix
+
+                # Only continue past children that are entirely literal
+                if length_bounds(child) != (len(child_prefix), len(child_prefix)):
+                    break
+            return prefix
+    return ""
+
+
+def _union_first_nodes(children: list[Node]) -> list[Node] | None:
+    # Equal nodes are only kept once, alternations of many similar options
+    # would otherwise repeat the same few nodes thousands of times
+    nodes = {}
+    for child in children:
+        child_nodes = first_nodes(child)
+        if child_nodes is None:
+            return None
+        for node in child_nodes:
+            nodes.setdefault(str(node), node)
+    return list(nodes.values())
+
+
+def _overlaps(left: list[Node] | None, right: list[Node] | None) -> bool:
+    if left is None or right is None:
+        return True
+
+    # Try every ASCII character plus any character named by either side
+    candidates = {chr(i) for i in range(128)}
+    for node in left + right:
+        match node:
+            case Literal(literal=c):
+                candidates.add(c)
+            case CharacterClass(chars=chars):
+                candidates.update(chars)
+
+    return any(
+        any(a.matches_char(c) for a in left) and any(b.matches_char(c) for b in right)
+        for c in candidates
+    )
+
+
+def to_pattern(node: Node) -> str:
+    """Render an AST back into (an equivalent) regular expression."""
+    match node:
+        case Empty():
+            return ""
+        case Literal(literal=c):
+            return f"\\{c}" if c in Parser.META_CHARS else c
+        case Dot():
+            return "."
+        case StartAnchor():
+            return "^"
+        case EndAnchor():
+            return "$"
+        case MetaSequence(metaSequence=m):
+            return f"\\{m}"
+        case NoWordBefore():
+            return r"(?<!\w)"
+        case NoWordAfter():
+            return r"(?!\w)"
+        case CharacterClass(chars=chars, complement=complement):
+            return f"[{'^' if complement else ''}{_class_body(chars)}]"
+        case BackReference(group_id=group):
+            return f"\\{group}"
+        case Star(node=child, is_lazy=is_lazy):
+            return f"{_quantified(child)}*{'?' if is_lazy else ''}"
+        case Plus(node=child, is_lazy=is_lazy):
+            return f"{_quantified(child)}+{'?' if is_lazy else ''}"
+        case Optional(node=child, is_lazy=is_lazy):
+            return f"{_quantified(child)}?{'?' if is_lazy else ''}"
+        case Range(node=child, min=min, max=max, is_lazy=is_lazy):
+            if min == max:
+                bounds = f"{min}"
+            else:
+                bounds = f"{min},{'' if max is None else max}"
+            return f"{_quantified(child)}{{{bounds}}}{'?' if is_lazy else ''}"
+        case Sequence(nodes=children):
+            return "".join(to_pattern(child) for child in children)
+        case Alternation(options=children):
+            return "|".join(to_pattern(child) for child in children)
+        case Group(group_id=Group.NON_CAPTURE_ID, node=child):
+            return f"(?:{to_pattern(child)})"
+        case Group(node=child):
+            return f"({to_pattern(child)})"
+        case PositiveLookAhead(node=child):
+            return f"(?={to_pattern(child)})"
+        case NegativeLookAhead(node=child):
+            return f"(?!{to_pattern(child)})"
+        case AtomicGroup(node=child):
+            return f"(?>{to_pattern(child)})"
+
+    return str(node)
+
+
+def _quantified(node: Node) -> str:
+    if isinstance(node, (Sequence, Alternation)):
+        return f"(?:{to_pattern(node)})"
+    return to_pattern(node)
+
+
+def _class_body(chars: set[str]) -> str:
+    # Collapse runs of consecutive characters back into ranges
+    ordered = sorted(chars)
+    parts = []
+    i = 0
+
+    while i < len(ordered):
+        j = i
+        while j + 1 < len(ordered) and ord(ordered[j + 1]) == ord(ordered[j]) + 1:
+            j += 1
+
+        if j - i >= 2:
+            parts.append(f"{ordered[i]}-{ordered[j]}")
+        else:
+            parts.extend(ordered[i : j + 1])
+        i = j + 1
+
+    return "".join(parts)
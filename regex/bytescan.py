@@ -0,0 +1,91 @@
+from .analysis import CharSet
+from typing import Iterator
+
+
+class LineFilter:
+    """
+    Finds the lines of UTF-8 encoded data that contain an offset where a match
+    can begin, so the rest never have to be decoded or run through the engine.
+
+    A literal prefix is found with bytes.find. Otherwise the bytes that can
+    begin a match are marked by bytes.translate with a 256 entry table and
+    found with bytes.find, which keeps the whole scan in C. Data is marked one
+    block at a time, so memory use doesn't grow with the size of the file.
+    """
+
+    # Number of bytes marked at once
+    BLOCK_SIZE = 1 << 20
+
+    def __init__(self, prefix: bytes = b"", table: bytes | None = None):
+        self._prefix = prefix
+        # bytes.translate table mapping candidate bytes to b"1" and the rest
+        # to b"0". Without a prefix or a table every line is a candidate
+        self._table = table
+
+    @staticmethod
+    def compile(prefix: str, first: CharSet | None) -> "LineFilter":
+        """
+        Return a LineFilter for a pattern with the given literal prefix and
+        FIRST set, as computed by regex.analysis.
+        """
+        if prefix != "":
+            return LineFilter(prefix=prefix.encode())
+        if first is None:
+            return LineFilter()
+
+        table = bytearray(b"0" * 256)
+        for code in range(128):
+            if first.bitmap >> code & 1:
+                table[code] = ord("1")
+
+        # Characters outside ASCII begin with a lead byte in the range
+        # 0xC2-0xF4, any of which could start a member of the set
+        if not first.ascii_only:
+            table[0xC2:0xF5] = b"1" * (0xF5 - 0xC2)
+
+        return LineFilter(table=bytes(table))
+
+    def lines(self, data: bytes, pos: int = 0) -> Iterator[tuple[int, int]]:
+        """
+        Yield the start and end offsets of every line in data from pos, which
+        must be the start of a line, excluding its newline, that contains a
+        candidate byte. data is bytes or an mmap, only the marked blocks are
+        copied out of it.
+        """
+        size = len(data)
+        block_start = block_end = 0
+        marks = None
+        i = pos
+
+        while i < size:
+            if self._prefix != b"":
+                candidate = data.find(self._prefix, i)
+            elif self._table is None:
+                candidate = i
+            else:
+                candidate = -1
+                search = i
+                while search < size:
+                    if search >= block_end:
+                        block_start = search
+                        block_end = min(size, search + LineFilter.BLOCK_SIZE)
+                        marks = data[block_start:block_end].translate(self._table)
+
+                    candidate = marks.find(b"1", search - block_start)
+                    if candidate != -1:
+                        candidate += block_start
+                        break
+                    search = block_end
+
+            if candidate == -1:
+                return
+
+            # i is always the start of a line
+            start = data.rfind(b"\n", i, candidate) + 1 or i
+            end = data.find(b"\n", candidate)
+            if end == -1:
+                end = size
+
+            yield start, end
+
+            i = end + 1
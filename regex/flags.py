@@ -0,0 +1,15 @@
+from enum import IntFlag
+
+
+class RegexFlag(IntFlag):
+    # Match letters regardless of case, folded into the pattern at compile time
+    IGNORECASE = 2
+    # Only match whole words, as if the pattern was surrounded by '\b'
+    WHOLE_WORD = 4
+    # Only match whole lines, as if the pattern was surrounded by '^' and '$'
+    WHOLE_LINE = 8
+
+
+IGNORECASE = RegexFlag.IGNORECASE
+WHOLE_WORD = RegexFlag.WHOLE_WORD
+WHOLE_LINE = RegexFlag.WHOLE_LINE
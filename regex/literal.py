@@ -0,0 +1,244 @@
+from .match import MatchState
+from .nodes import (
+    Node,
+    Empty,
+    Literal,
+    CharacterClass,
+    MetaSequence,
+    Alternation,
+    Sequence,
+)
+from .parser import case_variants
+from .flags import RegexFlag
+from .analysis import Complexity, CharSet, PrefixCases, LINEAR
+from .pattern import Pattern, _wrap_ast
+from .bytescan import LineFilter
+from typing import Iterator
+
+
+class LiteralPattern(Pattern):
+    """
+    Pattern that matches one or more literal strings, built without the Parser
+    and searched without the regex engine. A single needle is found with
+    str.find, several with a trie of the needles that is only walked from the
+    offsets where the first character of some needle occurs.
+
+    Where several needles match at the leftmost offset the longest one wins,
+    as in grep -F. With WHOLE_LINE the needles are kept in a set and each
+    string is looked up in it, with WHOLE_WORD matches that aren't surrounded
+    by word boundaries are skipped. With IGNORECASE strings are searched as
+    they are, for the cases of a single needle, or with a trie that has an
+    edge for every case of a character.
+    """
+
+    def __init__(self, needles: list[str], flags: RegexFlag = RegexFlag(0)):
+        self.pattern = "\n".join(needles)
+        self.flags = RegexFlag(flags)
+        self.complexity = Complexity(LINEAR, ())
+        self._num_groups = 0
+
+        self._ignore_case = bool(self.flags & RegexFlag.IGNORECASE)
+        if self._ignore_case:
+            needles = [needle.lower() for needle in needles]
+        self._needles = needles
+        self._fallback = None
+
+        self._whole_line = bool(self.flags & RegexFlag.WHOLE_LINE)
+        self._whole_word = bool(self.flags & RegexFlag.WHOLE_WORD)
+        self._needle_set = set(needles)
+
+        # Equivalent AST, used by the Scanner and the IGNORECASE fallback. The
+        # engine prefers the last option, so the longest needle goes last
+        self._unwrapped_ast = Alternation(
+            [
+                _sequence(needle, self._ignore_case)
+                for needle in sorted(needles, key=len)
+            ]
+        )
+        self._ast = _wrap_ast(self._unwrapped_ast, self.flags)
+
+        first = None
+        if all(needle != "" for needle in needles):
+            first = CharSet(
+                [_char(c, self._ignore_case) for c in {needle[0] for needle in needles}]
+            )
+        self._first_marks = first.marks() if first is not None else None
+
+        prefix = needles[0] if len(needles) == 1 and not self._ignore_case else ""
+        self._line_filter = LineFilter.compile(prefix, first)
+
+        # A single needle is found with str.find, with IGNORECASE by looking for
+        # its cases
+        self._prefix_cases = None
+        if len(needles) == 1 and needles[0] != "" and self._ignore_case:
+            self._prefix_cases = PrefixCases(needles[0])
+
+        self._trie = None
+        if len(needles) != 1 or self._ignore_case:
+            self._trie = _build_trie(needles, self._ignore_case)
+
+    def _match_state_generator(
+        self, s: str, stop: int = -1, pos: int = 0
+    ) -> Iterator[tuple[int, MatchState]]:
+        if stop == -1:
+            stop = len(s)
+
+        # Needles with cases a trie can't tell apart are left to the engine
+        if self._ignore_case and self._trie is None:
+            yield from self._fallback_pattern()._match_state_generator(s, stop, pos)
+            return
+
+        if self._whole_line:
+            if pos == 0 and stop > 0 and self._is_needle(s):
+                yield 0, MatchState(len(s), {})
+        elif len(self._needles) == 1:
+            yield from self._find_needle(s, stop, pos)
+        else:
+            yield from self._walk_trie(s, stop, pos)
+
+    def _has_match(self, s: str) -> bool:
+        return next(self._match_state_generator(s), None) is not None
+
+    def _is_needle(self, s: str) -> bool:
+        if not self._ignore_case:
+            return s in self._needle_set
+
+        node = self._trie
+        for c in s:
+            node = node.get(c)
+            if node is None:
+                return False
+        return "" in node
+
+    def _find_needle(
+        self, s: str, stop: int, pos: int
+    ) -> Iterator[tuple[int, MatchState]]:
+        needle = self._needles[0]
+        marks = s if self._prefix_cases is None else self._prefix_cases.marks(s)
+        i = pos
+
+        while i < stop:
+            i = marks.find(needle, i, stop + len(needle) - 1)
+            if i == -1:
+                return
+
+            end = i + len(needle)
+            if self._whole_word and not (
+                _no_word_before(s, i) and _no_word_after(s, end)
+            ):
+                i += 1
+                continue
+
+            yield i, MatchState(end, {})
+
+            i += max(len(needle), 1)
+
+    def _walk_trie(
+        self, s: str, stop: int, pos: int
+    ) -> Iterator[tuple[int, MatchState]]:
+        marks = None
+        if self._first_marks is not None:
+            marks = s.translate(self._first_marks)
+        i = pos
+
+        while i < stop:
+            if marks is not None:
+                i = marks.find("1", i, stop)
+                if i == -1:
+                    return
+
+            # Follow s through the trie, remembering where the longest needle
+            # seen so far ends
+            node, j, end = self._trie, i, -1
+            if self._whole_word and not _no_word_before(s, i):
+                node = None
+            while node is not None:
+                if "" in node and (not self._whole_word or _no_word_after(s, j)):
+                    end = j
+                if j == len(s):
+                    break
+                node = node.get(s[j])
+                j += 1
+
+            if end == -1:
+                i += 1
+                continue
+
+            yield i, MatchState(end, {})
+
+            i = max(end, i + 1)
+
+    def _fallback_pattern(self) -> Pattern:
+        if self._fallback is None:
+            self._fallback = Pattern(
+                pattern=self.pattern,
+                num_groups=0,
+                ast=self._unwrapped_ast,
+                flags=self.flags,
+            )
+        return self._fallback
+
+
+def _no_word_before(s: str, i: int) -> bool:
+    return i == 0 or not MetaSequence.is_word_char(s[i - 1])
+
+
+def _no_word_after(s: str, i: int) -> bool:
+    return i == len(s) or not MetaSequence.is_word_char(s[i])
+
+
+def _build_trie(needles: list[str], ignore_case: bool) -> dict | None:
+    """
+    Return a trie of needles, nested dicts keyed by character where the key ""
+    marks the end of a needle. With ignore_case every case of a character leads
+    to the same node. Returns None if the cases of two characters at the same
+    place overlap without being the same, like those of 's' and 'ſ', which
+    share 'S'.
+    """
+    trie = {}
+
+    for needle in needles:
+        node = trie
+        for c in needle:
+            cases = case_variants(c) if ignore_case else {c}
+            child = node.get(c)
+
+            if child is None:
+                if any(case in node for case in cases):
+                    return None
+                child = {}
+                for case in cases:
+                    node[case] = child
+            elif {key for key, value in node.items() if value is child} != cases:
+                return None
+
+            node = child
+        # "" is never a key for a character
+        node[""] = True
+
+    return trie
+
+
+def _char(c: str, ignore_case: bool) -> Node:
+    if ignore_case and len(case_variants(c)) > 1:
+        return CharacterClass(chars=case_variants(c), complement=False)
+    return Literal(c)
+
+
+def _sequence(needle: str, ignore_case: bool) -> Node:
+    if needle == "":
+        return Empty()
+    return Sequence([_char(c, ignore_case) for c in needle])
+
+
+def compile_literal(
+    needles: str | list[str], flags: RegexFlag = RegexFlag(0)
+) -> LiteralPattern:
+    """
+    Return a Pattern that matches any of needles literally, with no characters
+    treated as special.
+    """
+    if isinstance(needles, str):
+        needles = [needles]
+
+    return LiteralPattern(needles, flags)
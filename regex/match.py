@@ -8,6 +8,8 @@ class Match:
     captures: dict[int, tuple[int, int]]
     string: str
     _num_groups: int = field(repr=False)  # private field, excluded from repr
+    # Absolute offset of string[0], non zero for matches found by a Scanner
+    _offset: int = field(default=0, repr=False)
 
     def start(self) -> int:
         return self.span[0]
@@ -26,7 +28,8 @@ class Match:
             span = self.captures.get(group_num, None)
 
             if span is not None:
-                res.append(self.string[span[0] : span[1]])
+                start, end = span[0] - self._offset, span[1] - self._offset
+                res.append(self.string[start:end])
             elif group_num == 0:
                 res.append(self.match)
             else:
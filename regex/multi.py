@@ -0,0 +1,47 @@
+from .parser import Parser
+from .nodes import DispatchAlternation
+from .flags import RegexFlag
+from .analysis import first_set, literal_prefix
+from .pattern import Pattern
+from .literal import LiteralPattern
+from typing import Iterable
+
+
+def compile_many(patterns: Iterable[str], flags: RegexFlag = RegexFlag(0)) -> Pattern:
+    """
+    Compile patterns into a single Pattern that matches wherever any of them
+    does, so a string is scanned once however many patterns there are. Groups
+    are numbered on from one pattern to the next, so the first group of the
+    second pattern comes right after the last group of the first.
+
+    patterns is only iterated over once and may be a generator, such as the
+    lines of a file.
+    """
+    sources, options, firsts, prefixes = [], [], [], []
+    num_groups = 0
+
+    for pattern in patterns:
+        ast, num_groups = Parser(pattern, flags, group_offset=num_groups).parse()
+        sources.append(pattern)
+        options.append(ast)
+
+        # Only patterns without a literal prefix are dispatched on FIRST sets
+        prefix = literal_prefix(ast)
+        prefixes.append(prefix)
+        firsts.append(first_set(ast) if prefix == "" else None)
+
+    if len(options) == 0:
+        return LiteralPattern([], flags)
+    if len(options) == 1:
+        return Pattern(
+            pattern=sources[0], ast=options[0], num_groups=num_groups, flags=flags
+        )
+
+    # Like any alternation, where several patterns match at the same offset
+    # the one that comes last is preferred
+    return Pattern(
+        pattern="\n".join(sources),
+        ast=DispatchAlternation(options, firsts, prefixes),
+        num_groups=num_groups,
+        flags=flags,
+    )
@@ -1,13 +1,42 @@
 from abc import ABC, abstractmethod
 from collections import deque
+from typing import Iterator
 from .match import MatchState
 
 
 class Node(ABC):
+    # Nodes that always consume exactly one character set this and implement
+    # matches_char, which lets repetitions scan runs of them without recursing
+    is_single_char = False
+
     @abstractmethod
     def match(self, s: str, state: MatchState) -> list[MatchState]:
         pass
 
+    def exists(self, s: str, state: MatchState) -> bool:
+        """
+        Return whether this node matches at state at all. Nodes that are made
+        of others override this to stop at the first way to match.
+        """
+        return len(self.match(s, state)) != 0
+
+    def matches_char(self, c: str) -> bool:
+        """
+        Return whether this single character node matches c. Other nodes don't
+        consume exactly one character, so on its own none of them matches one.
+        """
+        return False
+
+    def span_length(self, s: str, pos: int, limit: int) -> int:
+        """
+        Return how many consecutive characters, starting at pos and up to limit,
+        are matched by this single character node.
+        """
+        n = 0
+        while n < limit and self.matches_char(s[pos + n]):
+            n += 1
+        return n
+
 
 class Empty(Node):
     def __str__(self) -> str:
@@ -21,6 +50,8 @@ class Empty(Node):
 
 
 class Literal(Node):
+    is_single_char = True
+
     def __init__(self, literal: str):
         self.literal = literal
 
@@ -32,6 +63,9 @@ class Literal(Node):
     def __str__(self) -> str:
         return f"Literal('{self.literal}')"
 
+    def matches_char(self, c: str) -> bool:
+        return c == self.literal
+
     def match(self, s: str, state: MatchState) -> list[MatchState]:
         if state.pos >= len(s):
             return []
@@ -43,12 +77,22 @@ class Literal(Node):
 
 
 class Dot(Node):
+    is_single_char = True
+
     def __eq__(self, other) -> bool:
         return isinstance(other, Dot)
 
     def __str__(self) -> str:
         return "Dot('.')"
 
+    def matches_char(self, c: str) -> bool:
+        return c != "\n"
+
+    def span_length(self, s: str, pos: int, limit: int) -> int:
+        # A run of dots only ends at a newline, so a single find covers it
+        newline = s.find("\n", pos, pos + limit)
+        return limit if newline == -1 else newline - pos
+
     def match(self, s: str, state: MatchState) -> list[MatchState]:
         if state.pos >= len(s):
             return []
@@ -85,7 +129,46 @@ class EndAnchor(Node):
         return []
 
 
+class NoWordBefore(Node):
+    """
+    Matches where the previous character, if any, is not a word character.
+    Used to start WHOLE_WORD matches, which unlike '\\b' also allows matches
+    that begin with a non-word character.
+    """
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, NoWordBefore)
+
+    def __str__(self) -> str:
+        return "NoWordBefore('(?<!\\w)')"
+
+    def match(self, s: str, state: MatchState) -> list[MatchState]:
+        if state.pos == 0 or not MetaSequence.is_word_char(s[state.pos - 1]):
+            return [state]
+        return []
+
+
+class NoWordAfter(Node):
+    """
+    Matches where the next character, if any, is not a word character. Used to
+    end WHOLE_WORD matches.
+    """
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, NoWordAfter)
+
+    def __str__(self) -> str:
+        return "NoWordAfter('(?!\\w)')"
+
+    def match(self, s: str, state: MatchState) -> list[MatchState]:
+        if state.pos == len(s) or not MetaSequence.is_word_char(s[state.pos]):
+            return [state]
+        return []
+
+
 class CharacterClass(Node):
+    is_single_char = True
+
     def __init__(self, chars: set[str], complement: bool):
         self.chars = chars
         self.complement = complement
@@ -100,6 +183,11 @@ class CharacterClass(Node):
             f"CharacterClass('[{'^' if self.complement else ''}{''.join(self.chars)}]')"
         )
 
+    def matches_char(self, c: str) -> bool:
+        if c in self.chars:
+            return not self.complement
+        return self.complement and c.isalpha()
+
     def match(self, s: str, state: MatchState) -> list[MatchState]:
         if state.pos >= len(s):
             return []
@@ -191,6 +279,10 @@ class MetaSequence(Node):
         return []
 
     def match_word_boundary(self, s: str, state: MatchState) -> list[MatchState]:
+        # The empty string has no word characters to have a boundary with
+        if len(s) == 0:
+            return []
+
         # Handle match at end of string
         if state.pos >= len(s):
             prev_c = s[state.pos - 1]
@@ -215,6 +307,9 @@ class MetaSequence(Node):
         return []
 
     def match_non_word_boundary(self, s: str, state: MatchState) -> list[MatchState]:
+        if len(s) == 0:
+            return [MatchState(pos=state.pos, captures=state.captures.copy())]
+
         # Handle match at end of string
         if state.pos >= len(s):
             prev_c = s[state.pos - 1]
@@ -260,6 +355,27 @@ class MetaSequence(Node):
     def __str__(self) -> str:
         return f"MetaSequence('\\{self.metaSequence}')"
 
+    @property
+    def is_single_char(self) -> bool:
+        return self.metaSequence not in "bB"
+
+    def matches_char(self, c: str) -> bool:
+        match self.metaSequence:
+            case "d":
+                return c.isdecimal()
+            case "D":
+                return not c.isdecimal()
+            case "w":
+                return MetaSequence.is_word_char(c)
+            case "W":
+                return not MetaSequence.is_word_char(c)
+            case "s":
+                return c.isspace()
+            case "S":
+                return not c.isspace()
+
+        return super().matches_char(c)
+
     def match(self, s: str, state: MatchState) -> list[MatchState]:
         matcher = MetaSequence.registry[self.metaSequence]
         return matcher(self, s, state)
@@ -269,6 +385,7 @@ class Star(Node):
     def __init__(self, node: Node, is_lazy: bool = False):
         self.node = node
         self.is_lazy = is_lazy
+        self._body = _preferred_body(node, is_lazy)
 
     def __eq__(self, other) -> bool:
         if isinstance(other, Star):
@@ -276,31 +393,14 @@ class Star(Node):
         return False
 
     def match(self, s: str, state: MatchState) -> list[MatchState]:
-        results = [state]
-        visited = set([state])
-        queue = deque([state])
-
-        while len(queue) != 0:
-            curr_state = queue.popleft()
-
-            for next_state in self.node.match(s, curr_state):
-                if next_state in visited:
-                    continue
-
-                visited.add(next_state)
-                queue.append(next_state)
-                results.append(next_state)
-
-        if self.is_lazy:
-            return list(reversed(results))
-
-        return results
+        return _closure(self._body, s, state, set(), self.is_lazy)
 
 
 class Plus(Node):
     def __init__(self, node: Node, is_lazy: bool = False):
         self.node = node
         self.is_lazy = is_lazy
+        self._body = _preferred_body(node, is_lazy)
 
     def __eq__(self, other) -> bool:
         if isinstance(other, Plus):
@@ -308,31 +408,15 @@ class Plus(Node):
         return False
 
     def match(self, s: str, state: MatchState) -> list[MatchState]:
-        results = []
-        visited = set()
-        queue = deque([state])
-
-        while len(queue) != 0:
-            curr_state = queue.popleft()
-
-            for next_state in self.node.match(s, curr_state):
-                if next_state in visited:
-                    continue
-
-                visited.add(next_state)
-                queue.append(next_state)
-                results.append(next_state)
-
-        if self.is_lazy:
-            return list(reversed(results))
-
-        return results
+        frontier = self._body.match(s, state)
+        return _closures(self._body, s, frontier, self.is_lazy)
 
 
 class Optional(Node):
     def __init__(self, node: Node, is_lazy: bool = False):
         self.node = node
         self.is_lazy = is_lazy
+        self._body = _preferred_body(node, is_lazy)
 
     def __eq__(self, other) -> bool:
         if isinstance(other, Optional):
@@ -340,28 +424,25 @@ class Optional(Node):
         return False
 
     def match(self, s: str, state: MatchState) -> list[MatchState]:
-        results = [state]
-        visited = set([state])
-
-        for next_state in self.node.match(s, state):
-            if next_state in visited:
-                continue
-
-            visited.add(next_state)
-            results.append(next_state)
+        # Matching the node without consuming anything or capturing a group
+        # is the same as skipping it, which is the least preferred way unless
+        # the quantifier is lazy
+        results = [st for st in _dedup(self._body.match(s, state)) if st != state]
 
         if self.is_lazy:
-            return list(reversed(results))
+            return results + [state]
 
-        return results
+        return [state] + results
 
 
 class Range(Node):
-    def __init__(self, node: Node, min: int, max: int, is_lazy: bool = False):
+    # A max of None means the repetition is unbounded, as in {n,}
+    def __init__(self, node: Node, min: int, max: int | None, is_lazy: bool = False):
         self.node = node
         self.min = min
         self.max = max
         self.is_lazy = is_lazy
+        self._body = _preferred_body(node, is_lazy)
 
     def __eq__(self, other) -> bool:
         if isinstance(other, Range):
@@ -374,35 +455,91 @@ class Range(Node):
         return False
 
     def match(self, s: str, state: MatchState) -> list[MatchState]:
+        if self.node.is_single_char:
+            results = self._match_span(s, state)
+
+            if self.is_lazy:
+                return list(reversed(results))
+            return results
+
+        return self._match_frontier(s, state)
+
+    def _match_span(self, s: str, state: MatchState) -> list[MatchState]:
+        # Every repetition consumes exactly one character, so the possible end
+        # states are just the lengths of the run starting at pos
+        limit = len(s) - state.pos
+        if self.max is not None:
+            limit = min(limit, self.max)
+
+        count = self.node.span_length(s, state.pos, limit)
+        if count < self.min:
+            return []
+
+        return [
+            MatchState(pos=state.pos + n, captures=state.captures.copy())
+            for n in range(self.min, count + 1)
+        ]
+
+    def _match_frontier(self, s: str, state: MatchState) -> list[MatchState]:
         frontier = [state]
 
         for _ in range(self.min):
-            new_frontier = []
-            for curr_state in frontier:
-                new_frontier.extend(self.node.match(s, curr_state))
+            frontier = _dedup([ns for st in frontier for ns in self._body.match(s, st)])
 
-            if len(new_frontier) == 0:
+            if len(frontier) == 0:
                 return []
 
-            frontier = new_frontier
+        # Case {n,}
+        if self.max is None:
+            return _closures(self._body, s, frontier, self.is_lazy)
 
-        results = frontier
+        return self._match_bounded(s, frontier)
 
-        # Only runs for {n,m}
-        for _ in range(self.max - self.min):
-            new_frontier = []
-            for curr_state in frontier:
-                new_frontier.extend(self.node.match(s, curr_state))
+    def _match_bounded(self, s: str, frontier: list[MatchState]) -> list[MatchState]:
+        # Only runs for {n,m}. Like _closure, but a state can only be repeated
+        # from as many more times as are left, and repeating it again with no
+        # more left than before can't lead anywhere new
+        most_left = {}
+        order = []
 
-            if len(new_frontier) == 0:
-                break
-
-            results.extend(new_frontier)
-            frontier = new_frontier
+        for start in reversed(frontier):
+            left = self.max - self.min
+            if most_left.get(start, -1) >= left:
+                continue
 
-        if self.is_lazy:
-            return list(reversed(results))
-        return results
+            most_left[start] = left
+            stack = [(start, left, self._next_states(s, start, left))]
+            if self.is_lazy:
+                order.append(start)
+
+            while len(stack) != 0:
+                curr_state, left, next_states = stack[-1]
+
+                for next_state in next_states:
+                    # Repeating without changing anything is the same as stopping
+                    if next_state == curr_state:
+                        continue
+                    if most_left.get(next_state, -1) >= left - 1:
+                        continue
+
+                    most_left[next_state] = left - 1
+                    next_next = self._next_states(s, next_state, left - 1)
+                    stack.append((next_state, left - 1, next_next))
+                    if self.is_lazy:
+                        order.append(next_state)
+                    break
+                else:
+                    stack.pop()
+                    if not self.is_lazy:
+                        order.append(curr_state)
+
+        return _dedup(list(reversed(order)))
+
+    def _next_states(self, s: str, state: MatchState, left: int) -> Iterator:
+        # The states one more repetition leads to, most preferred first
+        if left == 0:
+            return iter(())
+        return reversed(self._body.match(s, state))
 
 
 class Alternation(Node):
@@ -420,6 +557,80 @@ class Alternation(Node):
             results.extend(option.match(s, state))
         return results
 
+    def exists(self, s: str, state: MatchState) -> bool:
+        return any(option.exists(s, state) for option in self.options)
+
+
+class DispatchAlternation(Alternation):
+    """
+    Alternation with many options that only tries the options that can match
+    at the current position. Options with a literal prefix are found by walking
+    a trie of the prefixes along the string. The others are picked by their
+    first character: firsts[i] is the set of characters options[i] can start
+    with, or None if it may match without consuming one. The options to try for
+    a character are worked out the first time it's seen.
+    """
+
+    def __init__(self, options: list[Node], firsts: list, prefixes: list[str]):
+        super().__init__(options)
+        self.firsts = firsts
+        self.table: dict[str, list[int]] = {}
+
+        # Indexes of the options with a prefix, "" marks where a prefix ends
+        self.trie: dict = {}
+        self.unprefixed = []
+        for i, prefix in enumerate(prefixes):
+            if prefix == "":
+                self.unprefixed.append(i)
+                continue
+
+            node = self.trie
+            for c in prefix:
+                node = node.setdefault(c, {})
+            node.setdefault("", []).append(i)
+
+        self.nullable = [i for i in self.unprefixed if firsts[i] is None]
+
+    def match(self, s: str, state: MatchState) -> list[MatchState]:
+        results = []
+        for i in self._indexes(s, state.pos):
+            results.extend(self.options[i].match(s, state))
+        return results
+
+    def exists(self, s: str, state: MatchState) -> bool:
+        indexes = self._indexes(s, state.pos)
+        return any(self.options[i].exists(s, state) for i in indexes)
+
+    def _indexes(self, s: str, pos: int) -> list[int]:
+        """Return the indexes of the options that can match at pos, in order."""
+        if pos >= len(s):
+            indexes = self.nullable
+        else:
+            indexes = self.table.get(s[pos])
+
+            if indexes is None:
+                c = s[pos]
+                indexes = [
+                    i
+                    for i in self.unprefixed
+                    if self.firsts[i] is None or c in self.firsts[i]
+                ]
+                self.table[c] = indexes
+
+            node = self.trie.get(s[pos])
+            if node is not None:
+                indexes = list(indexes)
+                j = pos + 1
+                while node is not None:
+                    indexes.extend(node.get("", ()))
+                    node = node.get(s[j]) if j < len(s) else None
+                    j += 1
+
+                # Options are still tried in order of priority
+                indexes.sort()
+
+        return indexes
+
 
 class Group(Node):
     NON_CAPTURE_ID = -1
@@ -451,6 +662,11 @@ class Group(Node):
 
         return results
 
+    def exists(self, s: str, state: MatchState) -> bool:
+        # Only what's left at the end of a pattern is checked with exists, so
+        # nothing can refer back to what the group captures
+        return self.node.exists(s, state)
+
 
 class PositiveLookAhead(Node):
     def __init__(self, node: Node):
@@ -462,9 +678,12 @@ class PositiveLookAhead(Node):
         return False
 
     def match(self, s: str, state: MatchState) -> list[MatchState]:
-        for new_state in self.node.match(s, state):
-            return [MatchState(pos=state.pos, captures=new_state.captures.copy())]
-        return []
+        results = self.node.match(s, state)
+        if len(results) == 0:
+            return []
+
+        # Keep the groups captured by the preferred way to match
+        return [MatchState(pos=state.pos, captures=results[-1].captures.copy())]
 
 
 class NegativeLookAhead(Node):
@@ -482,13 +701,33 @@ class NegativeLookAhead(Node):
         return [state]
 
 
+class AtomicGroup(Node):
+    def __init__(self, node: Node):
+        self.node = node
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, AtomicGroup):
+            return other.node == self.node
+        return False
+
+    def match(self, s: str, state: MatchState) -> list[MatchState]:
+        # Commit to the preferred end state and drop every alternative, so
+        # nothing following the group can backtrack into it
+        results = self.node.match(s, state)
+        return results[-1:]
+
+
 class BackReference(Node):
-    def __init__(self, group_id: int):
+    def __init__(self, group_id: int, ignore_case: bool = False):
         self.group_id = group_id
+        self.ignore_case = ignore_case
 
     def __eq__(self, other) -> bool:
         if isinstance(other, BackReference):
-            return other.group_id == self.group_id
+            return (
+                other.group_id == self.group_id
+                and other.ignore_case == self.ignore_case
+            )
         return False
 
     def __str__(self) -> str:
@@ -501,7 +740,12 @@ class BackReference(Node):
         start, end = state.captures[self.group_id]
         text = s[start:end]
 
-        if s.startswith(text, state.pos):
+        if self.ignore_case:
+            matched = s[state.pos : state.pos + len(text)].lower() == text.lower()
+        else:
+            matched = s.startswith(text, state.pos)
+
+        if matched:
             return [
                 MatchState(pos=state.pos + len(text), captures=state.captures.copy())
             ]
@@ -537,6 +781,114 @@ class Sequence(Node):
 
         return results
 
+    def exists(self, s: str, state: MatchState) -> bool:
+        return self._exists_from(0, s, state)
+
+    def _exists_from(self, index: int, s: str, state: MatchState) -> bool:
+        # Depth-first, trying the preferred states first, which for greedy
+        # repetitions are the ones that leave the least for the rest to match
+        if index == len(self.nodes) - 1:
+            return self.nodes[index].exists(s, state)
+        if index == len(self.nodes):
+            return True
+
+        for next_state in reversed(self.nodes[index].match(s, state)):
+            if self._exists_from(index + 1, s, next_state):
+                return True
+
+        return False
+
+
+def _closure(
+    node: Node,
+    s: str,
+    state: MatchState,
+    visited: set[MatchState],
+    is_lazy: bool = False,
+) -> list[MatchState]:
+    """
+    Return state and every state reachable by repeatedly matching node, from
+    the least to the most preferred. Like a backtracking search, the states
+    node leads to are repeated from in order of preference, and stopping at a
+    state comes after repeating from it, or before if is_lazy. States already
+    in visited are skipped.
+    """
+    visited.add(state)
+    stack = [(state, reversed(node.match(s, state)))]
+    order = [state] if is_lazy else []
+
+    while len(stack) != 0:
+        curr_state, next_states = stack[-1]
+
+        for next_state in next_states:
+            if next_state in visited:
+                continue
+
+            visited.add(next_state)
+            stack.append((next_state, reversed(node.match(s, next_state))))
+            if is_lazy:
+                order.append(next_state)
+            break
+        else:
+            stack.pop()
+            if not is_lazy:
+                order.append(curr_state)
+
+    return list(reversed(order))
+
+
+def _closures(
+    node: Node, s: str, frontier: list[MatchState], is_lazy: bool = False
+) -> list[MatchState]:
+    """
+    Return the closures of the states in frontier, from the least to the most
+    preferred. The highest priority states are expanded first so that lower
+    priority duplicates are the ones dropped.
+    """
+    visited = set()
+    closures = []
+
+    for curr_state in reversed(frontier):
+        if curr_state in visited:
+            continue
+        closures.append(_closure(node, s, curr_state, visited, is_lazy))
+
+    return [st for closure in reversed(closures) for st in closure]
+
+
+def _preferred_body(node: Node, is_lazy: bool) -> Node:
+    # Besides stopping as soon as it can, a lazy quantifier prefers everything
+    # its node matches in the opposite order
+    if is_lazy:
+        return _reverse(node)
+    return node
+
+
+def _reverse(node: Node) -> Node:
+    """
+    Return a node that matches the same states as node, but from the most to
+    the least preferred. Lookaheads and atomic groups end in a single state,
+    so only alternations and quantifiers outside of them change.
+    """
+    match node:
+        case Sequence(nodes=children):
+            return Sequence([_reverse(child) for child in children])
+        case Alternation(options=children):
+            return Alternation([_reverse(child) for child in reversed(children)])
+        case Group(group_id=group, node=child):
+            return Group(group, _reverse(child))
+        case Star() | Plus() | Optional():
+            return type(node)(node.node, is_lazy=not node.is_lazy)
+        case Range(node=child, min=min, max=max, is_lazy=is_lazy):
+            return Range(child, min, max, is_lazy=not is_lazy)
+
+    return node
+
+
+def _dedup(states: list[MatchState]) -> list[MatchState]:
+    # Later states are preferred, so keep the last occurrence of each state
+    return list(reversed(dict.fromkeys(reversed(states))))
+
 
 def stringify_node(node: Node, level=0) -> str:
     indent = "    " * level
@@ -553,6 +905,7 @@ def stringify_node(node: Node, level=0) -> str:
             | Optional(node=child)
             | PositiveLookAhead(node=child)
             | NegativeLookAhead(node=child)
+            | AtomicGroup(node=child)
         ):
             label = type(node).__name__
             return f"{indent}{label}(\n{stringify_node(child, level + 1)}\n{indent})"
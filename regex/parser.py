@@ -17,7 +17,9 @@ from .nodes import (
     Sequence,
     PositiveLookAhead,
     NegativeLookAhead,
+    AtomicGroup,
 )
+from .flags import RegexFlag
 
 
 class InvalidPattern(Exception):
@@ -42,16 +44,25 @@ class Parser:
         "|",
     }
 
+    # Largest bound accepted in a range quantifier, same as GNU grep's RE_DUP_MAX
+    MAX_REPEAT = 32767
+
     QUANTIFIERS = {
         "*": Star,
         "+": Plus,
         "?": Optional,
     }
 
-    def __init__(self, pattern: str) -> None:
+    def __init__(
+        self, pattern: str, flags: RegexFlag = RegexFlag(0), group_offset: int = 0
+    ) -> None:
         self.pattern = pattern
+        self.ignore_case = bool(flags & RegexFlag.IGNORECASE)
         self.i = 0
-        self.curr_group_id = 1
+        # Groups are numbered from group_offset + 1, backreferences are shifted
+        # to match, so patterns parsed one after another get distinct groups
+        self.group_offset = group_offset
+        self.curr_group_id = group_offset + 1
         self.ast = None
 
     def parse(self) -> tuple[Node, int]:
@@ -129,6 +140,11 @@ class Parser:
             if is_lazy:
                 self._consume("?")
 
+            is_possessive = not is_lazy and self._peek() == "+"
+            if is_possessive:
+                self._consume("+")
+                return AtomicGroup(Parser.QUANTIFIERS[c](node))
+
             return Parser.QUANTIFIERS[c](node, is_lazy=is_lazy)
 
         if c == "{":
@@ -163,7 +179,7 @@ class Parser:
         if c in "*+?":
             raise InvalidPattern(f"'{c}': Preceding token is not quantifiable")
 
-        return Literal(c)
+        return self._literal(c)
 
     def _parse_backslash(self) -> Node:
         self._consume("\\")
@@ -177,7 +193,7 @@ class Parser:
             return MetaSequence(c)
 
         if c in Parser.META_CHARS:
-            return Literal(c)
+            return self._literal(c)
 
         if c.isdecimal():
             group = c
@@ -186,10 +202,11 @@ class Parser:
                 group += self._consume()
 
             group = int(group)
-            if group >= self.curr_group_id:
+            group_id = group + self.group_offset if group != 0 else 0
+            if group_id >= self.curr_group_id:
                 raise InvalidPattern(f"'{group}': Invalid group reference")
 
-            return BackReference(group_id=group)
+            return BackReference(group_id=group_id, ignore_case=self.ignore_case)
 
         raise InvalidPattern(f"'\\{c}': This token has no special meaning")
 
@@ -226,23 +243,35 @@ class Parser:
         if is_lazy:
             self._consume("?")
 
+        is_possessive = not is_lazy and self._peek() == "+"
+        if is_possessive:
+            self._consume("+")
+
+        for bound in (min, max):
+            if bound != "" and int(bound) > Parser.MAX_REPEAT:
+                raise InvalidPattern(
+                    f"'{bound}': Range quantifier exceeds limit of {Parser.MAX_REPEAT}"
+                )
+
         # Case {n}
         if not seenMax:
-            return Range(node, int(min), int(min), is_lazy=is_lazy)
+            range_node = Range(node, int(min), int(min), is_lazy=is_lazy)
 
         # Case {n,}
-        if max == "":
-            return Sequence(
-                [
-                    Range(node, int(min), int(min), is_lazy=is_lazy),
-                    Star(node, is_lazy=is_lazy),
-                ]
-            )
+        elif max == "":
+            range_node = Range(node, int(min), None, is_lazy=is_lazy)
 
         # Case {n,m}
-        if int(min) > int(max):
-            raise InvalidPattern(f"'{min} > {max}': Range quantifier is out of order")
-        return Range(node, int(min), int(max), is_lazy=is_lazy)
+        else:
+            if int(min) > int(max):
+                raise InvalidPattern(
+                    f"'{min} > {max}': Range quantifier is out of order"
+                )
+            range_node = Range(node, int(min), int(max), is_lazy=is_lazy)
+
+        if is_possessive:
+            return AtomicGroup(range_node)
+        return range_node
 
     def _parse_group(self) -> Node:
         self._consume("(")
@@ -266,7 +295,7 @@ class Parser:
 
         c = self._peek()
 
-        if c not in ":=!":
+        if c not in ":=!>":
             raise InvalidPattern(f"'{c}': Unsupported perl extension")
 
         self._consume()
@@ -278,6 +307,8 @@ class Parser:
             node = PositiveLookAhead(node=node)
         if c == "!":
             node = NegativeLookAhead(node=node)
+        if c == ">":
+            node = AtomicGroup(node=node)
 
         self._consume(")")
 
@@ -312,7 +343,23 @@ class Parser:
         
         self._consume("]")
 
-        return CharacterClass(
-            chars={c for sublist in chars for c in sublist},
-            complement=complement,
-        )
+        chars = {c for sublist in chars for c in sublist}
+        if self.ignore_case:
+            chars = {variant for c in chars for variant in case_variants(c)}
+
+        return CharacterClass(chars=chars, complement=complement)
+
+    def _literal(self, c: str) -> Node:
+        # With IGNORECASE a letter becomes a class of all its cases, so no case
+        # folding is left to do while matching
+        if self.ignore_case:
+            variants = case_variants(c)
+            if len(variants) > 1:
+                return CharacterClass(chars=variants, complement=False)
+
+        return Literal(c)
+
+
+def case_variants(c: str) -> set[str]:
+    """Return c together with its upper and lower case forms."""
+    return {variant for variant in (c, c.lower(), c.upper()) if len(variant) == 1}
@@ -1,15 +1,94 @@
 from .match import Match, MatchState
 from .parser import Parser
-from .nodes import Node
+from .flags import RegexFlag
+from .nodes import (
+    Node,
+    Group,
+    Sequence,
+    Alternation,
+    StartAnchor,
+    EndAnchor,
+    NoWordBefore,
+    NoWordAfter,
+)
+from .analysis import (
+    complexity,
+    length_bounds,
+    first_set,
+    literal_prefix,
+    is_start_anchored,
+    is_end_anchored,
+    PrefixCases,
+    CaseMarks,
+    LINEAR,
+)
+from .pikevm import PikeVM, PikeVMGroup
+from copy import copy
+from .shiftand import ShiftAnd
+from .scanner import Scanner
+from .bytescan import LineFilter
 from typing import Iterator
+from array import array
 
 
 class Pattern:
-    def __init__(self, pattern: str, num_groups: int, ast: Node):
+    # FIRST sets with at most this many ASCII characters are selective enough
+    # to skip through the string with, instead of running the Shift-And engine
+    NARROW_FIRST_SET = 16
+
+    def __init__(
+        self, pattern: str, num_groups: int, ast: Node, flags: RegexFlag = RegexFlag(0)
+    ):
         self.pattern = pattern
+        self.flags = RegexFlag(flags)
         self._num_groups = num_groups
+
+        # Whole line and whole word matching are part of the pattern itself, so
+        # every analysis below sees the anchors
+        unwrapped, ast = ast, _wrap_ast(ast, self.flags)
+        self.complexity = complexity(ast)
+
+        # Patterns that can make the backtracking nodes blow up run on the
+        # linear time NFA instead, as long as it supports every construct used
+        self._vm = None
+        if self.complexity.level != LINEAR:
+            self._vm = PikeVM.compile(ast, num_groups)
+
+        # An alternation too large for one NFA, like many patterns compiled
+        # together, still runs its risky options on NFAs of their own
+        if self._vm is None and isinstance(unwrapped, Alternation):
+            isolated = _isolate_risky_options(unwrapped, num_groups, flags)
+            ast = _wrap_ast(isolated, flags)
         self._ast = ast
 
+        self._min_len, self._max_len = length_bounds(ast)
+        self._start_anchored = is_start_anchored(ast)
+        self._end_anchored = is_end_anchored(ast)
+
+        # Used to jump straight to the offsets where a match can begin. A
+        # literal prefix is found with str.find, otherwise the characters that
+        # can begin a match are marked with str.translate
+        self._prefix = literal_prefix(ast)
+        first = first_set(ast) if self._prefix == "" else None
+
+        # For the prefix of a case-insensitive pattern, every way to write its
+        # start is looked for in the string instead
+        self._prefix_cases = None
+        if self._prefix == "" and self.flags & RegexFlag.IGNORECASE:
+            folded_prefix = literal_prefix(ast, ignore_case=True)
+            if folded_prefix != "":
+                self._prefix_cases = PrefixCases(folded_prefix)
+        self._first_marks = first.marks() if first is not None else None
+        self._line_filter = LineFilter.compile(self._prefix, first)
+
+        # Short sequences of (quantified) characters are run as a bit-parallel
+        # automaton that finds the exact offsets where matches start. Skipping
+        # by FIRST set is faster when few characters can begin a match
+        self._shift_and = None
+        if self._prefix == "" and self._vm is None:
+            if first is None or first.bitmap.bit_count() > Pattern.NARROW_FIRST_SET:
+                self._shift_and = ShiftAnd.compile(ast)
+
     def search(self, s: str) -> Match | None:
         """
         Scan through string looking for the first location where the regular
@@ -25,6 +104,53 @@ class Pattern:
         """
         return [match for match in self._find_all_generator(s)]
 
+    def spans(self, s: str) -> array:
+        """
+        Return the spans of all non-overlapping matches of pattern in string as
+        a flat array of interleaved start and end offsets, without creating a
+        Match for each one.
+        """
+        spans = array("q")
+        for start, ms in self._match_state_generator(s):
+            spans.append(start)
+            spans.append(ms.pos)
+        return spans
+
+    def count(self, s: str) -> int:
+        """Return the number of non-overlapping matches of pattern in string."""
+        return sum(1 for _ in self._match_state_generator(s))
+
+    def count_lines(
+        self, data: bytes, pos: int = 0, errors: str = "strict", limit: int = -1
+    ) -> tuple[int, int]:
+        """
+        Count the lines of UTF-8 encoded data from pos, the start of a line,
+        with a match, up to limit of them unless it's -1. A carriage return
+        before the newline isn't part of a line. Only lines that may contain a
+        match are decoded, with the given errors handler, and each is only
+        checked for whether it has a match at all, without working out where
+        matches end or creating a Match.
+
+        Return the number of lines and the offset of the line counting stopped
+        at because it couldn't be decoded, or -1 if there was none.
+        """
+        n = 0
+        if limit == 0:
+            return n, -1
+
+        for start, end in self._line_filter.lines(data, pos):
+            try:
+                line = data[start:end].decode(errors=errors).removesuffix("\r")
+            except UnicodeDecodeError:
+                return n, start
+
+            if self._has_match(line):
+                n += 1
+                if n == limit:
+                    break
+
+        return n, -1
+
     def match(self, s: str) -> Match | None:
         """
         If zero or more characters at the beginning of string match the regular
@@ -44,34 +170,195 @@ class Pattern:
             return match
         return None
 
-    def _find_all_generator(self, s: str, stop: int = -1) -> Iterator[Match]:
+    def candidate_lines(
+        self, data: bytes, pos: int = 0
+    ) -> Iterator[tuple[int, int]]:
+        """
+        Yield the start and end offsets of the lines of UTF-8 encoded data from
+        pos, the start of a line, excluding their newline, that may contain a
+        match. Lines that can't are skipped without being decoded. data may
+        also be an mmap, which is scanned in place.
+        """
+        return self._line_filter.lines(data, pos)
+
+    def scanner(self) -> Scanner:
+        """
+        Return a Scanner that finds the matches of pattern in text fed to it in
+        chunks, without holding on to the whole text.
+        """
+        return Scanner(self)
+
+    def _find_all_generator(
+        self, s: str, stop: int = -1, pos: int = 0
+    ) -> Iterator[Match]:
+        for start, ms in self._match_state_generator(s, stop, pos):
+            yield Match(
+                match=s[start : ms.pos],
+                span=(start, ms.pos),
+                captures=ms.captures,
+                string=s,
+                _num_groups=self._num_groups,
+            )
+
+    def _match_state_generator(
+        self, s: str, stop: int = -1, pos: int = 0
+    ) -> Iterator[tuple[int, MatchState]]:
+        """
+        Yield the start and preferred end state of every non-overlapping match
+        that starts in [pos, stop).
+        """
+        i, stop, marks, needle = self._scan(s, stop, pos)
+
+        while i < stop:
+            i = self._next_candidate(i, stop, marks, needle)
+            if i == -1:
+                return
+
+            found = self._next_match(s, i, stop, marks, needle)
+
+            if found is None:
+                return
+
+            yield found
+
+            start, ms = found
+            i = max(ms.pos, start + 1)
+
+    def _has_match(self, s: str) -> bool:
+        """
+        Return whether pattern matches anywhere in s. The Shift-And automaton
+        stops at the first offset where a match ends, and the backtracking
+        nodes at the first way to match from a candidate offset, instead of
+        finding every end state to pick the preferred one.
+        """
+        if self._vm is not None:
+            return next(self._match_state_generator(s), None) is not None
+        if self._shift_and is not None:
+            return self._shift_and.exists(s)
+
+        i, stop, marks, needle = self._scan(s, -1, 0)
+
+        while i < stop:
+            i = self._next_candidate(i, stop, marks, needle)
+            if i == -1:
+                return False
+
+            if self._ast.exists(s, MatchState(i, {})):
+                return True
+
+            i += 1
+
+        return False
+
+    def _scan(
+        self, s: str, stop: int, pos: int
+    ) -> tuple[int, int, str | CaseMarks | None, str]:
+        """
+        Return the offset to start looking for matches at, the offset they
+        must start before, and the marks and needle that _next_candidate
+        finds candidates with.
+        """
         if stop == -1:
             stop = len(s)
 
-        i = 0
+        # A match can't start where fewer than min_len characters remain, or
+        # anywhere but the beginning of the string when anchored with '^'
+        stop = min(stop, len(s) - self._min_len + 1)
+        if self._start_anchored:
+            stop = min(stop, 1)
+
+        # When anchored with '$' a match has to end at the end of the string,
+        # so it can't start more than max_len characters before it
+        i = pos
+        if self._end_anchored and self._max_len is not None:
+            i = max(i, len(s) - self._max_len)
+
+        # Candidates are found by searching for needle in a string aligned with
+        # s. Not worth scanning the whole string for a single offset
+        marks, needle = None, "1"
+        if self._prefix != "":
+            marks, needle = s, self._prefix
+        elif self._prefix_cases is not None:
+            marks, needle = self._prefix_cases.marks(s), self._prefix_cases.prefix
+        elif stop - i > 1:
+            if self._shift_and is not None:
+                marks = self._shift_and.start_marks(s, i, stop)
+            elif self._first_marks is not None:
+                marks = s.translate(self._first_marks)
+
+        return i, stop, marks, needle
+
+    def _next_candidate(
+        self, i: int, stop: int, marks: str | CaseMarks | None, needle: str
+    ) -> int:
+        """
+        Return the first offset in [i, stop) where a match could begin, or -1.
+        """
+        if marks is not None:
+            return marks.find(needle, i, stop + len(needle) - 1)
+        return i if i < stop else -1
+
+    def _next_match(
+        self, s: str, i: int, stop: int, marks: str | CaseMarks | None, needle: str
+    ) -> tuple[int, MatchState] | None:
+        """
+        Return the start and preferred end state of the first match that starts
+        in [i, stop), or None if there is none.
+        """
+        if self._vm is not None:
+            return self._vm.search(s, i, stop)
+
         while i < stop:
             match_states = self._ast.match(s, MatchState(i, {}))
 
-            if len(match_states) == 0:
-                i += 1
-                continue
+            if len(match_states) != 0:
+                return i, match_states[-1]
 
-            ms = match_states[-1]
-            m = Match(
-                match=s[i : ms.pos],
-                span=(i, ms.pos),
-                captures=ms.captures,
-                string=s,
-                _num_groups=self._num_groups,
-            )
+            i = self._next_candidate(i + 1, stop, marks, needle)
+            if i == -1:
+                return None
+
+        return None
+
+
+def _isolate_risky_options(
+    ast: Alternation, num_groups: int, flags: RegexFlag
+) -> Alternation:
+    """
+    Return a copy of ast where every option that isn't linear is matched by a
+    PikeVM of its own, with the anchors of WHOLE_LINE or WHOLE_WORD included
+    so that the single end state it gives is one the anchors around ast accept.
+    """
+    options = []
+    for option in ast.options:
+        vm = None
+        if complexity(option).level != LINEAR:
+            vm = PikeVM.compile(_wrap_ast(option, flags), num_groups)
+
+        options.append(option if vm is None else PikeVMGroup(option, vm))
+
+    isolated = copy(ast)
+    isolated.options = options
+    return isolated
 
-            yield m
 
-            i = max(ms.pos, i + 1)
+def _wrap_ast(ast: Node, flags: RegexFlag) -> Node:
+    """
+    Surround ast with the anchors that WHOLE_LINE or WHOLE_WORD stand for.
+    """
+    if flags & RegexFlag.WHOLE_LINE:
+        return Sequence([StartAnchor(), Group(Group.NON_CAPTURE_ID, ast), EndAnchor()])
+    if flags & RegexFlag.WHOLE_WORD:
+        # Like GNU grep, only require that no word character is next to the
+        # match, so words may start or end with non-word characters
+        return Sequence(
+            [NoWordBefore(), Group(Group.NON_CAPTURE_ID, ast), NoWordAfter()]
+        )
+    return ast
 
 
-def compile(pattern: str) -> Pattern:
-    parser = Parser(pattern)
+def compile(pattern: str, flags: RegexFlag = RegexFlag(0)) -> Pattern:
+    parser = Parser(pattern, flags)
     ast, num_groups = parser.parse()
 
-    return Pattern(pattern=pattern, ast=ast, num_groups=num_groups)
+    return Pattern(pattern=pattern, ast=ast, num_groups=num_groups, flags=flags)
@@ -0,0 +1,415 @@
+from .match import MatchState
+from .analysis import length_bounds
+from .nodes import (
+    Node,
+    Empty,
+    StartAnchor,
+    EndAnchor,
+    NoWordBefore,
+    NoWordAfter,
+    MetaSequence,
+    Star,
+    Plus,
+    Optional,
+    Range,
+    Alternation,
+    Group,
+    Sequence,
+    PositiveLookAhead,
+    NegativeLookAhead,
+)
+
+# Opcodes. Each instruction is a tuple of (opcode, x, y)
+CHAR = 0  # Consume one character matched by node x
+SPLIT = 1  # Continue at x, then at the lower priority y
+JMP = 2  # Continue at x
+SAVE = 3  # Record the current position in capture slot x
+ASSERT = 4  # Continue only if the zero width node x matches here
+LOOK = 5  # Run sub-program x here, continue if it matched (or not, if y is set)
+MATCH = 6
+MARK = 7  # Remember the position and captures in spare slot x
+PROGRESS = 8  # Continue only if something changed since the MARK in slot x, if any
+
+
+class Unsupported(Exception):
+    pass
+
+
+class Undecided(Exception):
+    """
+    Raised by a partial search that had to look at the end of the string, so
+    its result may change once more text follows.
+    """
+
+
+class PikeVM:
+    """
+    Thompson NFA simulation that runs every alternative in lockstep, so a search
+    takes time linear in the length of the input no matter how ambiguous the
+    pattern is. Threads are kept in priority order, and the thread that matches
+    first is the one the backtracking nodes would prefer.
+
+    Backreferences and atomic groups need backtracking and are not supported.
+    """
+
+    # Patterns that expand to more instructions than this stay on the nodes
+    MAX_PROGRAM_SIZE = 10_000
+
+    def __init__(self, program: list[tuple], num_groups: int, num_slots: int):
+        self._program = program
+        self._num_slots = num_slots
+        self._num_groups = num_groups
+
+    @staticmethod
+    def compile(ast: Node, num_groups: int) -> "PikeVM | None":
+        """Return a PikeVM for ast, or None if ast can't be run as an NFA."""
+        try:
+            compiler = _Compiler(2 * (num_groups + 1))
+            program = compiler.compile(ast)
+        except Unsupported:
+            return None
+
+        return PikeVM(program, num_groups, compiler.num_slots)
+
+    def search(
+        self, s: str, pos: int, stop: int, partial: bool = False
+    ) -> tuple[int, MatchState] | None:
+        """
+        Find the leftmost match that starts in [pos, stop) and return its start
+        along with the end state, or None if there is no match. With partial, s
+        may be the start of a longer text, and Undecided is raised unless the
+        result holds no matter what follows it.
+        """
+        caps = (None,) * self._num_slots
+        slots = self._run(self._program, s, pos, stop, caps, partial)
+
+        if slots is None:
+            return None
+
+        captures = {}
+        for group in range(1, self._num_groups + 1):
+            if slots[2 * group + 1] is not None:
+                captures[group] = (slots[2 * group], slots[2 * group + 1])
+
+        return slots[0], MatchState(pos=slots[1], captures=captures)
+
+    def _run(
+        self,
+        program: list[tuple],
+        s: str,
+        pos: int,
+        stop: int,
+        caps: tuple,
+        partial: bool = False,
+    ) -> tuple | None:
+        matched = None
+        clist, cseen = [], (set(), set())
+
+        for i in range(pos, len(s) + 1):
+            # New threads start at the lowest priority, and only until some
+            # thread has matched since later starts can't be leftmost
+            if matched is None and i < stop:
+                self._add_thread(program, clist, cseen, 0, caps, s, i, partial)
+
+            if len(clist) == 0:
+                if matched is not None or i >= stop:
+                    break
+                cseen = (set(), set())
+                continue
+
+            c = s[i] if i < len(s) else None
+            nlist, nseen = [], (set(), set())
+
+            for pc, thread_caps in clist:
+                op, x, _ = program[pc]
+
+                if op == MATCH:
+                    # Every remaining thread has a lower priority
+                    matched = thread_caps
+                    break
+
+                if c is not None and x.matches_char(c):
+                    self._add_thread(
+                        program, nlist, nseen, pc + 1, thread_caps, s, i + 1, partial
+                    )
+
+            clist, cseen = nlist, nseen
+
+        return matched
+
+    def _add_thread(
+        self,
+        program: list[tuple],
+        threads: list,
+        seen: tuple[set, set],
+        pc: int,
+        caps: tuple,
+        s: str,
+        pos: int,
+        partial: bool = False,
+    ):
+        # A thread that got to the end of a partial string, still ahead of any
+        # thread that matched, could go on to match differently or not at all
+        if partial and pos == len(s):
+            raise Undecided()
+
+        # Follow every empty transition depth first, in priority order.
+        # Consuming instructions are deduplicated by pc alone, which bounds the
+        # number of threads. Empty transitions are deduplicated by pc and
+        # captures, so an empty iteration that only updates a group is kept.
+        seen_pcs, seen_states = seen
+        stack = [(pc, caps)]
+
+        while len(stack) != 0:
+            pc, caps = stack.pop()
+            op, x, y = program[pc]
+
+            if op == CHAR or op == MATCH:
+                if pc not in seen_pcs:
+                    seen_pcs.add(pc)
+                    threads.append((pc, caps))
+                continue
+
+            if (pc, caps) in seen_states:
+                continue
+            seen_states.add((pc, caps))
+
+            if op == JMP:
+                stack.append((x, caps))
+            elif op == SPLIT:
+                stack.append((y, caps))
+                stack.append((x, caps))
+            elif op == SAVE:
+                stack.append((pc + 1, caps[:x] + (pos,) + caps[x + 1 :]))
+            elif op == MARK:
+                stack.append((pc + 1, caps[:x] + ((pos, caps),) + caps[x + 1 :]))
+            elif op == PROGRESS:
+                # The first pass of a plus isn't marked and always counts.
+                # Otherwise the slot is restored so that passes that ended up
+                # in the same place are deduplicated again
+                if caps[x] is None:
+                    stack.append((pc + 1, caps))
+                else:
+                    mark_pos, mark_caps = caps[x]
+                    caps = caps[:x] + (mark_caps[x],) + caps[x + 1 :]
+                    if mark_pos != pos or caps != mark_caps:
+                        stack.append((pc + 1, caps))
+            elif op == ASSERT:
+                if len(x.match(s, MatchState(pos, {}))) != 0:
+                    stack.append((pc + 1, caps))
+            elif op == LOOK:
+                found = self._run(x, s, pos, pos + 1, caps, partial)
+                if y and found is None:
+                    stack.append((pc + 1, caps))
+                elif not y and found is not None:
+                    # Keep the groups captured inside the lookahead, but not
+                    # the lookahead's own start and end
+                    stack.append((pc + 1, caps[:2] + found[2:]))
+
+
+class PikeVMGroup(Group):
+    """
+    Non-capturing group around a subpattern that is matched with its own
+    PikeVM. Only the preferred end state is returned, so it's only exact where
+    nothing after the group can reject that state, such as an option of the
+    top level alternation of a pattern.
+    """
+
+    def __init__(self, node: Node, vm: PikeVM):
+        super().__init__(Group.NON_CAPTURE_ID, node)
+        self.vm = vm
+
+    def match(self, s: str, state: MatchState) -> list[MatchState]:
+        found = self.vm.search(s, state.pos, state.pos + 1)
+        if found is None:
+            return []
+
+        _, ms = found
+        return [MatchState(pos=ms.pos, captures={**state.captures, **ms.captures})]
+
+    def exists(self, s: str, state: MatchState) -> bool:
+        return self.vm.search(s, state.pos, state.pos + 1) is not None
+
+
+class _Compiler:
+    # Slots past the capture groups are spare ones used by MARK
+    def __init__(self, num_slots: int):
+        self.program: list[tuple] = []
+        self.num_slots = num_slots
+
+    def compile(self, ast: Node) -> list[tuple]:
+        self._emit(SAVE, 0)
+        self._compile(ast)
+        self._emit(SAVE, 1)
+        self._emit(MATCH)
+        return self.program
+
+    def _emit(self, op: int, x=None, y=None) -> int:
+        if len(self.program) >= PikeVM.MAX_PROGRAM_SIZE:
+            raise Unsupported("Program too large")
+
+        self.program.append((op, x, y))
+        return len(self.program) - 1
+
+    def _patch(self, pc: int, x=None, y=None):
+        op, old_x, old_y = self.program[pc]
+        self.program[pc] = (
+            op,
+            old_x if x is None else x,
+            old_y if y is None else y,
+        )
+
+    def _split(self, body, is_lazy: bool) -> int:
+        # Emit a split that prefers entering body unless the quantifier is lazy.
+        # Returns the pc of the split so the exit target can be patched later
+        pc = self._emit(SPLIT)
+        body()
+        if is_lazy:
+            self._patch(pc, y=pc + 1)
+        else:
+            self._patch(pc, x=pc + 1)
+        return pc
+
+    def _patch_exit(self, split_pc: int, is_lazy: bool):
+        exit_pc = len(self.program)
+        if is_lazy:
+            self._patch(split_pc, x=exit_pc)
+        else:
+            self._patch(split_pc, y=exit_pc)
+
+    def _compile(self, node: Node, invert: bool = False):
+        # A lazy quantifier reverses the order of everything its body produces,
+        # so inside one every choice is made in the opposite order. invert
+        # tracks whether an odd number of lazy quantifiers enclose node.
+        if node.is_single_char:
+            self._emit(CHAR, node)
+            return
+
+        match node:
+            case Empty():
+                pass
+
+            case (
+                StartAnchor()
+                | EndAnchor()
+                | MetaSequence()
+                | NoWordBefore()
+                | NoWordAfter()
+            ):
+                self._emit(ASSERT, node)
+
+            case Sequence(nodes=children):
+                for child in children:
+                    self._compile(child, invert)
+
+            case Alternation(options=children):
+                # The nodes prefer the last option, so try options in reverse
+                jumps = []
+                options = children if invert else list(reversed(children))
+
+                for option in options[:-1]:
+                    split = self._emit(SPLIT)
+                    self._patch(split, x=split + 1)
+                    self._compile(option, invert)
+                    jumps.append(self._emit(JMP))
+                    self._patch(split, y=len(self.program))
+
+                self._compile(options[-1], invert)
+
+                for jump in jumps:
+                    self._patch(jump, x=len(self.program))
+
+            case Group(group_id=group, node=child):
+                if group == Group.NON_CAPTURE_ID:
+                    self._compile(child, invert)
+                else:
+                    self._emit(SAVE, 2 * group)
+                    self._compile(child, invert)
+                    self._emit(SAVE, 2 * group + 1)
+
+            case Star(node=child, is_lazy=is_lazy):
+                self._compile_star(child, is_lazy != invert)
+
+            case Plus(node=child, is_lazy=is_lazy):
+                is_lazy = is_lazy != invert
+                start = len(self.program)
+
+                # The first pass may match without changing anything, only the
+                # ones that loop back are checked
+                slot = self._new_mark(child)
+                if slot is not None:
+                    entry = self._emit(JMP)
+                    start = self._emit(MARK, slot)
+                    self._patch(entry, x=start + 1)
+
+                self._compile(child, is_lazy)
+                if slot is not None:
+                    self._emit(PROGRESS, slot)
+
+                split = self._emit(SPLIT)
+                if is_lazy:
+                    self._patch(split, x=split + 1, y=start)
+                else:
+                    self._patch(split, x=start, y=split + 1)
+
+            case Optional(node=child, is_lazy=is_lazy):
+                is_lazy = is_lazy != invert
+                split = self._compile_optional(child, is_lazy)
+                self._patch_exit(split, is_lazy)
+
+            case Range(node=child, min=min, max=max, is_lazy=is_lazy):
+                is_lazy = is_lazy != invert
+                for _ in range(min):
+                    self._compile(child, is_lazy)
+
+                if max is None:
+                    self._compile_star(child, is_lazy)
+                    return
+
+                # {n,m} is n copies followed by m-n optional copies, where
+                # skipping any of them jumps straight to the end
+                splits = []
+                for _ in range(max - min):
+                    splits.append(self._compile_optional(child, is_lazy))
+
+                for split in splits:
+                    self._patch_exit(split, is_lazy)
+
+            case PositiveLookAhead(node=child) | NegativeLookAhead(node=child):
+                compiler = _Compiler(self.num_slots)
+                sub_program = compiler.compile(child)
+                self.num_slots = compiler.num_slots
+                self._emit(LOOK, sub_program, isinstance(node, NegativeLookAhead))
+
+            case _:
+                raise Unsupported(f"{type(node).__name__} needs backtracking")
+
+    def _new_mark(self, child: Node) -> int | None:
+        # A pass over child that doesn't consume anything or capture a group is
+        # the same as skipping it, so it's dropped to leave the skip where the
+        # quantifier ranks it. Otherwise an empty pass through a loop would be
+        # deduplicated against the pass it started from, and take the rest of
+        # that pass's options with it. Return a spare slot to MARK passes in,
+        # or None if child can't match the empty string
+        if length_bounds(child)[0] != 0:
+            return None
+
+        self.num_slots += 1
+        return self.num_slots - 1
+
+    def _compile_optional(self, child: Node, is_lazy: bool) -> int:
+        slot = self._new_mark(child)
+
+        def body():
+            if slot is not None:
+                self._emit(MARK, slot)
+            self._compile(child, is_lazy)
+            if slot is not None:
+                self._emit(PROGRESS, slot)
+
+        return self._split(body, is_lazy)
+
+    def _compile_star(self, child: Node, is_lazy: bool):
+        split = self._compile_optional(child, is_lazy)
+        self._emit(JMP, split)
+        self._patch_exit(split, is_lazy)
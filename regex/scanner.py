@@ -0,0 +1,163 @@
+from .match import Match, MatchState
+from .analysis import max_reach, can_match_newline
+from .pikevm import PikeVM, Undecided
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .pattern import Pattern
+
+
+class Scanner:
+    """
+    Searches text that arrives in chunks, such as a file read block by block or
+    a pipe. Matches are reported with offsets relative to the start of the
+    stream and are the same ones Pattern.findall would return for the whole
+    stream at once.
+
+    Only the text that can still be part of an undecided match is kept between
+    calls to feed. How much that is depends on the pattern:
+    - Patterns that look at most N characters past where a match starts
+      keep the last N characters.
+    - Otherwise patterns that can't match a newline keep the text after the
+      last newline.
+    - Past that, a PikeVM search that stops if it has to look at the end of
+      the buffer finds the matches that can't change anyway, such as a match
+      of '\\d+' followed by a non-digit.
+    - Anything else is buffered until it's decided or until close.
+    """
+
+    def __init__(self, pattern: "Pattern"):
+        self._pattern = pattern
+        self._reach = max_reach(pattern._ast)
+        self._line_bound = not can_match_newline(pattern._ast)
+
+        # Patterns the NFA doesn't support, like backreferences, only have
+        # their matches decided by the rules above
+        self._vm = None
+        if self._reach is None:
+            self._vm = pattern._vm or PikeVM.compile(pattern._ast, pattern._num_groups)
+        # Length of the stream once the undecided text at _pos has doubled since
+        # the last search that got to the end of the buffer, when it's searched
+        # again. Keeps text that stays undecided from being searched over and
+        # over
+        self._retry = 0
+
+        self._buffer = ""
+        # Absolute offset of _buffer[0]
+        self._base = 0
+        # Offset in _buffer where the next match may start. Everything before it
+        # has been searched, one character is kept to check '\b' against
+        self._pos = 0
+        self._closed = False
+
+    def feed(self, chunk: str) -> list[Match]:
+        """
+        Append chunk to the stream and return the matches that can no longer
+        change no matter what text follows.
+        """
+        if self._closed:
+            raise ValueError("feed() called after close()")
+
+        self._buffer += chunk
+        matches = self._scan(self._decided_stop())
+        matches += self._scan_partial()
+        self._discard()
+
+        return matches
+
+    def close(self) -> list[Match]:
+        """Mark the end of the stream and return the remaining matches."""
+        if self._closed:
+            return []
+
+        self._closed = True
+        matches = self._scan(len(self._buffer))
+        self._buffer = self._buffer[-1:]
+
+        return matches
+
+    def _decided_stop(self) -> int:
+        """
+        Return the offset in the buffer before which every match start is
+        decided. A match is decided once every character it may look at is in
+        the buffer and at least one more follows it, so that '$' and '\\b'
+        don't mistake the end of the buffer for the end of the stream.
+        """
+        stop = self._pos
+
+        if self._reach is not None:
+            stop = max(stop, len(self._buffer) - self._reach)
+
+        # A match that starts on or before a newline ends before it
+        if self._line_bound:
+            stop = max(stop, self._buffer.rfind("\n") + 1)
+
+        return stop
+
+    def _scan(self, stop: int) -> list[Match]:
+        if stop <= self._pos:
+            return []
+
+        matches = []
+        generator = self._pattern._match_state_generator(
+            self._buffer, stop=stop, pos=self._pos
+        )
+
+        for start, ms in generator:
+            matches.append(self._match(start, ms))
+            self._pos = max(ms.pos, start + 1)
+
+        self._pos = max(self._pos, stop)
+
+        return matches
+
+    def _scan_partial(self) -> list[Match]:
+        """
+        Return the matches past the decided stop that no following text can
+        change, moving _pos past them and past any text where none can start.
+        """
+        if self._vm is None or self._base + len(self._buffer) < self._retry:
+            return []
+
+        matches = []
+        s = self._buffer
+
+        while self._pos < len(s):
+            try:
+                found = self._vm.search(s, self._pos, len(s), partial=True)
+            except Undecided:
+                self._retry = self._base + 2 * len(s) - self._pos
+                break
+
+            if found is None:
+                self._pos = len(s)
+                break
+
+            start, ms = found
+            matches.append(self._match(start, ms))
+            self._pos = max(ms.pos, start + 1)
+
+        return matches
+
+    def _match(self, start: int, ms: MatchState) -> Match:
+        s, base = self._buffer, self._base
+
+        return Match(
+            match=s[start : ms.pos],
+            span=(start + base, ms.pos + base),
+            captures={
+                group: (group_start + base, group_end + base)
+                for group, (group_start, group_end) in ms.captures.items()
+            },
+            string=s,
+            _num_groups=self._pattern._num_groups,
+            _offset=base,
+        )
+
+    def _discard(self) -> None:
+        # Drop the searched text, except for one character of lookbehind
+        keep = self._pos - 1
+        if keep > 0:
+            self._buffer = self._buffer[keep:]
+            self._base += keep
+            self._pos -= keep
@@ -0,0 +1,169 @@
+from .nodes import Node, Star, Plus, Optional, Range, Group, Sequence
+
+
+class ShiftAnd:
+    """
+    Bit-parallel (Shift-And) simulation of patterns that are a capture free
+    sequence of single character nodes, each of which may be made optional or
+    repeatable with '?', '*', '+' or a range. Every position of the pattern is
+    one bit of a Python int, so the whole NFA advances with a handful of integer
+    operations per input character.
+
+    The automaton only decides where matches start, the span of each match is
+    still taken from the nodes so the preferred match is unchanged.
+    """
+
+    # Patterns with more positions than this are left to the other engines
+    MAX_POSITIONS = 64
+
+    def __init__(self, positions: list[tuple[Node, bool, bool]]):
+        self._forward = _Automaton(positions)
+        self._backward = _Automaton(positions[::-1])
+
+    @staticmethod
+    def compile(ast: Node) -> "ShiftAnd | None":
+        """Return a ShiftAnd for ast, or None if ast isn't a simple sequence."""
+        positions = _positions(ast)
+
+        if positions is None or len(positions) > ShiftAnd.MAX_POSITIONS:
+            return None
+
+        # Patterns that can match the empty string match everywhere
+        if all(optional for _, optional, _ in positions):
+            return None
+
+        return ShiftAnd(positions)
+
+    def exists(self, s: str) -> bool:
+        """Return True if the pattern matches anywhere in s."""
+        automaton = self._forward
+        masks, initial, repeat = automaton.masks, automaton.initial, automaton.repeat
+        optional, steps, accept = automaton.optional, automaton.steps, automaton.accept
+        state = 0
+
+        for c in s:
+            mask = masks[c]
+            state = (((state << 1) | initial) & mask) | (state & repeat & mask)
+            for _ in range(steps):
+                state |= (state << 1) & optional
+
+            if state & accept:
+                return True
+
+        return False
+
+    def start_marks(self, s: str, pos: int, stop: int) -> str:
+        """
+        Return a string as long as s with '1' at every offset in [pos, stop)
+        where a match starts and '0' everywhere else.
+
+        The reversed pattern is run backwards over s, so a single pass finds
+        every offset where a match of the pattern begins.
+        """
+        automaton = self._backward
+        masks, initial, repeat = automaton.masks, automaton.initial, automaton.repeat
+        optional, steps, accept = automaton.optional, automaton.steps, automaton.accept
+        marks = bytearray(b"0") * len(s)
+        state = 0
+
+        for k in range(len(s) - 1, pos - 1, -1):
+            mask = masks[s[k]]
+            state = (((state << 1) | initial) & mask) | (state & repeat & mask)
+            for _ in range(steps):
+                state |= (state << 1) & optional
+
+            if state & accept and k < stop:
+                marks[k] = ord("1")
+
+        return marks.decode("ascii")
+
+
+class _Automaton:
+    def __init__(self, positions: list[tuple[Node, bool, bool]]):
+        self.masks = _MaskTable([node for node, _, _ in positions])
+        self.optional = 0
+        self.repeat = 0
+
+        for i, (_, optional, repeat) in enumerate(positions):
+            if optional:
+                self.optional |= 1 << i
+            if repeat:
+                self.repeat |= 1 << i
+
+        # A new match can consume its first character at any position up to
+        # and including the first one that isn't optional
+        self.initial = 0
+        for i, (_, optional, _) in enumerate(positions):
+            self.initial |= 1 << i
+            if not optional:
+                break
+
+        # Skipping a run of optional positions takes one shift per position
+        self.steps = 0
+        run = 0
+        for _, optional, _ in positions:
+            run = run + 1 if optional else 0
+            self.steps = max(self.steps, run)
+
+        self.accept = 1 << (len(positions) - 1)
+
+
+class _MaskTable(dict):
+    """
+    Maps each character to the bitmask of the positions that match it. Masks
+    are computed the first time a character is seen.
+    """
+
+    def __init__(self, positions: list[Node]):
+        super().__init__()
+        self.positions = positions
+
+    def __missing__(self, c: str) -> int:
+        mask = 0
+        for i, node in enumerate(self.positions):
+            if node.matches_char(c):
+                mask |= 1 << i
+
+        self[c] = mask
+        return mask
+
+
+def _positions(node: Node) -> list[tuple[Node, bool, bool]] | None:
+    """
+    Flatten node into a list of (node, optional, repeat) positions, or return
+    None if node isn't a sequence of (quantified) single character nodes.
+    """
+    if node.is_single_char:
+        return [(node, False, False)]
+
+    match node:
+        case Sequence(nodes=children):
+            positions = []
+            for child in children:
+                child_positions = _positions(child)
+                if child_positions is None:
+                    return None
+                positions.extend(child_positions)
+            return positions
+
+        case Group(group_id=Group.NON_CAPTURE_ID, node=child):
+            return _positions(child)
+
+        case Optional(node=child) if child.is_single_char:
+            return [(child, True, False)]
+
+        case Star(node=child) if child.is_single_char:
+            return [(child, True, True)]
+
+        case Plus(node=child) if child.is_single_char:
+            return [(child, False, True)]
+
+        case Range(node=child, min=lo, max=None) if child.is_single_char:
+            if lo == 0:
+                return [(child, True, True)]
+            return [(child, False, False)] * (lo - 1) + [(child, False, True)]
+
+        case Range(node=child, min=lo, max=hi) if child.is_single_char:
+            return [(child, False, False)] * lo + [(child, True, False)] * (hi - lo)
+
+    return None
@@ -1,8 +1,10 @@
 import unittest
+import tempfile
 import grep
+from pathlib import Path
 from unittest.mock import patch
 from contextlib import ExitStack
-from io import StringIO
+from io import BytesIO, StringIO, TextIOWrapper
 from grep import GREEN, BOLD_RED, MAGENTA, RESET
 
 
@@ -58,6 +60,37 @@ class TestProgramOutput(unittest.TestCase):
                     f"{GREEN}2{RESET}:{BOLD_RED}2{RESET}\n",
                 ],
             },
+            {
+                "argv": ["grep.py", "--color=always", "-i", r"dogs"],
+                "stdin": StringIO("Dogs and cats\nno pets\nDOGS"),
+                "expected": [
+                    f"{BOLD_RED}Dogs{RESET} and cats\n",
+                    f"{BOLD_RED}DOGS{RESET}\n",
+                ],
+            },
+            {
+                "argv": ["grep.py", "--color=always", "-F", "a[0]\ncats"],
+                "stdin": StringIO("a[0] = 1\na0\ncats"),
+                "expected": [
+                    f"{BOLD_RED}a[0]{RESET} = 1\n",
+                    f"{BOLD_RED}cats{RESET}\n",
+                ],
+            },
+            {
+                "argv": ["grep.py", "--color=never", "-w", r"cat"],
+                "stdin": StringIO("cats\na cat\nconcat"),
+                "expected": ["a cat\n"],
+            },
+            {
+                "argv": ["grep.py", "--color=never", "-x", "-F", "cat\ndog"],
+                "stdin": StringIO("cats\ncat\n dog\ndog"),
+                "expected": ["cat\n", "dog\n"],
+            },
+            {
+                "argv": ["grep.py", "--color=never", "-e", r"\d", "-e", "pets"],
+                "stdin": StringIO("dogs and cats\nno pets\n3 dogs"),
+                "expected": ["no pets\n", "3 dogs\n"],
+            },
             {
                 "argv": ["grep.py", "--color=always", r"(dogs|cats)"],
                 "stdin": StringIO("dogs and cats are pets\ndogs are nice"),
@@ -66,6 +99,11 @@ class TestProgramOutput(unittest.TestCase):
                     f"{BOLD_RED}dogs{RESET} are nice\n",
                 ],
             },
+            {
+                "argv": ["grep.py", "--color=never", "-n", "dogs"],
+                "stdin": StringIO("dogs\ncats\r\nbirds\nhot dogs\r\n"),
+                "expected": ["1:dogs\n", "4:hot dogs\n"],
+            },
         ]
 
         run_tests(self, test_cases)
@@ -91,3 +129,461 @@ class TestProgramOutput(unittest.TestCase):
         ]
 
         run_tests(self, test_cases)
+
+    def test_walk_dir(self):
+        self.assertEqual(
+            list(grep.walk_dir("mock")),
+            ["mock/fruits.txt", "mock/vegetables.txt", "mock/subdir/vegetables.txt"],
+        )
+        self.assertEqual(
+            list(
+                grep.walk_dir(
+                    "mock",
+                    prune_dir=lambda entry: entry.name == "subdir",
+                    skip_file=lambda entry: entry.name.startswith("f"),
+                )
+            ),
+            ["mock/vegetables.txt"],
+        )
+
+    def test_prefetch(self):
+        self.assertEqual(list(grep.prefetch(iter(range(1000)))), list(range(1000)))
+
+        def fail():
+            yield 1
+            raise OSError("walk failed")
+
+        with self.assertRaises(OSError):
+            list(grep.prefetch(fail()))
+
+    def test_recursive_search_honors_ignore_files(self):
+        with tempfile.TemporaryDirectory() as dir:
+            (Path(dir) / ".gitignore").write_text("*.log\n")
+            (Path(dir) / "app.log").write_text("error\n")
+            (Path(dir) / "app.txt").write_text("error\n")
+
+            argv = ["grep.py", "--color=never", "-r", "error", dir]
+            test_cases = [
+                {
+                    "argv": argv,
+                    "stdin": None,
+                    "expected": [f"{dir}/app.txt:error\n"],
+                },
+                {
+                    "argv": argv + ["--no-ignore"],
+                    "stdin": None,
+                    "expected": [f"{dir}/app.log:error\n", f"{dir}/app.txt:error\n"],
+                },
+            ]
+
+            run_tests(self, test_cases)
+
+    def test_recursive_search_filters_names(self):
+        argv = ["grep.py", "--color=never", "-r"]
+        test_cases = [
+            {
+                "argv": argv + ["--exclude-dir=sub*", "--include=f*", "r", "mock"],
+                "stdin": None,
+                "expected": ["mock/fruits.txt:pear\n", "mock/fruits.txt:strawberry\n"],
+            },
+            {
+                "argv": argv + ["--exclude", "fruits.*", "-t", "txt", "r", "mock"],
+                "stdin": None,
+                "expected": [
+                    "mock/vegetables.txt:cucumber\n",
+                    "mock/vegetables.txt:corn\n",
+                    "mock/subdir/vegetables.txt:celery\n",
+                    "mock/subdir/vegetables.txt:carrot\n",
+                ],
+            },
+        ]
+
+        run_tests(self, test_cases)
+
+    def test_parallel_search_keeps_file_order(self):
+        files = ["mock/subdir/vegetables.txt", "mock/fruits.txt", "mock/vegetables.txt"]
+        test_cases = [
+            {
+                "argv": ["grep.py", "--color=never", "-j", "2", r"r\w"] + files,
+                "stdin": None,
+                "expected": [
+                    "mock/subdir/vegetables.txt:celery\n",
+                    "mock/subdir/vegetables.txt:carrot\n",
+                    "mock/fruits.txt:strawberry\n",
+                    "mock/vegetables.txt:corn\n",
+                ],
+            },
+        ]
+
+        run_tests(self, test_cases)
+
+    def test_parallel_search_splits_large_inputs(self):
+        lines = "".join(f"line {i}\n" for i in range(1, 201))
+        expected = ["42:line 42\n", "142:line 142\n", "199:line 199\n"]
+
+        with tempfile.TemporaryDirectory() as dir:
+            file = Path(dir) / "lines.txt"
+            file.write_text(lines)
+
+            argv = ["grep.py", "--color=never", "-n", "-j", "2", "--chunk-size", "64"]
+            test_cases = [
+                {
+                    "argv": argv + ["^line (42|142|199)$", str(file)],
+                    "stdin": None,
+                    "expected": expected,
+                },
+                {
+                    "argv": argv + ["^line (42|142|199)$"],
+                    "stdin": StringIO(lines),
+                    "expected": expected,
+                },
+            ]
+
+            run_tests(self, test_cases)
+
+    def test_listing_files_and_max_count(self):
+        argv = ["grep.py", "--color=never"]
+        files = ["mock/fruits.txt", "mock/vegetables.txt"]
+        test_cases = [
+            {
+                "argv": argv + ["-l", "r"] + files + ["mock/subdir/vegetables.txt"],
+                "stdin": None,
+                "expected": [
+                    "mock/fruits.txt\n",
+                    "mock/vegetables.txt\n",
+                    "mock/subdir/vegetables.txt\n",
+                ],
+            },
+            {
+                "argv": argv + ["-j", "2", "-L", "pear"] + files,
+                "stdin": None,
+                "expected": ["mock/vegetables.txt\n"],
+            },
+            {
+                "argv": argv + ["-q", "pear"] + files,
+                "stdin": None,
+                "expected": [],
+            },
+            {
+                "argv": argv + ["-m", "1", "-n", "r"] + files,
+                "stdin": None,
+                "expected": [
+                    "mock/fruits.txt:1:pear\n",
+                    "mock/vegetables.txt:1:cucumber\n",
+                ],
+            },
+            {
+                "argv": argv + ["-m", "2", "dogs"],
+                "stdin": StringIO("dogs\nhot dogs\ncats\ndogs"),
+                "expected": ["dogs\n", "hot dogs\n"],
+            },
+            {
+                "argv": argv + ["-l", "dogs"],
+                "stdin": StringIO("cats\ndogs"),
+                "expected": ["(standard input)\n"],
+            },
+        ]
+
+        run_tests(self, test_cases)
+
+    def test_count(self):
+        argv = ["grep.py", "--color=never", "-c"]
+        files = ["mock/fruits.txt", "mock/vegetables.txt"]
+        test_cases = [
+            {
+                "argv": argv + ["r"] + files,
+                "stdin": None,
+                "expected": ["mock/fruits.txt:2\n", "mock/vegetables.txt:2\n"],
+            },
+            {
+                "argv": argv + ["-j", "2", "pear"] + files,
+                "stdin": None,
+                "expected": ["mock/fruits.txt:1\n", "mock/vegetables.txt:0\n"],
+            },
+            {
+                "argv": argv + ["-m", "2", "dogs$"],
+                "stdin": StringIO("dogs\r\nhot dogs\ncats\ndogs"),
+                "expected": ["2\n"],
+            },
+        ]
+
+        run_tests(self, test_cases)
+
+    def test_context_lines(self):
+        lines = "".join(f"line {i}\n" for i in range(1, 21))
+        argv = ["grep.py", "--color=never", "-n"]
+        test_cases = [
+            {
+                "argv": argv + ["-C", "1", "^line (3|5|12)$"],
+                "stdin": StringIO(lines),
+                "expected": [
+                    "2-line 2\n",
+                    "3:line 3\n",
+                    "4-line 4\n",
+                    "5:line 5\n",
+                    "6-line 6\n",
+                    "--\n",
+                    "11-line 11\n",
+                    "12:line 12\n",
+                    "13-line 13\n",
+                ],
+            },
+            {
+                "argv": argv + ["-A", "2", "-B", "0", "-m", "1", "^line 1.$"],
+                "stdin": StringIO(lines),
+                "expected": ["10:line 10\n", "11-line 11\n", "12-line 12\n"],
+            },
+            {
+                "argv": argv + ["-A", "0", "^line (1|3|4)$"],
+                "stdin": StringIO(lines),
+                "expected": ["1:line 1\n", "--\n", "3:line 3\n", "4:line 4\n"],
+            },
+            {
+                "argv": argv + ["-o", "-A", "1", "^line (1|3|8)$"],
+                "stdin": StringIO(lines),
+                "expected": ["1:line 1\n", "3:line 3\n", "--\n", "8:line 8\n"],
+            },
+            {
+                "argv": ["grep.py", "--color=never", "-j", "2", "-B", "1", "r"]
+                + ["mock/fruits.txt", "mock/subdir/vegetables.txt"],
+                "stdin": None,
+                "expected": [
+                    "mock/fruits.txt:pear\n",
+                    "mock/fruits.txt:strawberry\n",
+                    "--\n",
+                    "mock/subdir/vegetables.txt:celery\n",
+                    "mock/subdir/vegetables.txt:carrot\n",
+                ],
+            },
+        ]
+
+        run_tests(self, test_cases)
+
+    def test_context_lines_across_stdin_blocks(self):
+        lines = "".join(f"line {i}\n" for i in range(1, 21))
+        test_cases = [
+            {
+                "argv": ["grep.py", "--color=never", "-n", "-C", "3", "^line 1[02]$"],
+                "stdin": StringIO(lines),
+                "expected": [f"{i}-line {i}\n" for i in range(7, 10)]
+                + ["10:line 10\n", "11-line 11\n", "12:line 12\n"]
+                + [f"{i}-line {i}\n" for i in range(13, 16)],
+            },
+        ]
+
+        with patch("grep.STDIN_BLOCK_SIZE", 16):
+            run_tests(self, test_cases)
+
+    def test_max_count_zero_searches_nothing(self):
+        files = ["mock/fruits.txt", "mock/vegetables.txt"]
+
+        for option in ["-l", "-L", "-q", "-c", "-n"]:
+            argv = ["grep.py", option, "-m", "0", "r"] + files
+            stdout = StringIO()
+
+            with patch("sys.argv", argv), patch("sys.stdout", stdout):
+                with self.assertRaises(SystemExit) as cm:
+                    grep.main()
+
+            self.assertEqual(cm.exception.code, 1, msg=option)
+            self.assertEqual(stdout.getvalue(), "", msg=option)
+
+    def test_files_without_match_exit_status(self):
+        # Like GNU grep, -L exits with 1 when no line matched, even though
+        # every file was listed
+        for jobs in ["1", "2"]:
+            argv = ["grep.py", "-j", jobs, "-L", "zzz", "mock/fruits.txt"]
+            stdout = StringIO()
+
+            with patch("sys.argv", argv), patch("sys.stdout", stdout):
+                with self.assertRaises(SystemExit) as cm:
+                    grep.main()
+
+            self.assertEqual(cm.exception.code, 1)
+            self.assertEqual(stdout.getvalue(), "mock/fruits.txt\n")
+
+    def test_quiet_parallel_search_exit_status(self):
+        with tempfile.TemporaryDirectory() as dir:
+            files = [Path(dir) / f"f{i}.txt" for i in range(3)]
+            files[0].write_text("x\n")
+            # The biggest file comes first in its batch, ahead of f0
+            files[1].write_text("y\n" * 100 + "Foo\n")
+            files[2].write_text("z\n")
+
+            argv = ["grep.py", "-q", "-j", "3", "Foo"] + [str(f) for f in files]
+            stdout = StringIO()
+
+            with patch("sys.argv", argv), patch("sys.stdout", stdout):
+                grep.main()
+
+            self.assertEqual(stdout.getvalue(), "")
+
+    def test_max_count_across_chunks(self):
+        lines = "".join(f"line {i}\n" for i in range(1, 201))
+
+        with tempfile.TemporaryDirectory() as dir:
+            file = Path(dir) / "lines.txt"
+            file.write_text(lines)
+
+            argv = ["grep.py", "--color=never", "-n", "-j", "2", "--chunk-size", "64"]
+            test_cases = [
+                {
+                    "argv": argv + ["-m", "3", "^line 1.*5", str(file)],
+                    "stdin": None,
+                    "expected": ["15:line 15\n", "105:line 105\n", "115:line 115\n"],
+                },
+            ]
+
+            run_tests(self, test_cases)
+
+    def test_memory_mapped_search(self):
+        test_cases = [
+            {
+                "argv": [
+                    "grep.py",
+                    "--color=never",
+                    "-n",
+                    "--mmap-threshold",
+                    "1",
+                    "r+y",
+                    "mock/fruits.txt",
+                ],
+                "stdin": None,
+                "expected": ["2:strawberry\n"],
+            },
+        ]
+
+        run_tests(self, test_cases)
+
+    def test_binary_files(self):
+        with tempfile.TemporaryDirectory() as dir:
+            binary = Path(dir) / "data.bin"
+            binary.write_bytes(b"cat\x00\ncat and dog\n")
+            invalid = Path(dir) / "invalid.txt"
+            invalid.write_bytes(b"dog\n\xff\ncat\n")
+            text = Path(dir) / "text.txt"
+            text.write_bytes(b"dog\n")
+
+            argv = ["grep.py", "--color=never"]
+            files = [str(binary), str(invalid), str(text)]
+            test_cases = [
+                {
+                    "argv": argv + ["cat"] + files,
+                    "stdin": None,
+                    "expected": [
+                        f"Binary file {binary} matches\n",
+                        f"Binary file {invalid} matches\n",
+                    ],
+                },
+                {
+                    "argv": argv + ["-j", "2", "o"] + files,
+                    "stdin": None,
+                    "expected": [
+                        f"Binary file {binary} matches\n",
+                        f"Binary file {invalid} matches\n",
+                        f"{text}:dog\n",
+                    ],
+                },
+                {
+                    "argv": argv + ["--binary-files=without-match", "dog"] + files,
+                    "stdin": None,
+                    "expected": [f"{text}:dog\n"],
+                },
+                {
+                    "argv": argv + ["--binary-files=text", "-n", "cat", str(binary)],
+                    "stdin": None,
+                    "expected": ["1:cat\x00\n", "2:cat and dog\n"],
+                },
+            ]
+
+            run_tests(self, test_cases)
+
+    def test_data_turns_binary_after_its_first_block(self):
+        pattern = grep.regex.compile("cat")
+        data = b"cat\ndog\n\xffcat\ncats\n"
+        found = []
+
+        def add(line_num, line, matches):
+            found.append((line_num, line))
+
+        result = grep.search_data(data, pattern, grep.BINARY, False, add)
+        self.assertEqual(result, (1, grep.BINARY_MATCH))
+        self.assertEqual(found, [(1, "cat")])
+
+        found.clear()
+        result = grep.search_data(data, pattern, grep.WITHOUT_MATCH, False, add)
+        self.assertEqual(result, (1, grep.BINARY_DATA))
+        self.assertEqual(found, [(1, "cat")])
+
+        # Counting keeps the lines before the binary data too
+        result = grep.search_data(data, pattern, grep.WITHOUT_MATCH, False, None)
+        self.assertEqual(result, (1, grep.BINARY_DATA))
+
+    def test_count_of_data_that_turns_binary(self):
+        with tempfile.TemporaryDirectory() as dir:
+            # The invalid byte is past what's sniffed, and in a later chunk
+            file = Path(dir) / "data.txt"
+            file.write_bytes(b"cat\n" * grep.SNIFF_SIZE + b"\xffcat\n" + b"cat\n" * 8)
+
+            argv = ["grep.py", "--binary-files=without-match", "-c"]
+            for jobs in [[], ["-j", "2", "--chunk-size", "4096"]]:
+                run_tests(
+                    self,
+                    [
+                        {
+                            "argv": argv + jobs + ["cat", str(file)],
+                            "stdin": None,
+                            "expected": [f"{grep.SNIFF_SIZE}\n"],
+                        }
+                    ],
+                )
+
+    def test_patterns_from_file(self):
+        with tempfile.TemporaryDirectory() as dir:
+            patterns = Path(dir) / "patterns.txt"
+            patterns.write_text("pe+ar\nca(r)r\n")
+
+            test_cases = [
+                {
+                    "argv": ["grep.py", "--color=never", "-f", str(patterns)],
+                    "stdin": StringIO("pear\nplum\ncarrot"),
+                    "expected": ["pear\n", "carrot\n"],
+                },
+                {
+                    "argv": [
+                        "grep.py",
+                        "--color=never",
+                        "-f",
+                        str(patterns),
+                        "mock/fruits.txt",
+                    ],
+                    "stdin": None,
+                    "expected": ["pear\n"],
+                },
+            ]
+
+            run_tests(self, test_cases)
+
+    def test_output_is_written_to_binary_stdout(self):
+        stdout = TextIOWrapper(BytesIO(), encoding="ascii")
+
+        with ExitStack() as stack:
+            stack.enter_context(patch("sys.argv", ["grep.py", "-n", "caf"]))
+            stack.enter_context(patch("sys.stdin", StringIO("café\ntea\n")))
+            stack.enter_context(patch("sys.stdout", stdout))
+            grep.main()
+
+        self.assertEqual(stdout.buffer.getvalue(), "1:café\n".encode())
+
+    def test_lint_warns_on_stderr(self):
+        stdout, stderr = StringIO(), StringIO()
+
+        with ExitStack() as stack:
+            stack.enter_context(patch("sys.argv", ["grep.py", "--lint", r"(a+)+"]))
+            stack.enter_context(patch("sys.stdin", StringIO("aaa\nbbb")))
+            stack.enter_context(patch("sys.stdout", stdout))
+            stack.enter_context(patch("sys.stderr", stderr))
+            grep.main()
+
+        self.assertIn("Warning: '(a+)+'", stderr.getvalue())
+        self.assertIn("aaa", stdout.getvalue())
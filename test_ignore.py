@@ -0,0 +1,129 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+import grep
+from ignore import IgnoreFile, IgnoreRules, NameFilter
+
+
+class TestIgnoreFile(unittest.TestCase):
+    def test_match(self):
+        rules = IgnoreFile(
+            [
+                "# comment",
+                "*.o",
+                "/build",
+                "docs/*.md",
+                "!docs/keep.md",
+                "lib/**/gen",
+                "**/tmp",
+                "log/",
+                "[!abc]2",
+                "\\!bang",
+            ]
+        )
+        cases = [
+            ("foo.o", False, True),
+            ("src/foo.o", False, True),
+            ("build", True, True),
+            ("src/build", True, None),
+            ("docs/a.md", False, True),
+            ("docs/keep.md", False, False),
+            ("docs/sub/a.md", False, None),
+            ("lib/gen", False, True),
+            ("lib/x/y/gen", False, True),
+            ("a/b/tmp", True, True),
+            ("log", True, True),
+            ("log", False, None),
+            ("d2", False, True),
+            ("a2", False, None),
+            ("!bang", False, True),
+            ("# comment", False, None),
+        ]
+
+        for path, is_dir, expected in cases:
+            self.assertEqual(rules.match(path, is_dir), expected, msg=path)
+
+
+class TestNameFilter(unittest.TestCase):
+    def test_skips(self):
+        names = NameFilter(
+            include=["*.log", "*.txt"],
+            exclude=["secret*"],
+            exclude_dir=["node_modules", "b?ild"],
+        )
+
+        with tempfile.TemporaryDirectory() as dir:
+            for name in ["app.log", "notes.txt", "data.parquet", "secret.log"]:
+                (Path(dir) / name).write_text("x\n")
+            for name in ["node_modules", "build", "src"]:
+                (Path(dir) / name).mkdir()
+
+            skipped = {
+                entry.name
+                for entry in os.scandir(dir)
+                if (names.skips_dir if entry.is_dir() else names.skips_file)(entry)
+            }
+
+        self.assertEqual(
+            skipped, {"data.parquet", "secret.log", "node_modules", "build"}
+        )
+        self.assertTrue(NameFilter().is_empty())
+
+
+class TestIgnoreRules(unittest.TestCase):
+    def test_walk_skips_ignored_files(self):
+        with tempfile.TemporaryDirectory() as dir:
+            root = Path(dir)
+            files = [
+                "a.txt",
+                "a.log",
+                "keep.log",
+                "build/out.txt",
+                "src/b.txt",
+                "src/b.tmp",
+                "src/gen/c.txt",
+                "src/gen/keep.txt",
+                ".git/config",
+            ]
+            for file in files:
+                (root / file).parent.mkdir(parents=True, exist_ok=True)
+                (root / file).write_text("x\n")
+
+            (root / ".gitignore").write_text("*.log\n!keep.log\nbuild/\n")
+            (root / "src" / ".gitignore").write_text("*.tmp\ngen/*\n")
+            (root / "src" / ".ignore").write_text("!gen/keep.txt\n")
+
+            rules = IgnoreRules(dir)
+            walked = grep.walk_dir(
+                dir, prune_dir=rules.ignores_dir, skip_file=rules.ignores_file
+            )
+            expected = [
+                ".gitignore",
+                "a.txt",
+                "keep.log",
+                "src/.gitignore",
+                "src/.ignore",
+                "src/b.txt",
+                "src/gen/keep.txt",
+            ]
+
+            self.assertEqual(
+                [os.path.relpath(path, dir) for path in walked], expected
+            )
+
+    def test_global_ignore_file(self):
+        with tempfile.TemporaryDirectory() as dir:
+            (Path(dir) / "a.txt").write_text("x\n")
+            (Path(dir) / "b.txt").write_text("x\n")
+            global_file = Path(dir) / "global"
+            global_file.write_text("b.txt\nglobal\n")
+
+            rules = IgnoreRules(dir, str(global_file))
+            walked = grep.walk_dir(
+                dir, prune_dir=rules.ignores_dir, skip_file=rules.ignores_file
+            )
+
+            self.assertEqual(
+                [os.path.relpath(path, dir) for path in walked], ["a.txt"]
+            )
@@ -0,0 +1,143 @@
+import unittest
+import regex.analysis as analysis
+from regex.parser import Parser
+
+
+def parse(pattern: str):
+    ast, _ = Parser(pattern).parse()
+    return ast
+
+
+class TestAnalysis(unittest.TestCase):
+    def test_length_bounds(self):
+        cases = [
+            (r"a", (1, 1)),
+            (r"abc", (3, 3)),
+            (r"[a-z]\d.", (3, 3)),
+            (r"a*", (0, None)),
+            (r"a+", (1, None)),
+            (r"a?b", (1, 2)),
+            (r"\d{3}-\d{4}", (8, 8)),
+            (r"(\d{3}-){2}\d{4}", (12, 12)),
+            (r"(ab|c){2,3}", (2, 6)),
+            (r"a{2,}", (2, None)),
+            (r"cat|horse", (3, 5)),
+            (r"^\bfoo(?=bar)$", (3, 3)),
+            (r"(a)\1", (1, None)),
+            (r"(?:)*", (0, 0)),
+            (r"", (0, 0)),
+        ]
+
+        for pattern, expected in cases:
+            self.assertEqual(
+                analysis.length_bounds(parse(pattern)), expected, msg=pattern
+            )
+
+    def test_anchors(self):
+        cases = [
+            (r"^abc", True, False),
+            (r"abc$", False, True),
+            (r"^abc$", True, True),
+            (r"^a|^b", True, False),
+            (r"^a|b", False, False),
+            (r"(^a)b", True, False),
+            (r"a^", False, False),
+        ]
+
+        for pattern, start, end in cases:
+            ast = parse(pattern)
+            self.assertEqual(analysis.is_start_anchored(ast), start, msg=pattern)
+            self.assertEqual(analysis.is_end_anchored(ast), end, msg=pattern)
+
+    def test_first_set(self):
+        cases = [
+            (r"[A-Z]\w+Exception", "AMZ", "az0_ "),
+            (r"\d+ms", "0179", "ms "),
+            (r"a?b", "ab", "c"),
+            (r"(foo|bar)baz", "fb", "oarz"),
+            (r"\bfoo", "f", "o "),
+            (r"(?=x)y", "y", "x"),
+            (r"[^a-c]", "dZ", "abc"),
+        ]
+
+        for pattern, members, non_members in cases:
+            first = analysis.first_set(parse(pattern))
+            for c in members:
+                self.assertIn(c, first, msg=f"{c!r} in FIRST({pattern})")
+            for c in non_members:
+                self.assertNotIn(c, first, msg=f"{c!r} in FIRST({pattern})")
+
+            marks = "".join(members + non_members).translate(first.marks())
+            self.assertEqual(marks, "1" * len(members) + "0" * len(non_members))
+
+    def test_first_set_of_nullable_pattern(self):
+        for pattern in [r"a*", r"a?b?", r"", r"(a?)\1", r"^"]:
+            self.assertIsNone(analysis.first_set(parse(pattern)), msg=pattern)
+
+    def test_literal_prefix(self):
+        cases = [
+            (r"abc", "abc"),
+            (r"ab*c", "a"),
+            (r"(ab)c", "abc"),
+            (r"(?:ab|cd)e", ""),
+            (r"error: \d+", "error: "),
+            (r"a{2}b", ""),
+            (r"\.txt", ".txt"),
+        ]
+
+        for pattern, expected in cases:
+            self.assertEqual(
+                analysis.literal_prefix(parse(pattern)), expected, msg=pattern
+            )
+
+    def test_max_reach(self):
+        cases = [
+            (r"abc", 3),
+            (r"a?b", 2),
+            (r"foo$", 4),
+            (r"\bfoo\b", 4),
+            (r"a(?=bcd)", 4),
+            (r"(?:ab){2,3}", 6),
+            (r"^a", 1),
+            (r"a+", None),
+            (r"(a)\1", None),
+        ]
+
+        for pattern, expected in cases:
+            self.assertEqual(analysis.max_reach(parse(pattern)), expected, msg=pattern)
+
+    def test_can_match_newline(self):
+        for pattern in [r"\s", r"a| ?\s", r"\D+", r"(?=\W)"]:
+            self.assertTrue(analysis.can_match_newline(parse(pattern)), msg=pattern)
+        for pattern in [r".*", r"\w+", r"[ab]", r"(a)\1", r"^$"]:
+            self.assertFalse(analysis.can_match_newline(parse(pattern)), msg=pattern)
+
+    def test_prefix_cases(self):
+        prefix = analysis.PrefixCases("error:")
+        self.assertEqual(prefix.searched, ["ER", "Er", "eR", "er"])
+        self.assertEqual(len(prefix.checked), 32)
+
+        # Past the first block, and only where the whole prefix is
+        s = "é" * 3000 + "ERROR " + "x" * 3000 + "eRrOr: Error:"
+        marks = prefix.marks(s)
+        self.assertEqual(marks.find("error:", 0, len(s)), 6006)
+        self.assertEqual(marks.find("error:", 6007, len(s)), 6013)
+        self.assertEqual(marks.find("error:", 6014, len(s)), -1)
+        self.assertEqual(prefix.marks(s).find("error:", 0, 6011), -1)
+
+        # Characters past the checked cases are compared one by one
+        prefix = analysis.PrefixCases("exceptions")
+        s = "é EXCEPTIONX ExceptionS"
+        self.assertEqual(prefix.marks(s * 100).find("exceptions", 0, 2400), 13)
+        self.assertFalse(prefix.starts(s, 2))
+        self.assertTrue(prefix.starts(s, 13))
+
+    def test_only_single_char_nodes_match_a_char(self):
+        for pattern in [r"a", r"\w", r".", r"[ab]"]:
+            self.assertTrue(parse(pattern).matches_char("a"), msg=pattern)
+        for pattern in [r"\b", r"^", r"$", r"(a)", r"a*", r"ab", r"a|b"]:
+            self.assertFalse(parse(pattern).matches_char("a"), msg=pattern)
+
+
+if __name__ == "__main__":
+    unittest.main(failfast=True)
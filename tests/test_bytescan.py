@@ -0,0 +1,83 @@
+import random
+import unittest
+from unittest.mock import patch
+import regex
+from regex.bytescan import LineFilter
+
+
+def candidate_lines(pattern: str, data: bytes) -> list[bytes]:
+    lines = regex.compile(pattern).candidate_lines(data)
+    return [data[start:end] for start, end in lines]
+
+
+class TestLineFilter(unittest.TestCase):
+    def test_candidate_lines(self):
+        data = "no digits\nabc 12\n\nfoo bar\nnaïve\n3".encode()
+        cases = [
+            (r"[0-9]+", [b"abc 12", b"3"]),
+            (r"foo", [b"foo bar"]),
+            (r"[ïz]", ["naïve".encode()]),
+            (r"\w+ve", [b"no digits", b"abc 12", b"foo bar", "naïve".encode(), b"3"]),
+            (r"x*", data.split(b"\n")),
+            (r"zzz", []),
+        ]
+
+        for pattern, expected in cases:
+            self.assertEqual(candidate_lines(pattern, data), expected, msg=pattern)
+
+    def test_candidate_lines_from_pos(self):
+        data = b"12\nabc\n34\n"
+        lines = regex.compile(r"[0-9]").candidate_lines(data, pos=3)
+        self.assertEqual(list(lines), [(7, 9)])
+
+    def test_count_lines(self):
+        data = "no digits\nabc 12\r\n\n1 2 3\nnaïve\n3".encode()
+        cases = [
+            (r"[0-9]", 0, -1, 3),
+            (r"[0-9]", 0, 2, 2),
+            (r"[0-9]", 10, -1, 3),
+            (r"[0-9]", 18, -1, 2),
+            (r"12$", 0, -1, 1),
+            (r"ï", 0, -1, 1),
+            (r"zzz", 0, -1, 0),
+        ]
+
+        for pattern, pos, limit, expected in cases:
+            count = regex.compile(pattern).count_lines(data, pos, limit=limit)
+            self.assertEqual(count, (expected, -1), msg=pattern)
+
+        # Counting stops at the first line that can't be decoded
+        data = b"a\nab\nb\xff\nab\n"
+        self.assertEqual(regex.compile("b").count_lines(data), (1, 5))
+        # Lines that can't have a match are never decoded
+        self.assertEqual(regex.compile("a").count_lines(data), (3, -1))
+        count = regex.compile("b").count_lines(data, errors="surrogateescape")
+        self.assertEqual(count, (3, -1))
+
+    def test_no_line_with_a_match_is_skipped(self):
+        rng = random.Random(0)
+
+        with patch.object(LineFilter, "BLOCK_SIZE", 5):
+            for pattern in [r"\d+", r"foo", r"é|x", r"\bz", r"a?b"]:
+                compiled = regex.compile(pattern)
+
+                for _ in range(50):
+                    text = "".join(
+                        rng.choice(["a", "b", "x", "1", "\n", "é", "foo", "z "])
+                        for _ in range(rng.randint(0, 30))
+                    )
+                    expected = [
+                        line for line in text.split("\n") if compiled.search(line)
+                    ]
+                    lines = candidate_lines(pattern, text.encode())
+                    found = [
+                        line.decode()
+                        for line in lines
+                        if compiled.search(line.decode())
+                    ]
+
+                    self.assertEqual(found, expected, msg=f"{pattern} {text!r}")
+
+
+if __name__ == "__main__":
+    unittest.main(failfast=True)
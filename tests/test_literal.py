@@ -0,0 +1,115 @@
+import random
+import unittest
+import regex
+from regex.parser import Parser
+
+
+def escape(needle: str) -> str:
+    return "".join(f"\\{c}" if c in Parser.META_CHARS else c for c in needle)
+
+
+class TestLiteralPattern(unittest.TestCase):
+    def test_metacharacters_are_literal(self):
+        cases = [
+            ("foo.bar()", "x foo.bar() fooxbar()", [(2, 11)]),
+            ("a[0]", "a0 a[0]a[0]", [(3, 7), (7, 11)]),
+            (["^a", "b$"], "a^ab$b", [(1, 3), (3, 5)]),
+            (["ab", "abcd", "bc"], "abcd bcab", [(0, 4), (5, 7), (7, 9)]),
+            (["x", ""], "ax", [(0, 0), (1, 2)]),
+            ([], "abc", []),
+        ]
+
+        for needles, string, expected in cases:
+            pattern = regex.compile_literal(needles)
+            spans = [m.span for m in pattern.findall(string)]
+            self.assertEqual(spans, expected, msg=f"{needles} on {string!r}")
+
+    def test_ignore_case(self):
+        pattern = regex.compile_literal(["ERROR", "warn"], regex.IGNORECASE)
+
+        self.assertEqual(pattern.search("an Error").match, "Error")
+        self.assertEqual(pattern.search("é WARN").span, (2, 6))
+        self.assertIsNone(regex.compile_literal("ERROR").search("error"))
+
+        # Strings that aren't ASCII are searched as they are too
+        cases = [
+            (["sun"], [(4, 7)]),
+            (["sun", "été"], [(4, 7), (8, 11)]),
+            # 'S' is a case of both, so these are left to the regex engine
+            (["s", "ſ"], [(0, 1), (4, 5)]),
+        ]
+        for needles, expected in cases:
+            pattern = regex.compile_literal(needles, regex.IGNORECASE)
+            spans = [m.span for m in pattern.findall("ſun SUN Été")]
+            self.assertEqual(spans, expected, msg=needles)
+
+        flags = regex.IGNORECASE | regex.WHOLE_LINE
+        lines = regex.compile_literal(["été", "b"], flags)
+        self.assertIsNotNone(lines.search("ÉtÉ"))
+        self.assertIsNone(lines.search("été "))
+
+    def test_whole_word_and_line(self):
+        allowlist = regex.compile_literal(["cat", "dog"], regex.WHOLE_LINE)
+        self.assertIsNotNone(allowlist.search("dog"))
+        self.assertIsNone(allowlist.search("dogs"))
+
+        words = regex.compile_literal(["a-", "a-b"], regex.WHOLE_WORD)
+        self.assertEqual([m.span for m in words.findall("a-bc a-b")], [(5, 8)])
+
+        # Needles with non-word characters at their edges, like GNU grep -F -w
+        for needles in [["foo.bar()"], ["foo.bar()", "@user"]]:
+            words = regex.compile_literal(needles, regex.WHOLE_WORD)
+            self.assertEqual(words.search("x foo.bar() y").span, (2, 11))
+            self.assertIsNone(words.search("xfoo.bar()"))
+            match = words.search("afoo.bar() foo.bar()_ foo.bar()")
+            self.assertEqual(match.span, (22, 31))
+
+        words = regex.compile_literal(["@user", "-"], regex.WHOLE_WORD)
+        spans = [m.span for m in words.findall(" @user x@user a-b - --")]
+        self.assertEqual(spans, [(1, 6), (18, 19), (20, 21), (21, 22)])
+
+    def test_agrees_with_escaped_regex(self):
+        rng = random.Random(0)
+
+        for _ in range(300):
+            needles = [
+                "".join(rng.choice("ab.(") for _ in range(rng.randint(1, 3)))
+                for _ in range(rng.randint(1, 4))
+            ]
+            string = "".join(rng.choice("abAB.( é") for _ in range(20))
+            flags = rng.choice([0, regex.IGNORECASE]) | rng.choice(
+                [0, regex.WHOLE_WORD, regex.WHOLE_LINE]
+            )
+
+            # The engine prefers the last option, so the longest goes last
+            options = sorted(needles, key=len)
+            expected = regex.compile("|".join(map(escape, options)), flags)
+            pattern = regex.compile_literal(needles, flags)
+
+            self.assertEqual(
+                [m.span for m in pattern.findall(string)],
+                [m.span for m in expected.findall(string)],
+                msg=f"{needles} on {string!r}",
+            )
+
+    def test_pattern_api(self):
+        pattern = regex.compile_literal(["a.c", "xyz"])
+
+        self.assertEqual(pattern.match("a.cxyz").span, (0, 3))
+        self.assertIsNone(pattern.match("_a.c"))
+        self.assertIsNotNone(pattern.fullmatch("xyz"))
+        self.assertEqual(list(pattern.spans("xyz a.c")), [0, 3, 4, 7])
+        self.assertEqual(pattern.count("a.ca.cabc"), 2)
+        self.assertEqual(pattern.complexity.level, "linear")
+
+        data = b"abc\nxyz\na.c"
+        lines = [data[start:end] for start, end in pattern.candidate_lines(data)]
+        self.assertEqual(lines, [b"abc", b"xyz", b"a.c"])
+
+        scanner = pattern.scanner()
+        matches = scanner.feed("__a.") + scanner.feed("c__xy") + scanner.close()
+        self.assertEqual([m.span for m in matches], [(2, 5)])
+
+
+if __name__ == "__main__":
+    unittest.main(failfast=True)
@@ -1,4 +1,5 @@
 import unittest
+import regex
 import regex.parser as parser
 import regex.nodes as nodes
 from regex.parser import InvalidPattern
@@ -277,15 +278,10 @@ class TestParser(unittest.TestCase):
             {
                 "regex": r"a{21,}",
                 "expected": {
-                    "ast": nodes.Sequence(
-                        [
-                            nodes.Range(
-                                node=nodes.Literal("a"),
-                                min=21,
-                                max=21,
-                            ),
-                            nodes.Star(nodes.Literal("a")),
-                        ]
+                    "ast": nodes.Range(
+                        node=nodes.Literal("a"),
+                        min=21,
+                        max=None,
                     ),
                     "groups": 0,
                 },
@@ -344,19 +340,11 @@ class TestParser(unittest.TestCase):
             {
                 "regex": r"a{21,}?",
                 "expected": {
-                    "ast": nodes.Sequence(
-                        [
-                            nodes.Range(
-                                node=nodes.Literal("a"),
-                                min=21,
-                                max=21,
-                                is_lazy=True,
-                            ),
-                            nodes.Star(
-                                nodes.Literal("a"),
-                                is_lazy=True,
-                            ),
-                        ]
+                    "ast": nodes.Range(
+                        node=nodes.Literal("a"),
+                        min=21,
+                        max=None,
+                        is_lazy=True,
                     ),
                     "groups": 0,
                 },
@@ -550,6 +538,85 @@ class TestParser(unittest.TestCase):
 
         run_tests(self, cases)
 
+    def test_parse_atomic_and_possessive(self):
+        cases = [
+            {
+                "regex": r"(?>ab)",
+                "expected": {
+                    "ast": nodes.AtomicGroup(
+                        nodes.Sequence(
+                            [
+                                nodes.Literal("a"),
+                                nodes.Literal("b"),
+                            ]
+                        ),
+                    ),
+                    "groups": 0,
+                },
+            },
+            {
+                "regex": r"a*+",
+                "expected": {
+                    "ast": nodes.AtomicGroup(nodes.Star(nodes.Literal("a"))),
+                    "groups": 0,
+                },
+            },
+            {
+                "regex": r"a++",
+                "expected": {
+                    "ast": nodes.AtomicGroup(nodes.Plus(nodes.Literal("a"))),
+                    "groups": 0,
+                },
+            },
+            {
+                "regex": r"a?+",
+                "expected": {
+                    "ast": nodes.AtomicGroup(nodes.Optional(nodes.Literal("a"))),
+                    "groups": 0,
+                },
+            },
+            {
+                "regex": r"a{2,5}+",
+                "expected": {
+                    "ast": nodes.AtomicGroup(
+                        nodes.Range(nodes.Literal("a"), min=2, max=5)
+                    ),
+                    "groups": 0,
+                },
+            },
+        ]
+
+        run_tests(self, cases)
+
+    def test_parse_ignore_case(self):
+        cases = [
+            (
+                r"a1",
+                nodes.Sequence(
+                    [
+                        nodes.CharacterClass({"a", "A"}, complement=False),
+                        nodes.Literal("1"),
+                    ]
+                ),
+            ),
+            (r"[a-c]", nodes.CharacterClass(set("abcABC"), complement=False)),
+            (r"[^X]", nodes.CharacterClass({"x", "X"}, complement=True)),
+            (r"\.", nodes.Literal(".")),
+            (
+                r"(a)\1",
+                nodes.Sequence(
+                    [
+                        nodes.Group(1, nodes.CharacterClass({"a", "A"}, False)),
+                        nodes.BackReference(1, ignore_case=True),
+                    ]
+                ),
+            ),
+        ]
+
+        for pattern, expected in cases:
+            ast, _ = parser.Parser(pattern, regex.IGNORECASE).parse()
+            self.assertEqual(ast, expected, msg=pattern)
+
     def test_parse_backreference(self):
         cases = [
             {
@@ -685,6 +752,8 @@ class TestParser(unittest.TestCase):
             r"^+",
             r".**",
             r"$a",
+            r"a{32768}",
+            r"a{1,40000}",
         ]
 
         for case in cases:
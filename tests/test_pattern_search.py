@@ -1,5 +1,6 @@
 import unittest
 import regex
+from regex import InvalidPattern
 
 
 def run_tests(test: unittest.TestCase, test_cases):
@@ -304,6 +305,31 @@ class TestMatch(unittest.TestCase):
                 },
             },
             {"regex": r"(\d{3}-){2}\d{4}", "string": "123-45-7890", "expected": None},
+            {
+                "regex": r"\d{1,1000}",
+                "string": "ab" + "7" * 1500,
+                "expected": {"match": "7" * 1000, "span": (2, 1002), "captures": {}},
+            },
+            {
+                "regex": r".{5}$",
+                "string": "record",
+                "expected": {"match": "ecord", "span": (1, 6), "captures": {}},
+            },
+            {
+                "regex": r"(ab|a){2,50}c",
+                "string": "abaababc",
+                "expected": {
+                    "match": "abaababc",
+                    "span": (0, 8),
+                    "captures": {1: (5, 7)},
+                },
+            },
+            {
+                "regex": r"(ab|a){2,}",
+                "string": "aba",
+                "expected": {"match": "aba", "span": (0, 3), "captures": {1: (2, 3)}},
+            },
+            {"regex": r"(ab|a){3,}", "string": "ab", "expected": None},
         ]
 
         run_tests(self, cases)
@@ -522,6 +548,17 @@ class TestMatch(unittest.TestCase):
                 "expected": {"match": "a", "span": (1, 2), "captures": {}},
             },
             {"regex": r"a$", "string": "ab", "expected": None},
+            {
+                "regex": r"\d{2}:\d{2}$",
+                "string": "12:30 to 14:45",
+                "expected": {"match": "14:45", "span": (9, 14), "captures": {}},
+            },
+            {
+                "regex": r"(ab|a)$",
+                "string": "abab",
+                "expected": {"match": "ab", "span": (2, 4), "captures": {1: (2, 4)}},
+            },
+            {"regex": r"\d{3}-\d{4}", "string": "555-123", "expected": None},
         ]
 
         run_tests(self, cases)
@@ -785,6 +822,221 @@ class TestMatch(unittest.TestCase):
 
         run_tests(self, cases)
 
+    def test_atomic_and_possessive(self):
+        cases = [
+            {
+                "regex": r"(?>a+)b",
+                "string": "aaab",
+                "expected": {"match": "aaab", "span": (0, 4), "captures": {}},
+            },
+            {
+                "regex": r"(?>a+)a",
+                "string": "aaaa",
+                "expected": None,
+            },
+            {
+                "regex": r"a*+a",
+                "string": "aaaa",
+                "expected": None,
+            },
+            {
+                "regex": r"a++b",
+                "string": "xaab",
+                "expected": {"match": "aab", "span": (1, 4), "captures": {}},
+            },
+            {
+                "regex": r"ab?+b",
+                "string": "abb",
+                "expected": {"match": "abb", "span": (0, 3), "captures": {}},
+            },
+            {
+                "regex": r"ab?+b",
+                "string": "ab",
+                "expected": None,
+            },
+            {
+                "regex": r"\d{2,4}+\d",
+                "string": "12345",
+                "expected": {"match": "12345", "span": (0, 5), "captures": {}},
+            },
+            {
+                "regex": r"(?>(\w+))!",
+                "string": "hey!",
+                "expected": {"match": "hey!", "span": (0, 4), "captures": {1: (0, 3)}},
+            },
+        ]
+
+        run_tests(self, cases)
+
+    def test_complexity(self):
+        cases = [
+            (r"(a+)+", "exponential"),
+            (r"(a|a)*", "exponential"),
+            (r"(\w*\s*)*", "exponential"),
+            (r"\d+\d+", "polynomial"),
+            (r"\d+-?\d+", "polynomial"),
+            (r"(.*a){8}b", "polynomial"),
+            (r"(a?a?)+b", "polynomial"),
+            (r"(a+b)+", "linear"),
+            (r"([^,]*,)*", "linear"),
+            (r"(?>a+)+", "linear"),
+            (r"\d+ms", "linear"),
+        ]
+
+        for re, level in cases:
+            complexity = regex.compile(re).complexity
+            self.assertEqual(complexity.level, level, msg=f"Regex '{re}'")
+            self.assertEqual(len(complexity.warnings) == 0, level == "linear")
+
+    def test_risky_patterns_finish(self):
+        cases = [
+            {"regex": r"^(a+)+$", "string": "a" * 200 + "b", "expected": None},
+            {"regex": r"(a|a)*b", "string": "a" * 200, "expected": None},
+            {"regex": r"(.*a){8}b", "string": "a" * 80 + "!", "expected": None},
+            {
+                "regex": r"(\w*\s*)*x",
+                "string": "ab cd " * 30 + "x",
+                "expected": {
+                    "match": "ab cd " * 30 + "x",
+                    "span": (0, 181),
+                    "captures": {1: (180, 180)},
+                },
+            },
+        ]
+
+        run_tests(self, cases)
+
+    def test_ignore_case(self):
+        cases = [
+            (r"hello", "Say HeLLo", (4, 9)),
+            (r"error: \d+", "ERROR: 42", (0, 9)),
+            (r"[a-c]+x", "zABcX", (1, 5)),
+            (r"[^a]", "aAb", (2, 3)),
+            (r"(ab)\1", "abAB", (0, 4)),
+            (r"été", "ÉTÉ", (0, 3)),
+            (r"hello", "ÉTÉ HELLO", (4, 9)),
+            (r"hello", "help", None),
+            (r"sun", "ſun SUN", (4, 7)),
+            (r"hello", "é" * 5000 + "HeLLo", (5000, 5005)),
+        ]
+
+        for re, string, expected in cases:
+            match = regex.compile(re, regex.IGNORECASE).search(string)
+            span = match.span if match is not None else None
+            self.assertEqual(span, expected, msg=f"Regex '{re}' on '{string}'")
+
+        # The prefix is found across the blocks it's searched for in
+        string = "Hello é hELLO wörld " * 500
+        matches = regex.compile(r"hello \w", regex.IGNORECASE).findall(string)
+        self.assertEqual(len(matches), 500)
+        self.assertEqual(matches[-1].span, (len(string) - 12, len(string) - 5))
+
+        self.assertIsNone(regex.compile(r"hello").search("HELLO"))
+
+    def test_whole_word_and_line(self):
+        cases = [
+            (r"foo", regex.WHOLE_WORD, "foobar foo", [(7, 10)]),
+            (r"\d+", regex.WHOLE_WORD, "a1 22 3b", [(3, 5)]),
+            (r"a|ab", regex.WHOLE_WORD, "ab a", [(0, 2), (3, 4)]),
+            (r"foo", regex.WHOLE_LINE, "foo", [(0, 3)]),
+            (r"foo", regex.WHOLE_LINE, "foo ", []),
+            (r"a|ab", regex.WHOLE_LINE, "ab", [(0, 2)]),
+            (r"(a+)+", regex.WHOLE_LINE, "aaab", []),
+            (r"foo", regex.WHOLE_WORD | regex.IGNORECASE, "a FOO", [(2, 5)]),
+            # Only the characters next to the match have to be non-word ones
+            (r"@user", regex.WHOLE_WORD, " @user x@user @usery", [(1, 6)]),
+            (r"foo\.bar\(\)", regex.WHOLE_WORD, "x foo.bar() y", [(2, 11)]),
+            (r"-", regex.WHOLE_WORD, "a-b - --", [(4, 5), (6, 7), (7, 8)]),
+            (r"a+!", regex.WHOLE_WORD, "baa! aa!", [(5, 8)]),
+        ]
+
+        for re, flags, string, expected in cases:
+            pattern = regex.compile(re, flags)
+            spans = [m.span for m in pattern.findall(string)]
+            self.assertEqual(spans, expected, msg=f"Regex '{re}' on '{string}'")
+
+        self.assertTrue(regex.compile(r"a", regex.WHOLE_LINE)._start_anchored)
+
+    def test_word_boundary_on_empty_string(self):
+        self.assertIsNone(regex.compile(r"\b").match(""))
+        self.assertIsNotNone(regex.compile(r"\B").match(""))
+
+    def test_compile_many(self):
+        pattern = regex.compile_many([r"(a)\1", r"x(y)?", r"(b)(c)\2", r"\d+ms"])
+
+        self.assertEqual(pattern._num_groups, 4)
+        self.assertEqual(
+            [(m.match, m.captures) for m in pattern.findall("aa xbcc 10ms ab")],
+            [
+                ("aa", {1: (0, 1)}),
+                ("x", {}),
+                ("bcc", {3: (4, 5), 4: (5, 6)}),
+                ("10ms", {}),
+            ],
+        )
+
+        # The same matches as a single alternation of the patterns
+        patterns = ["cat", "ca", "c[a-z]t", r"\bdog", "(?:og)+", "o*"]
+        string = "concat catalog dogog"
+        expected = regex.compile("|".join(patterns)).findall(string)
+        self.assertEqual(
+            [m.span for m in regex.compile_many(iter(patterns)).findall(string)],
+            [m.span for m in expected],
+        )
+
+        # Too many patterns for one NFA, the risky one still gets one of its own
+        patterns = [f"w{i}x" for i in range(3000)] + [r"(a+)+b"]
+        for flags in [regex.RegexFlag(0), regex.WHOLE_LINE]:
+            pattern = regex.compile_many(patterns, flags)
+            self.assertIsNone(pattern._vm)
+            self.assertIsNone(pattern.search("a" * 200 + "!"))
+            self.assertEqual(pattern.search("aab").captures, {1: (0, 2)})
+            self.assertEqual(pattern.search("w42x").span, (0, 4))
+
+        self.assertIsNone(regex.compile_many([]).search("abc"))
+        self.assertRaises(InvalidPattern, regex.compile_many, ["a", r"(b)\2"])
+
+    def test_spans_and_count(self):
+        cases = [
+            (r"\d+", "a1 22 333", [1, 2, 3, 5, 6, 9]),
+            (r"x*", "ab", [0, 0, 1, 1]),
+            (r"(a|b)c", "acbcc", [0, 2, 2, 4]),
+            (r"z", "abc", []),
+        ]
+
+        for re, string, expected in cases:
+            pattern = regex.compile(re)
+            spans = pattern.spans(string)
+
+            self.assertEqual(spans.typecode, "q")
+            self.assertEqual(list(spans), expected, msg=f"Regex '{re}'")
+            self.assertEqual(pattern.count(string), len(expected) // 2)
+
+    def test_count_lines(self):
+        lines = ["ab ab", "aab", "abc d", "a b", "bcd", "xx", "AB ab", ""]
+        data = "\n".join(lines).encode()
+        patterns = [
+            r"a.*b",
+            r"(a|ab)(c|bcd)",
+            r"(\w+)\s\1",
+            r"a(?=b)",
+            r"(?>a+)b",
+            r"^a.*d$",
+            r"\bb\b",
+            r"x*",
+            r"\w+\s[a-c]+",
+        ]
+
+        for re in patterns:
+            for flags in [regex.RegexFlag(0), regex.IGNORECASE, regex.WHOLE_WORD]:
+                # Alone and among other patterns, which takes other engines
+                for pattern in [
+                    regex.compile(re, flags),
+                    regex.compile_many([re, "zz"], flags),
+                ]:
+                    expected = sum(pattern.search(line) is not None for line in lines)
+                    self.assertEqual(pattern.count_lines(data), (expected, -1), msg=re)
+
     def test_complex_patterns(self):
         cases = [
             {
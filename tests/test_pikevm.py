@@ -0,0 +1,88 @@
+import random
+import unittest
+from regex.match import MatchState
+from regex.parser import Parser
+from regex.pikevm import PikeVM
+
+
+def compile(pattern: str):
+    ast, num_groups = Parser(pattern).parse()
+    return ast, PikeVM.compile(ast, num_groups)
+
+
+def search_nodes(ast, s: str):
+    for i in range(len(s) + 1):
+        match_states = ast.match(s, MatchState(i, {}))
+        if len(match_states) != 0:
+            return i, match_states[-1].pos, match_states[-1].captures
+
+    return None
+
+
+def search_vm(vm: PikeVM, s: str):
+    found = vm.search(s, 0, len(s) + 1)
+    if found is None:
+        return None
+
+    start, ms = found
+    return start, ms.pos, ms.captures
+
+
+def random_pattern(rng: random.Random, depth: int = 0) -> str:
+    roll = rng.random()
+
+    if depth == 3 or roll < 0.3:
+        return rng.choice(["a", "b", ".", "[ab]", r"\w", r"\s", "", "^", r"\b"])
+    if roll < 0.55:
+        parts = [random_pattern(rng, depth + 1) for _ in range(rng.randint(2, 3))]
+        return "".join(parts)
+    if roll < 0.7:
+        options = [random_pattern(rng, depth + 1) for _ in range(rng.randint(2, 3))]
+        return "|".join(options)
+    if roll < 0.9:
+        group = rng.choice(["(?:%s)", "(%s)"]) % random_pattern(rng, depth + 1)
+        quantifier = rng.choice(["*", "+", "?", "{2}", "{1,3}", "{2,}", "{0,2}"])
+        return group + quantifier + rng.choice(["", "?"])
+
+    return rng.choice(["(%s)", "(?=%s)", "(?!%s)"]) % random_pattern(rng, depth + 1)
+
+
+class TestPikeVM(unittest.TestCase):
+    def test_unsupported_patterns(self):
+        for pattern in [r"(a)\1", r"(?>a+)b", r"a++"]:
+            self.assertIsNone(compile(pattern)[1], msg=pattern)
+
+    def test_preferred_match(self):
+        cases = [
+            (r"(?:x*?(ab|a)+?|(?!b))?", "a", (0, 1, {1: (0, 1)})),
+            (r"(?:a|)?", "a", (0, 1, {})),
+            (r"(?:a*?)?", "a", (0, 1, {})),
+            (r"(?:a??)?", "a", (0, 1, {})),
+            (r"(^|b|)+", "bb", (0, 2, {1: (2, 2)})),
+            (r"(\w+\s?)+:", "ab cd:", (0, 6, {1: (3, 5)})),
+            (r"^(\w+\s?)*$", "ab cd", (0, 5, {1: (3, 5)})),
+            (r"(?=(.){2,})", "abc", (0, 0, {1: (2, 3)})),
+            (r"[ab]\w(\s|\b)+?", "xaa xab", (1, 4, {1: (3, 4)})),
+        ]
+
+        for pattern, s, expected in cases:
+            ast, vm = compile(pattern)
+            self.assertEqual(search_nodes(ast, s), expected, msg=pattern)
+            self.assertEqual(search_vm(vm, s), expected, msg=pattern)
+
+    def test_agrees_with_nodes(self):
+        rng = random.Random(0)
+
+        for _ in range(300):
+            pattern = random_pattern(rng)
+            ast, vm = compile(pattern)
+
+            for _ in range(20):
+                s = "".join(rng.choice("abx ") for _ in range(rng.randint(0, 8)))
+                self.assertEqual(
+                    search_vm(vm, s), search_nodes(ast, s), msg=f"{pattern} {s!r}"
+                )
+
+
+if __name__ == "__main__":
+    unittest.main(failfast=True)
@@ -0,0 +1,105 @@
+import random
+import unittest
+import regex
+
+
+def scan(pattern: str, chunks: list[str]) -> list[tuple[tuple[int, int], str]]:
+    scanner = regex.compile(pattern).scanner()
+    matches = []
+    for chunk in chunks:
+        matches.extend(scanner.feed(chunk))
+    matches.extend(scanner.close())
+
+    return [(m.span, m.group(0)) for m in matches]
+
+
+class TestScanner(unittest.TestCase):
+    def test_matches_across_chunks(self):
+        cases = [
+            (r"foobar", ["xxfo", "ob", "arxx"], [((2, 8), "foobar")]),
+            (r"\d+", ["12", "34 5", "6"], [((0, 4), "1234"), ((5, 7), "56")]),
+            (r"^ab", ["a", "bab"], [((0, 2), "ab")]),
+            (r"ab$", ["ab", "ab"], [((2, 4), "ab")]),
+            (r"\bab\b", ["ab", "ab ab"], [((5, 7), "ab")]),
+            (r"a.*b", ["a", "xx", "b\nab"], [((0, 4), "axxb"), ((5, 7), "ab")]),
+        ]
+
+        for pattern, chunks, expected in cases:
+            self.assertEqual(scan(pattern, chunks), expected, msg=pattern)
+
+    def test_captures_use_stream_offsets(self):
+        scanner = regex.compile(r"(\w+)=(\d+)").scanner()
+        matches = scanner.feed("a=1 bb") + scanner.feed("=22 ") + scanner.close()
+
+        self.assertEqual([m.group(1, 2) for m in matches], [("a", "1"), ("bb", "22")])
+        self.assertEqual(matches[1].captures, {1: (4, 6), 2: (7, 9)})
+
+    def test_agrees_with_findall(self):
+        patterns = [
+            r"ab",
+            r"x*",
+            r"a|^b",
+            r"(a)(b)?",
+            r"[^x]*",
+            r"a(?=b)",
+            r"(a)\1",
+            r"\s+",
+        ]
+        rng = random.Random(0)
+
+        for pattern in patterns:
+            compiled = regex.compile(pattern)
+
+            for _ in range(50):
+                s = "".join(rng.choice("abx \n") for _ in range(rng.randint(0, 20)))
+                cuts = sorted(rng.sample(range(len(s) + 1), min(len(s) + 1, 3)))
+                chunks = [s[i:j] for i, j in zip([0] + cuts, cuts + [len(s)])]
+
+                expected = [(m.span, m.group(0)) for m in compiled.findall(s)]
+                self.assertEqual(
+                    scan(pattern, chunks), expected, msg=f"{pattern} {s!r}"
+                )
+
+    def test_memory_stays_bounded(self):
+        for pattern in [r"\d+ms", r"a.*b", r"foo$"]:
+            scanner = regex.compile(pattern).scanner()
+            for _ in range(100):
+                scanner.feed("took 12ms and a while b\n" * 10)
+                self.assertLess(len(scanner._buffer), 25, msg=pattern)
+
+    def test_decided_matches_without_newlines(self):
+        # Nothing bounds how far these look, but a match that ends before the
+        # end of the buffer can't change
+        for pattern in [r"\d+", r"\s+", r"\d+ms"]:
+            scanner = regex.compile(pattern).scanner()
+            found = 0
+            for _ in range(100):
+                found += len(scanner.feed("took 12ms and a while b " * 10))
+                self.assertLess(len(scanner._buffer), 25, msg=pattern)
+
+            expected = regex.compile(pattern).findall("took 12ms and a while b " * 1000)
+            self.assertGreaterEqual(found, len(expected) - 1, msg=pattern)
+            self.assertEqual(found + len(scanner.close()), len(expected), msg=pattern)
+
+        # A longer match may still follow, so this one waits for more text
+        scanner = regex.compile(r"a.*b").scanner()
+        self.assertEqual(scanner.feed("axb xx"), [])
+        self.assertEqual([m.span for m in scanner.feed("b")], [])
+        self.assertEqual([m.span for m in scanner.close()], [(0, 7)])
+
+    def test_empty_pattern_list(self):
+        for flags in [regex.RegexFlag(0), regex.WHOLE_WORD, regex.WHOLE_LINE]:
+            for compile in [regex.compile_many, regex.compile_literal]:
+                scanner = compile([], flags).scanner()
+                self.assertEqual(scanner.feed("abc\n") + scanner.feed("x"), [])
+                self.assertEqual(scanner.close(), [])
+                self.assertLess(len(scanner._buffer), 2)
+
+    def test_feed_after_close(self):
+        scanner = regex.compile("a").scanner()
+        scanner.close()
+        self.assertRaises(ValueError, scanner.feed, "a")
+
+
+if __name__ == "__main__":
+    unittest.main(failfast=True)
@@ -0,0 +1,82 @@
+import random
+import unittest
+from regex.match import MatchState
+from regex.parser import Parser
+from regex.shiftand import ShiftAnd
+
+
+def compile(pattern: str):
+    ast, _ = Parser(pattern).parse()
+    return ast, ShiftAnd.compile(ast)
+
+
+class TestShiftAnd(unittest.TestCase):
+    def test_supported_patterns(self):
+        supported = [
+            r"abc",
+            r"\d+ms",
+            r"[A-Z]\w*x?",
+            r"colou?r",
+            r"\d{3}-\d{4}",
+            r"a{2,}b{0,3}",
+            r"(?:ab)c",
+        ]
+        unsupported = [
+            r"(ab)c",
+            r"a|b",
+            r"^abc",
+            r"\bfoo",
+            r"(?:ab)+",
+            r"a*",
+            r"a?b?",
+            r"a(?=b)",
+            r"a++",
+        ]
+
+        for pattern in supported:
+            self.assertIsNotNone(compile(pattern)[1], msg=pattern)
+        for pattern in unsupported:
+            self.assertIsNone(compile(pattern)[1], msg=pattern)
+
+    def test_too_many_positions(self):
+        self.assertIsNotNone(compile("a" * ShiftAnd.MAX_POSITIONS)[1])
+        self.assertIsNone(compile("a" * (ShiftAnd.MAX_POSITIONS + 1))[1])
+
+    def test_start_marks_agree_with_nodes(self):
+        patterns = [
+            r"ab",
+            r"a+b",
+            r"a*b",
+            r"ba?b",
+            r"b.?a*c",
+            r"[ab]{2,3}c?",
+            r"a{2,}b",
+            r"\w\d?\W",
+            r"a?b?c",
+        ]
+        rng = random.Random(0)
+
+        for pattern in patterns:
+            ast, shift_and = compile(pattern)
+
+            for _ in range(50):
+                s = "".join(rng.choice("abc 1") for _ in range(rng.randint(0, 12)))
+                expected = "".join(
+                    "1" if ast.match(s, MatchState(i, {})) else "0"
+                    for i in range(len(s))
+                )
+
+                self.assertEqual(
+                    shift_and.start_marks(s, 0, len(s)), expected, msg=f"{pattern} {s!r}"
+                )
+                self.assertEqual(
+                    shift_and.exists(s), "1" in expected, msg=f"{pattern} {s!r}"
+                )
+
+    def test_start_marks_respect_bounds(self):
+        _, shift_and = compile(r"ab")
+        self.assertEqual(shift_and.start_marks("abxabab", 1, 5), "0001000")
+
+
+if __name__ == "__main__":
+    unittest.main(failfast=True)